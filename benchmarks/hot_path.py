@@ -0,0 +1,348 @@
+"""
+Benchmarks for the path from a main volume event to the corrected channel levels.
+
+Every benchmark runs against the fake receiver in src/fake_avr.py over a real local telnet connection,
+with debouncing and command pacing set to 0 so that only the processing itself is measured. The
+environment is left alone, so the controller settings apply as usual otherwise.
+
+    python benchmarks/hot_path.py --output benchmark-results.json
+    python benchmarks/hot_path.py --baseline benchmark-results.json --tolerance 0.25
+
+With --baseline the results are compared to an earlier run and the script exits with 1 if any metric
+got worse by more than the tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from adjustmentlogic import AdjustmentState, adjust_speaker_volumes  # noqa: E402
+from controller import ReceiverController  # noqa: E402
+from debounce import DebouncePolicy  # noqa: E402
+from fake_avr import FakeAVR  # noqa: E402
+from json_loader import load_calibration_profile  # noqa: E402
+
+REFERENCE_VOLUME = 75
+
+# A 7.1.4 calibration, every channel at 0dB
+CHANNELS = ["FL", "C", "FR", "SL", "SR", "SBL", "SBR", "SWMIX1", "FHL", "FHR", "TRL", "TRR"]
+
+# Volumes far enough apart that every adjusted channel changes between them
+SAMPLE_VOLUMES = (40.0, 60.0)
+
+# Metrics compared against a baseline, and whether lower values are better
+COMPARED_METRICS = {
+    ("event_to_last_command", "median_ms"): True,
+    ("event_to_last_command", "p95_ms"): True,
+    ("throughput", "events_per_second"): False,
+    ("throughput", "cpu_us_per_event"): True,
+    ("adjust_speaker_volumes", "mean_us"): True,
+    ("adjust_speaker_volumes", "peak_bytes"): True,
+}
+
+
+class TelnetReceiver:
+    """
+    Minimal stand-in for denonavr.DenonAVR talking telnet to a fake receiver on any port.
+
+    denonavr always connects to port 23, so the benchmark uses this instead. Events are dispatched the
+    way denonavr does it: the first two characters are the event, the rest is the parameter.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.callbacks = {}
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        self.last_write_at = None
+
+    async def async_setup(self):
+        pass
+
+    async def async_update(self):
+        pass
+
+    async def async_telnet_connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.read_task = asyncio.create_task(self._read())
+
+    def register_callback(self, event, callback):
+        self.callbacks.setdefault(event, []).append(callback)
+
+    async def async_send_telnet_commands(self, *commands):
+        for command in commands:
+            self.writer.write(f"{command}\r".encode("utf-8"))
+        await self.writer.drain()
+        self.last_write_at = time.perf_counter()
+
+    async def _read(self):
+        while True:
+            try:
+                line = await self.reader.readuntil(b"\r")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            message = line[:-1].decode("utf-8")
+            event, parameter = message[:2], message[2:]
+            if event == "MV" and parameter.startswith("MAX"):
+                continue
+            for callback in self.callbacks.get(event, []):
+                await callback("Main", event, parameter)
+
+    async def close(self):
+        self.read_task.cancel()
+        await asyncio.gather(self.read_task, return_exceptions=True)
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def write_calibration(directory):
+    ady = {
+        "title": f"MV{REFERENCE_VOLUME}dB",
+        "detectedChannels": [
+            {"commandId": channel, "customLevel": "0"} for channel in CHANNELS
+        ],
+    }
+    with open(os.path.join(directory, "benchmark.ady"), "w", encoding="utf-8") as file:
+        json.dump(ady, file)
+
+
+def percentile(samples, share):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def start_controller(avr, config_path, tasks, debounce_delay=0, command_interval=0):
+    receiver = TelnetReceiver("127.0.0.1", avr.port)
+    controller = ReceiverController("benchmark", receiver, config_path, tasks)
+    # Measure the processing, not the waiting
+    controller.debouncer.policy = DebouncePolicy(delay=debounce_delay, max_wait=0)
+    controller.command_queue.interval = command_interval
+    controller.calibration_poll_interval = 0
+    return controller, receiver
+
+
+async def stop_controller(receiver, tasks):
+    await receiver.close()
+    for task in list(tasks):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def benchmark_latency(avr, config_path, samples):
+    """Time from an MV event reaching update_callback to the last SSLEV command being written."""
+    tasks = set()
+    controller, receiver = start_controller(avr, config_path, tasks)
+
+    event_at = None
+    corrected = asyncio.Event()
+    update_callback = controller.update_callback
+    send_adjustments = controller.send_adjustments
+
+    async def timed_update_callback(zone, event, parameter):
+        nonlocal event_at
+        event_at = time.perf_counter()
+        await update_callback(zone, event, parameter)
+
+    async def timed_send_adjustments(adjustments):
+        result = await send_adjustments(adjustments)
+        corrected.set()
+        return result
+
+    # Replaced before start so the receiver gets the timed callbacks
+    controller.update_callback = timed_update_callback
+    controller.send_adjustments = timed_send_adjustments
+    await controller.start()
+
+    latencies = []
+    commands = 0
+    for sample in range(samples):
+        corrected.clear()
+        sent_before = controller.command_queue.stats["sent"]
+        avr.turn_knob(SAMPLE_VOLUMES[sample % len(SAMPLE_VOLUMES)])
+        await asyncio.wait_for(corrected.wait(), 5)
+        latencies.append((receiver.last_write_at - event_at) * 1000)
+        commands += controller.command_queue.stats["sent"] - sent_before
+
+    await stop_controller(receiver, tasks)
+
+    return {
+        "samples": samples,
+        "commands_per_event": commands / samples,
+        "median_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 0.95),
+        "max_ms": max(latencies),
+    }
+
+
+async def benchmark_throughput(avr, config_path, events):
+    """Sustained MV events per second through update_callback, and CPU time per event."""
+    tasks = set()
+    controller, receiver = start_controller(avr, config_path, tasks)
+
+    handled = 0
+    all_handled = asyncio.Event()
+    update_callback = controller.update_callback
+
+    async def counting_update_callback(zone, event, parameter):
+        nonlocal handled
+        await update_callback(zone, event, parameter)
+        handled += 1
+        if handled == events:
+            all_handled.set()
+
+    controller.update_callback = counting_update_callback
+    await controller.start()
+
+    started_at = time.perf_counter()
+    cpu_started_at = time.process_time()
+    for event in range(events):
+        avr.turn_knob(SAMPLE_VOLUMES[0] + (event % 40) / 2)
+        if event % 100 == 0:
+            await asyncio.sleep(0)  # Let the client read while the fake keeps sending
+    await asyncio.wait_for(all_handled.wait(), 60)
+    elapsed = time.perf_counter() - started_at
+    cpu = time.process_time() - cpu_started_at
+
+    await stop_controller(receiver, tasks)
+
+    return {
+        "events": events,
+        "events_per_second": events / elapsed,
+        "cpu_us_per_event": cpu / events * 1_000_000,
+    }
+
+
+async def benchmark_adjust_speaker_volumes(config_path, calls):
+    """Time and allocations of a full adjust_speaker_volumes call."""
+    profile = await load_calibration_profile(config_path)
+    live_blocks = []
+
+    async def send_adjustments(adjustments):
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(True, "*adjustmentlogic.py")]
+            )
+            live_blocks.append(sum(stat.count for stat in snapshot.statistics("filename")))
+        return True
+
+    def new_state():
+        state = AdjustmentState()
+        state.half_change_speakers = profile.half_change_speakers
+        state.quarter_change_speakers = profile.quarter_change_speakers
+        return state
+
+    # Timing without tracemalloc, which slows allocations down considerably
+    durations = []
+    for call in range(calls):
+        state = new_state()
+        started_at = time.perf_counter()
+        await adjust_speaker_volumes(
+            state, profile.speaker_levels, 7.5, send_adjustments, False
+        )
+        durations.append(time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    peaks = []
+    for call in range(min(calls, 100)):
+        state = new_state()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        await adjust_speaker_volumes(
+            state, profile.speaker_levels, 7.5, send_adjustments, False
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "mean_us": statistics.mean(durations) * 1_000_000,
+        "peak_bytes": statistics.median(peaks),
+        "live_blocks_at_send": statistics.median(live_blocks),
+    }
+
+
+async def run_benchmarks(samples=200, events=5000, calls=2000):
+    with tempfile.TemporaryDirectory() as config_path:
+        write_calibration(config_path)
+
+        avr = FakeAVR(channel_levels={channel: 50.0 for channel in CHANNELS})
+        await avr.start(port=0)
+        try:
+            results = {
+                "event_to_last_command": await benchmark_latency(avr, config_path, samples),
+                "throughput": await benchmark_throughput(avr, config_path, events),
+                "adjust_speaker_volumes": await benchmark_adjust_speaker_volumes(
+                    config_path, calls
+                ),
+            }
+        finally:
+            await avr.close()
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": {"samples": samples, "events": events, "calls": calls},
+        "results": results,
+    }
+
+
+def compare_results(results, baseline, tolerance):
+    """List the metrics that got worse than the baseline by more than the tolerance."""
+    regressions = []
+    for (group, metric), lower_is_better in COMPARED_METRICS.items():
+        old = baseline["results"].get(group, {}).get(metric)
+        new = results["results"][group][metric]
+        if not old:
+            continue
+
+        change = (new - old) / old if lower_is_better else (old - new) / old
+        if change > tolerance:
+            regressions.append(f"{group}.{metric}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the volume event hot path")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--samples", type=int, default=200, help="Volume events timed end to end")
+    parser.add_argument("--events", type=int, default=5000, help="Volume events for the throughput")
+    parser.add_argument("--calls", type=int, default=2000, help="adjust_speaker_volumes calls")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed share a metric may get worse"
+    )
+    args = parser.parse_args()
+
+    # Logging is kept at WARNING so console output doesn't dominate the measurements
+    logging.basicConfig(level=logging.WARNING)
+
+    results = asyncio.run(run_benchmarks(args.samples, args.events, args.calls))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(results["results"], indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare_results(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
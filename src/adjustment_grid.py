@@ -0,0 +1,147 @@
+"""
+Evaluate the DEQ correction for whole grids of main and reference volumes at once.
+
+Mirrors curve_adjustment and compute_speaker_adjustments with NumPy, operation for operation, so
+every value is bit-for-bit identical to the scalar path for any correction curve. The curve is taken
+from --curve or CORRECTION_CURVE like the daemon does. Needs NumPy, which the daemon itself doesn't:
+
+    pip install numpy
+    python src/adjustment_grid.py --output grid.csv
+    python src/adjustment_grid.py --references 60:80:1 --initial-level 48.5 --output grid.npy
+    python src/adjustment_grid.py --curve curve.json --output grid.csv
+"""
+
+import argparse
+import csv
+
+import numpy as np
+
+from adjustmentlogic import MAX_LEVEL, MIN_LEVEL
+from curve import DEFAULT_CURVE, load_correction_curve
+
+# Speaker groups along the last axis of the level cube
+GROUPS = ("half", "quarter")
+
+
+def normal_round(values):
+    # int() truncates towards zero, and adding 0.0 turns the -0.0 np.trunc can return into 0.0 like int() does
+    return np.trunc(values + 0.5) + 0.0
+
+
+def curve_values(curve, x):
+    """PiecewiseCurve.value for every element of x."""
+    knot_x = np.array([knot[0] for knot in curve.knots], dtype=np.float64)
+    knot_y = np.array([knot[1] for knot in curve.knots], dtype=np.float64)
+
+    below = knot_y[0] - (knot_x[0] - x) * curve.slope_below
+    above = knot_y[-1] + (x - knot_x[-1]) * curve.slope_above
+    if len(knot_x) == 1:
+        return np.where(x <= knot_x[0], below, above)
+
+    # Same segment as bisect_right, clipped so the values outside the knots can be computed and discarded
+    index = np.clip(np.searchsorted(knot_x, x, side="right"), 1, len(knot_x) - 1)
+    slopes = (knot_y[1:] - knot_y[:-1]) / (knot_x[1:] - knot_x[:-1])
+    between = knot_y[index - 1] + (x - knot_x[index - 1]) * slopes[index - 1]
+    return np.where(x <= knot_x[0], below, np.where(x >= knot_x[-1], above, between))
+
+
+def calculate_adjustment(main_volumes, reference_volumes, curve=DEFAULT_CURVE):
+    """
+    Adjustment factors of the curve for every combination of main and reference volume.
+
+    Returns:
+        numpy.ndarray: Factors of shape (len(main_volumes), len(reference_volumes)).
+    """
+    main = np.asarray(main_volumes, dtype=np.float64)[:, np.newaxis]
+    reference = np.asarray(reference_volumes, dtype=np.float64)[np.newaxis, :]
+
+    adjustment_factor = curve_values(curve.reference, reference) - curve_values(curve.boost, main)
+    adjustment_factor = normal_round(adjustment_factor * 2) / 2
+    adjustment_factor = np.maximum(adjustment_factor, 0.0)
+
+    return np.where(main >= reference, 0.0, adjustment_factor)
+
+
+def adjusted_levels(adjustment_factors, initial_level, group, curve=DEFAULT_CURVE):
+    """The level compute_speaker_adjustments sets for a speaker of the group, for every factor."""
+    if group == "quarter":
+        change = normal_round(adjustment_factors * curve.quarter_scale * 2) / 2
+    elif group == "half":
+        change = adjustment_factors * curve.half_scale
+    else:
+        raise ValueError(f"Unknown speaker group: {group}")
+
+    adjusted = initial_level - change
+    return np.clip(normal_round(adjusted * 2) / 2, MIN_LEVEL, MAX_LEVEL)
+
+
+def evaluate_grid(main_volumes, reference_volumes, initial_level=50.0, curve=DEFAULT_CURVE):
+    """
+    Evaluate the main volume x reference volume x speaker group cube for a correction curve.
+
+    Returns:
+        tuple: The factors of shape (main, reference) and the levels of shape (main, reference, group),
+        with the groups ordered as in GROUPS.
+    """
+    factors = calculate_adjustment(main_volumes, reference_volumes, curve)
+    levels = np.stack(
+        [adjusted_levels(factors, float(initial_level), group, curve) for group in GROUPS], axis=-1
+    )
+    return factors, levels
+
+
+def parse_range(value: str):
+    """Parse 'start:stop:step' into the values from start to stop, both included."""
+    start, stop, step = (float(part) for part in value.split(":"))
+    count = int(round((stop - start) / step)) + 1
+    return start + step * np.arange(count)
+
+
+def write_csv(path, main_volumes, reference_volumes, factors, levels):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(
+            ["main_volume", "reference_volume", "adjustment_factor"]
+            + [f"{group}_level" for group in GROUPS]
+        )
+        # The csv module writes floats with repr, so no precision is lost
+        for main_index, main_volume in enumerate(main_volumes.tolist()):
+            for reference_index, reference_volume in enumerate(reference_volumes.tolist()):
+                writer.writerow(
+                    [main_volume, reference_volume, float(factors[main_index, reference_index])]
+                    + levels[main_index, reference_index].tolist()
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump the DEQ correction for a grid of volumes")
+    parser.add_argument("--volumes", default="0:98:0.5", help="Main volumes as start:stop:step")
+    parser.add_argument("--references", default="45:80:1", help="Reference volumes as start:stop:step")
+    parser.add_argument(
+        "--initial-level", type=float, default=50.0, help="Speaker level before correction, 50 is 0dB"
+    )
+    parser.add_argument(
+        "--curve", help="Correction curve as JSON or a JSON file, defaults to CORRECTION_CURVE"
+    )
+    parser.add_argument(
+        "--output",
+        default="grid.csv",
+        help="CSV file, or .npy for an array of shape (main, reference, 1 + groups) holding the factor and the levels",
+    )
+    args = parser.parse_args()
+
+    main_volumes = parse_range(args.volumes)
+    reference_volumes = parse_range(args.references)
+    factors, levels = evaluate_grid(
+        main_volumes, reference_volumes, args.initial_level, load_correction_curve(args.curve)
+    )
+
+    if args.output.endswith(".npy"):
+        np.save(args.output, np.concatenate([factors[..., np.newaxis], levels], axis=-1))
+    else:
+        write_csv(args.output, main_volumes, reference_volumes, factors, levels)
+    print(f"Wrote {factors.size} combinations to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
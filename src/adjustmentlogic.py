@@ -1,70 +1,76 @@
-import json
 import logging
-import os
+from typing import NamedTuple
 
-from json_loader import get_reference_volume, get_speaker_levels
+from curve import DEFAULT_CURVE
 
 logger = logging.getLogger(__name__)
 
-latest_adjustment = None
-
 MIN_LEVEL = 38
 MAX_LEVEL = 62
 
-half_change_speakers = {}
-quarter_change_speakers = {}
+# Every main volume the receiver can report, from MV00 to MV98 in 0.5 dB steps
+VOLUME_STEPS = tuple(step / 2 for step in range(0, 98 * 2 + 1))
 
 
-def normal_round(unrounded_float):
-    # Python's round() is using bankers rounding. This function implements the good old way of rounding .5 up.
-    return int(unrounded_float + 0.5)
+class TableEntry(NamedTuple):
+    """Precompiled adjustment for a single main volume."""
 
+    adjustment_factor: float
+    levels: tuple  # (speaker, adjusted_level) in the same order as commands
+    commands: tuple
 
-def load_speaker_config():
-    default_speaker_config = json.dumps(
-        {
-            "half": ["SL", "SR", "SBL", "SBR", "SB"],
-            "quarter": [
-                "FHL",
-                "FHR",
-                "FWL",
-                "FWR",
-                "TFL",
-                "TFR",
-                "TML",
-                "TMR",
-                "TRL",
-                "TRR",
-                "RHL",
-                "RHR",
-                "FDL",
-                "FDR",
-                "SDL",
-                "SDR",
-                "BDL",
-                "BDR",
-                "SHL",
-                "SHR",
-                "TS",
-                "CH",
-            ],
-        }
-    )
 
-    speaker_config_json = os.getenv("SPEAKER_CONFIG", default_speaker_config)
+def volume_index(absolute_volume):
+    """Position of a main volume in VOLUME_STEPS, or None if the receiver can't report it."""
+    index = absolute_volume * 2
+    if index != int(index) or not 0 <= index < len(VOLUME_STEPS):
+        return None
+    return int(index)
 
-    speaker_config = json.loads(speaker_config_json)
 
-    half_change_speakers = set(speaker_config.get("half", []))
-    quarter_change_speakers = set(speaker_config.get("quarter", []))
+class AdjustmentTable(NamedTuple):
+    """Precompiled adjustments for every main volume of one calibration."""
 
-    overlap = half_change_speakers.intersection(quarter_change_speakers)
-    if overlap:
-        raise ValueError(
-            f"Invalid configuration: Overlap detected in speaker sets. Conflicting speakers: {overlap}"
-        )
+    reference_volume: int
+    entries: tuple  # TableEntry per main volume, indexed by half-dB step like VOLUME_STEPS
+    reset_levels: tuple
+    reset_commands: tuple
+
+    def entry(self, absolute_volume, reference_level_offset=0):
+        """
+        The entry for a main volume, or None if the receiver can't report that volume.
 
-    return half_change_speakers, quarter_change_speakers
+        A reference level offset makes Dynamic EQ boost as if the volume was that much higher, so
+        the entry of the offset volume is used. Volumes beyond the table get its last entry.
+        """
+        index = volume_index(absolute_volume)
+        if index is None:
+            return None
+        return self.entries[min(index + int(reference_level_offset * 2), len(self.entries) - 1)]
+
+
+class AdjustmentState:
+    """What the adjustment logic knows about one receiver."""
+
+    def __init__(self):
+        self.latest_adjustment = None
+        # Main volume at which latest_adjustment was applied
+        self.latest_adjustment_volume = None
+        # Last level successfully sent to each channel. Channels missing here are in an unknown state.
+        self.applied_levels = {}
+        self.half_change_speakers = frozenset()
+        self.quarter_change_speakers = frozenset()
+        self.curve = DEFAULT_CURVE
+        self.adjustment_table = None
+        # Dynamic EQ reference level offset of the receiver in dB: 0, 5, 10 or 15
+        self.reference_level_offset = 0
+        # Volume changes that needed no adjustment
+        self.skipped_events = 0
+
+
+def normal_round(unrounded_float):
+    # Python's round() is using bankers rounding. This function implements the good old way of rounding .5 up.
+    return int(unrounded_float + 0.5)
 
 
 def format_volume(db_volume: float) -> str:
@@ -73,8 +79,8 @@ def format_volume(db_volume: float) -> str:
 
     A dB volume could be 50.5dB which should be formatted into 505
     """
-    # Check if the volume is an integer
-    if db_volume.is_integer():
+    # Check if the volume is an integer (levels capped at MIN_LEVEL/MAX_LEVEL are ints)
+    if float(db_volume).is_integer():
         # Return the integer formatted as a string without decimals
         return str(int(db_volume))
     else:
@@ -102,7 +108,9 @@ def calculate_reference(reference_volume):
 
 
 # Function to calculate the adjustment factor based on current and reference volume
-def calculate_adjustment(absolute_volume, reference_volume):
+def calculate_adjustment(absolute_volume, reference_volume, reference_level_offset=0):
+    # Dynamic EQ boosts less with a reference level offset, as if the volume was that much higher
+    absolute_volume += reference_level_offset
     adjustment_factor = 0
     if absolute_volume >= reference_volume:
         return 0
@@ -127,98 +135,364 @@ def calculate_adjustment(absolute_volume, reference_volume):
     return adjustment_factor
 
 
-# Function to apply volume adjustment to the speakers
-async def adjust_speaker_volumes(
-    initial_speaker_levels, adjustment_factor, send_adjustments, reset: bool
+def curve_adjustment(curve, absolute_volume, reference_volume, reference_level_offset=0):
+    """calculate_adjustment for any correction curve, DEFAULT_CURVE giving the same results."""
+    absolute_volume += reference_level_offset
+    if absolute_volume >= reference_volume:
+        return 0
+
+    adjustment_factor = curve.reference.value(reference_volume) - curve.boost.value(
+        absolute_volume
+    )
+    adjustment_factor = normal_round(adjustment_factor * 2) / 2
+    return max(adjustment_factor, 0)
+
+
+def compile_adjustment_factors(curve, reference_volume):
+    """The adjustment factor for every main volume, indexed by half-dB step like VOLUME_STEPS."""
+    return tuple(
+        curve_adjustment(curve, absolute_volume, reference_volume)
+        for absolute_volume in VOLUME_STEPS
+    )
+
+
+def compute_speaker_adjustments(
+    initial_speaker_levels,
+    adjustment_factor,
+    reset: bool,
+    half_change_speakers=frozenset(),
+    quarter_change_speakers=frozenset(),
+    half_scale=DEFAULT_CURVE.half_scale,
+    quarter_scale=DEFAULT_CURVE.quarter_scale,
 ):
-    adjustments = []  # List to store the formatted adjustment strings as tuples
-    adjustment_type = None
+    """
+    Calculate the new level of every speaker affected by the adjustment factor.
+
+    Returns a list of (speaker, adjustment_type, initial_level, adjusted_level) tuples.
+    """
+    speaker_adjustments = []
 
-    logger.info(f"Adjustment factor: {adjustment_factor}")
     for speaker, initial_level in initial_speaker_levels.items():
         if reset is True:
             adjustment_type = "Resetting adjustment"
             adjusted_level = initial_level - adjustment_factor
         elif speaker in quarter_change_speakers:
             adjustment_type = "Quarter adjustment"
-            quarter_adjustment_factor = normal_round(adjustment_factor * 0.5 * 2) / 2
+            quarter_adjustment_factor = normal_round(adjustment_factor * quarter_scale * 2) / 2
             adjusted_level = initial_level - quarter_adjustment_factor
         elif speaker in half_change_speakers:
             adjustment_type = "Half adjustment"
-            adjusted_level = initial_level - adjustment_factor
+            adjusted_level = initial_level - adjustment_factor * half_scale
         else:
             continue
 
         # Cap and round new level
-
         adjusted_level = max(
             MIN_LEVEL, min(MAX_LEVEL, (normal_round(adjusted_level * 2) / 2))
         )
 
+        speaker_adjustments.append(
+            (speaker, adjustment_type, initial_level, adjusted_level)
+        )
+
+    return speaker_adjustments
+
+
+def format_adjustment_command(speaker, adjusted_level) -> str:
+    """Format a speaker level into the telnet command setting it on the receiver."""
+    return f"SSLEV{speaker} {format_volume(adjusted_level)}"
+
+
+def parse_adjustment_command(command: str):
+    """
+    Parse a channel level command or report, 'SSLEVSL 455' being SL at 45.5.
+
+    Returns:
+        tuple or None: The speaker and its level, or None if the command doesn't set a level.
+    """
+    if not command.startswith("SSLEV"):
+        return None
+    speaker, _, value = command[5:].partition(" ")
+    if not speaker or not value.isdigit():
+        return None
+    return speaker, parse_volume(value)
+
+
+async def send_level_changes(state, levels, commands, send_adjustments):
+    """
+    Send only the commands for channels whose level differs from the last applied level.
+
+    Args:
+        state (AdjustmentState): The receiver the levels are sent to.
+        levels: (speaker, adjusted_level) pairs in the same order as commands.
+        commands: The telnet commands setting those levels.
+        send_adjustments: Coroutine sending a list of commands, returning True on success.
+
+    Returns:
+        bool: True if the receiver now has every level, False if sending failed.
+    """
+    changed_speakers = []
+    changed_commands = []
+    for (speaker, adjusted_level), command in zip(levels, commands):
+        if state.applied_levels.get(speaker) != adjusted_level:
+            changed_speakers.append((speaker, adjusted_level))
+            changed_commands.append(command)
+
+    if not changed_commands:
+        logger.info("All speaker levels are already applied, nothing to send")
+        return True
+
+    logger.info(
+        f"Sending {len(changed_commands)} of {len(commands)} speaker levels, the rest are unchanged"
+    )
+    if await send_adjustments(changed_commands):
+        state.applied_levels.update(changed_speakers)
+        return True
+
+    # We can't know which commands made it, so resend all of them next time
+    for speaker, _ in changed_speakers:
+        state.applied_levels.pop(speaker, None)
+    return False
+
+
+# Function to apply volume adjustment to the speakers
+async def adjust_speaker_volumes(
+    state, initial_speaker_levels, adjustment_factor, send_adjustments, reset: bool
+):
+    levels = []  # List of (speaker, level) pairs matching the adjustments
+    adjustments = []  # List to store the formatted adjustment strings
+
+    logger.info(f"Adjustment factor: {adjustment_factor}")
+    for speaker, adjustment_type, initial_level, adjusted_level in (
+        compute_speaker_adjustments(
+            initial_speaker_levels,
+            adjustment_factor,
+            reset,
+            state.half_change_speakers,
+            state.quarter_change_speakers,
+            state.curve.half_scale,
+            state.curve.quarter_scale,
+        )
+    ):
         # Info about what changes we are doing
         logger.info(
             f"{speaker}: {adjustment_type}, Initial {initial_level - 50}dB, Adjustment {adjusted_level - initial_level}dB, Final {adjusted_level - 50}dB"
         )
 
         # Format the adjustments for sending via telnet
-        adjustments.append(
-            f"SSLEV{speaker} {format_volume(adjusted_level)}",
-        )
+        levels.append((speaker, adjusted_level))
+        adjustments.append(format_adjustment_command(speaker, adjusted_level))
 
-    # Send all adjustments after the loop
+    # Send all changed adjustments after the loop
     if adjustments:
-        # Send the adjustments
-        await send_adjustments(adjustments)
+        return await send_level_changes(state, levels, adjustments, send_adjustments)
+    return True
+
+
+def compile_adjustment_table(
+    initial_speaker_levels,
+    reference_volume,
+    half_change_speakers=frozenset(),
+    quarter_change_speakers=frozenset(),
+    curve=DEFAULT_CURVE,
+):
+    """
+    Precompute the adjustment factor and telnet commands for every main volume.
+
+    The receiver only reports main volumes in 0.5 dB steps, so everything done per
+    volume change can be calculated once per calibration and looked up afterwards.
+    """
+    entries_by_factor = {}  # Volumes with the same adjustment factor share their entry
+    for adjustment_factor in set(compile_adjustment_factors(curve, reference_volume)):
+        levels = tuple(
+            (speaker, adjusted_level)
+            for speaker, _, _, adjusted_level in compute_speaker_adjustments(
+                initial_speaker_levels,
+                adjustment_factor,
+                False,
+                half_change_speakers,
+                quarter_change_speakers,
+                curve.half_scale,
+                curve.quarter_scale,
+            )
+        )
+        commands = tuple(format_adjustment_command(*level) for level in levels)
+        entries_by_factor[adjustment_factor] = TableEntry(adjustment_factor, levels, commands)
+
+    entries = tuple(
+        entries_by_factor[adjustment_factor]
+        for adjustment_factor in compile_adjustment_factors(curve, reference_volume)
+    )
+
+    reset_levels = tuple(
+        (speaker, adjusted_level)
+        for speaker, _, _, adjusted_level in compute_speaker_adjustments(
+            initial_speaker_levels, 0, True
+        )
+    )
+    reset_commands = tuple(format_adjustment_command(*level) for level in reset_levels)
+
+    return AdjustmentTable(reference_volume, entries, reset_levels, reset_commands)
 
 
 # Main function to trigger the adjustment logic when needed
 
 
 async def on_volume_change(
-    absolute_volume, reference_volume, initial_speaker_levels, send_adjustments
+    state, absolute_volume, reference_volume, initial_speaker_levels, send_adjustments
 ):
-    global latest_adjustment
-
-    adjustment_factor = calculate_adjustment(absolute_volume, reference_volume)
+    adjustment_factor = curve_adjustment(
+        state.curve, absolute_volume, reference_volume, state.reference_level_offset
+    )
 
-    if latest_adjustment != adjustment_factor:
+    if state.latest_adjustment != adjustment_factor:
         logger.info(
             f"Applying surround/height boost correction: {normal_round(adjustment_factor * 2) / 2}dB based on main volume: {absolute_volume}dB vs reference volume: {reference_volume}dB"
         )
-        await adjust_speaker_volumes(
-            initial_speaker_levels, adjustment_factor, send_adjustments, False
+        if await adjust_speaker_volumes(
+            state, initial_speaker_levels, adjustment_factor, send_adjustments, False
+        ):
+            state.latest_adjustment = adjustment_factor
+            state.latest_adjustment_volume = absolute_volume
+        else:
+            # Make sure the next volume change tries again
+            state.latest_adjustment = None
+    else:
+        state.skipped_events += 1
+        logger.info(
+            f"No adjustment needed. Calculated adjustment factor is the same as previous volume: {adjustment_factor}dB"
         )
 
-        latest_adjustment = adjustment_factor
+
+async def on_compiled_volume_change(
+    state, absolute_volume, table_entry, send_adjustments
+):
+    """Apply a precompiled table entry, mirroring on_volume_change."""
+    adjustment_factor = table_entry.adjustment_factor
+
+    if state.latest_adjustment != adjustment_factor:
+        logger.info(
+            f"Applying surround/height boost correction: {adjustment_factor}dB based on main volume: {absolute_volume}dB vs reference volume: {state.adjustment_table.reference_volume}dB"
+        )
+        if await send_level_changes(
+            state, table_entry.levels, table_entry.commands, send_adjustments
+        ):
+            state.latest_adjustment = adjustment_factor
+            state.latest_adjustment_volume = absolute_volume
+        else:
+            # Make sure the next volume change tries again
+            state.latest_adjustment = None
     else:
+        state.skipped_events += 1
         logger.info(
             f"No adjustment needed. Calculated adjustment factor is the same as previous volume: {adjustment_factor}dB"
         )
 
 
+def threshold_crossing_entry(state, absolute_volume, hysteresis):
+    """
+    Check whether a volume ramp has moved clearly past a boundary where the adjustment factor changes.
+
+    The volume has to be past the boundary of the current adjustment by at least the hysteresis,
+    so moving back and forth across a single step does not flip the correction.
+
+    Returns:
+        TableEntry or None: The entry to apply right away, or None to leave it to the debounce.
+    """
+    if state.adjustment_table is None or state.latest_adjustment_volume is None:
+        return None
+
+    offset = state.reference_level_offset
+    table_entry = state.adjustment_table.entry(absolute_volume, offset)
+    if table_entry is None or table_entry.adjustment_factor == state.latest_adjustment:
+        return None
+
+    # Step back towards the volume of the current adjustment by the hysteresis
+    direction = 1 if absolute_volume > state.latest_adjustment_volume else -1
+    band_edge = absolute_volume - direction * hysteresis
+    if (band_edge - state.latest_adjustment_volume) * direction <= 0:
+        return None
+
+    # Round to the 0.5 dB steps of the table
+    band_edge_entry = state.adjustment_table.entry(normal_round(band_edge * 2) / 2, offset)
+    if (
+        band_edge_entry is None
+        or band_edge_entry.adjustment_factor == state.latest_adjustment
+    ):
+        return None
+
+    return table_entry
+
+
+async def handle_threshold_crossing(
+    state, absolute_volume, hysteresis, send_adjustments
+):
+    """Apply the correction during a volume ramp as soon as a boundary is crossed."""
+    table_entry = threshold_crossing_entry(state, absolute_volume, hysteresis)
+    if table_entry is None:
+        return False
+
+    logger.info(f"Main volume {absolute_volume}dB crossed an adjustment boundary")
+    await on_compiled_volume_change(
+        state, absolute_volume, table_entry, send_adjustments
+    )
+    return True
+
+
+def compile_profile_table(profile):
+    """Compile the adjustment table for every main volume of a calibration profile."""
+    return compile_adjustment_table(
+        profile.speaker_levels,
+        profile.reference_volume,
+        profile.half_change_speakers,
+        profile.quarter_change_speakers,
+        profile.curve,
+    )
+
+
+def activate_adjustment_table(state, profile, table):
+    """Make a profile and its compiled table the ones applied to the receiver."""
+    state.half_change_speakers = profile.half_change_speakers
+    state.quarter_change_speakers = profile.quarter_change_speakers
+    state.curve = profile.curve
+    state.adjustment_table = table
+
+
+def prepare_adjustment_table(state, profile):
+    """Compile the adjustment table for a calibration profile and make it active."""
+    if profile is None:
+        state.adjustment_table = None
+        return None
+
+    activate_adjustment_table(state, profile, compile_profile_table(profile))
+    logger.info(
+        f"Compiled adjustment table for {len(state.adjustment_table.entries)} main volumes"
+    )
+    return state.adjustment_table
+
+
 # Example usage when volume change callback is triggered:
-async def handle_volume_change_callback(absolute_volume, json_data, send_adjustments):
-    global half_change_speakers
-    global quarter_change_speakers
-
-    # Try to get the REFERENCE_VOLUME environment variable as an integer
-    reference_volume_env = os.getenv("REFERENCE_VOLUME")
-    if reference_volume_env and reference_volume_env.isdigit():
-        reference_volume = int(reference_volume_env)
-        logger.info("Retrieving reference volume from environment variable")
-    else:
-        # Fallback if REFERENCE_VOLUME is empty or not a valid integer
-        reference_volume = get_reference_volume(json_data)
-        logger.info("Retrieving reference volume from ady file")
-    try:
-        half_change_speakers, quarter_change_speakers = load_speaker_config()
-    except ValueError as e:
-        logger.error(e)
-
-    if reference_volume is not None:
-        initial_speaker_levels = get_speaker_levels(json_data)
+async def handle_volume_change_callback(
+    state, absolute_volume, profile, send_adjustments
+):
+    # Fast path: the adjustment for this volume has already been compiled
+    if state.adjustment_table is not None:
+        table_entry = state.adjustment_table.entry(
+            absolute_volume, state.reference_level_offset
+        )
+        if table_entry is not None:
+            await on_compiled_volume_change(
+                state, absolute_volume, table_entry, send_adjustments
+            )
+            return
+
+    if profile is not None:
         await on_volume_change(
-            absolute_volume, reference_volume, initial_speaker_levels, send_adjustments
+            state,
+            absolute_volume,
+            profile.reference_volume,
+            profile.speaker_levels,
+            send_adjustments,
         )
     else:
         logger.error("Reference volume not found")
@@ -0,0 +1,159 @@
+import json
+import mmap
+import re
+
+# The only parts of an .ady file the adjustment uses
+CHANNEL_FIELDS = frozenset({"commandId", "customLevel"})
+
+WHITESPACE = re.compile(rb"[ \t\n\r]*")
+STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+SCALAR = re.compile(rb"[^,\]}\s]+")
+STRUCTURE = re.compile(rb'["\[\]{}]')
+
+
+class AdyScanner:
+    """
+    Walks the JSON of an .ady file without building it.
+
+    Values that are needed are decoded one at a time, everything else is skipped by scanning for the
+    brackets and quotes that delimit it, so the large per-channel filter and response arrays are
+    never turned into Python objects.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.pos = 0
+        if buffer[:3] == b"\xef\xbb\xbf":
+            self.pos = 3  # Files saved on Windows can start with a byte order mark
+
+    def error(self, message):
+        return ValueError(f"{message} at byte {self.pos}")
+
+    def skip_whitespace(self):
+        self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+
+    def peek(self) -> bytes:
+        self.skip_whitespace()
+        return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char: bytes):
+        if self.peek() != char:
+            raise self.error(f"Expected {char.decode()}")
+        self.pos += 1
+
+    def skip_string(self):
+        match = STRING.match(self.buffer, self.pos)
+        if match is None:
+            raise self.error("Unterminated string")
+        self.pos = match.end()
+
+    def skip_value(self):
+        char = self.peek()
+        if char == b'"':
+            self.skip_string()
+        elif char in (b"{", b"["):
+            depth = 0
+            while True:
+                match = STRUCTURE.search(self.buffer, self.pos)
+                if match is None:
+                    raise self.error("Unterminated value")
+                self.pos = match.start()
+                char = match.group()
+                if char == b'"':
+                    self.skip_string()
+                    continue
+                self.pos += 1
+                depth += 1 if char in (b"{", b"[") else -1
+                if depth == 0:
+                    return
+        else:
+            match = SCALAR.match(self.buffer, self.pos)
+            if match is None:
+                raise self.error("Expected a value")
+            self.pos = match.end()
+
+    def read_value(self):
+        """Decode the value at the current position."""
+        self.skip_whitespace()
+        start = self.pos
+        self.skip_value()
+        return json.loads(bytes(self.buffer[start : self.pos]).decode("utf-8"))
+
+    def object_keys(self):
+        """Yield the keys of the object at the current position. Read or skip each value before continuing."""
+        self.expect(b"{")
+        if self.peek() == b"}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(b":")
+            yield key
+
+            char = self.peek()
+            self.pos += 1
+            if char == b"}":
+                return
+            if char != b",":
+                raise self.error("Expected , or }")
+
+    def array_items(self):
+        """Yield once per item of the array at the current position. Read or skip each item before continuing."""
+        self.expect(b"[")
+        if self.peek() == b"]":
+            self.pos += 1
+            return
+        while True:
+            yield
+
+            char = self.peek()
+            self.pos += 1
+            if char == b"]":
+                return
+            if char != b",":
+                raise self.error("Expected , or ]")
+
+
+def read_channel(scanner):
+    channel = {}
+    if scanner.peek() != b"{":
+        scanner.skip_value()
+        return channel
+
+    for key in scanner.object_keys():
+        if key in CHANNEL_FIELDS:
+            channel[key] = scanner.read_value()
+        else:
+            scanner.skip_value()
+    return channel
+
+
+def parse_calibration(buffer) -> dict:
+    """
+    Extract the title and the detected channels' command IDs and custom levels from .ady JSON.
+
+    Returns:
+        dict: The same structure json.loads would return, holding only those fields.
+    """
+    scanner = AdyScanner(buffer)
+    calibration = {}
+    for key in scanner.object_keys():
+        if key == "title":
+            calibration["title"] = scanner.read_value()
+        elif key == "detectedChannels":
+            calibration["detectedChannels"] = [
+                read_channel(scanner) for _ in scanner.array_items()
+            ]
+        else:
+            scanner.skip_value()
+    return calibration
+
+
+def read_calibration_file(path) -> dict:
+    """Parse an .ady file through a memory map, so it is never read into memory as a whole."""
+    with open(path, "rb") as file:
+        # mmap can't map empty files
+        if not file.seek(0, 2):
+            raise ValueError(f"{path} is empty")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return parse_calibration(buffer)
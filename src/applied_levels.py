@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+from adjustmentlogic import parse_adjustment_command
+
+logger = logging.getLogger(__name__)
+
+
+def applied_levels_path(config_path, receiver_name):
+    """
+    The file recording the levels last applied to a receiver, hidden in its config folder.
+
+    Named after the receiver, as receivers sharing a calibration folder each have their own levels.
+    """
+    file_name = re.sub(r"[^A-Za-z0-9._-]", "_", str(receiver_name))
+    return os.path.join(config_path, f".applied-levels.{file_name}.json")
+
+
+class AppliedLevelsRecord:
+    """
+    Durable record of the channel levels the receiver acknowledged.
+
+    Rewritten after every acknowledged batch, so that after a crash or power loss the next start
+    knows which offsets were left on the receiver. Each write goes to a temporary file that is
+    flushed to disk and then renamed over the record, so the record is always either the old or
+    the new version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.levels = {}
+        self.lock = None  # Keeps the writes in order, made in the event loop of the first update
+        self.failed = False
+
+    def load(self) -> dict:
+        """Read the record left by the last run, an empty dict if there is none or it can't be read."""
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.levels = {
+                    speaker: float(level)
+                    for speaker, level in json.load(file).get("levels", {}).items()
+                }
+        except FileNotFoundError:
+            self.levels = {}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable applied levels record {self.path}: {e}")
+            self.levels = {}
+        return dict(self.levels)
+
+    async def update(self, commands):
+        """Record the levels set by acknowledged commands."""
+        for command in commands:
+            parsed = parse_adjustment_command(command)
+            if parsed is not None:
+                self.levels[parsed[0]] = parsed[1]
+
+        snapshot = {"levels": dict(self.levels), "updated_at": time.time()}
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            await asyncio.to_thread(self.write, snapshot)
+
+    def write(self, snapshot):
+        temporary_path = f"{self.path}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, self.path)
+            self.failed = False
+        except OSError as e:
+            # Log once, a read-only config folder would otherwise fill the log
+            if not self.failed:
+                logger.warning(f"Could not write applied levels record {self.path}: {e}")
+            self.failed = True
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
+
+def applied_levels_record_from_env(config_path, receiver_name):
+    """The record for a receiver, or None when APPLIED_LEVELS_RECORD is disabled."""
+    if os.getenv("APPLIED_LEVELS_RECORD", "true").lower() in ("1", "true", "yes"):
+        return AppliedLevelsRecord(applied_levels_path(config_path, receiver_name))
+    return None
@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Number of latency samples kept for the statistics
+LATENCY_SAMPLES = 1000
+
+
+def command_key(command: str) -> str:
+    """
+    The setting a command changes, used to coalesce commands.
+
+    'SSLEVSL 485' and 'SSLEVSL 50' both set the level of SL, so only the latest is worth sending.
+    """
+    return command.rsplit(" ", 1)[0]
+
+
+class BatchSuperseded(Exception):
+    """Raised for a batch that wasn't sent in full because newer commands replaced it, which is no failure."""
+
+
+class CommandBatch:
+    """A list of commands submitted together, resolved once every command is done."""
+
+    def __init__(self, size: int, submitted_at: float, expect_echo=True, deadline=None):
+        self.remaining = size
+        self.expect_echo = expect_echo  # Forwarded commands, like queries, aren't echoed
+        self.failed = 0
+        self.superseded = 0
+        self.submitted_at = submitted_at
+        self.deadline = deadline  # Loop time after which the remaining commands aren't sent anymore
+        self.future = asyncio.get_running_loop().create_future()
+
+    def command_done(self, succeeded: bool, superseded=False):
+        self.remaining -= 1
+        if superseded:
+            self.superseded += 1
+        elif not succeeded:
+            self.failed += 1
+        if self.remaining <= 0 and not self.future.done():
+            self.future.set_result(self.failed == 0 and self.superseded == 0)
+
+
+class CommandQueue:
+    """
+    Single writer for all telnet commands sent to the receiver.
+
+    Commands are sent one at a time with a pause between them and are only considered applied once
+    the receiver echoes them back. Commands waiting in the queue are replaced by newer commands for
+    the same setting, and can be dropped all at once when a newer volume made them stale. Commands
+    forwarded for other telnet clients share the same pacing but are sent once, as they were given.
+
+    The echo is awaited from the moment a command is written, so the time denonavr already waited for
+    its confirmation counts towards the ack timeout. A batch gives up on the commands it couldn't get
+    through within the batch timeout, and nothing is retried once the queue is shutting down.
+
+    Args:
+        send_command: Coroutine writing a single command to the receiver.
+        interval (float): Seconds to wait between two commands.
+        ack_timeout (float): Seconds to wait for the receiver to echo a command.
+        retries (int): How many times a command without echo is sent again.
+        batch_timeout (float): Seconds a batch may take from being submitted until its last command.
+        on_ack: Called with the seconds it took the receiver to echo a command.
+    """
+
+    def __init__(
+        self, send_command, interval=0.05, ack_timeout=1.0, retries=2, batch_timeout=5.0, on_ack=None
+    ):
+        self.send_command = send_command
+        self.interval = interval
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.batch_timeout = batch_timeout
+        self.on_ack = on_ack
+        self.shutting_down = False  # Set on shutdown, when waiting for retries would only hold it up
+
+        self.worker_task = None
+        self._queue = OrderedDict()  # command key -> (command, batch)
+        self._forwarded = 0  # Makes the keys of forwarded commands unique
+        self._wakeup = asyncio.Event()
+        self._pending_acks = {}  # command -> asyncio.Event set when the receiver echoes it
+
+        self.stats = {
+            "submitted": 0,
+            "sent": 0,
+            "acknowledged": 0,
+            "retried": 0,
+            "superseded": 0,
+            "failed": 0,
+            "forwarded": 0,
+        }
+        self.ack_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.batch_latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def start(self, tasks: set = None):
+        """Start the writer task."""
+        self.worker_task = asyncio.create_task(self._worker())
+        if tasks is not None:
+            tasks.add(self.worker_task)  # Track the task
+            self.worker_task.add_done_callback(tasks.discard)
+        return self.worker_task
+
+    async def submit(self, commands) -> bool:
+        """
+        Queue a batch of commands and wait until it is done.
+
+        Returns:
+            bool: True if the receiver acknowledged every command of the batch, False if any command
+            failed.
+
+        Raises:
+            BatchSuperseded: If no command failed, but some were replaced by newer ones or dropped as stale.
+        """
+        if not commands:
+            return True
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        batch = CommandBatch(len(commands), now, deadline=now + self.batch_timeout)
+        for command in commands:
+            key = command_key(command)
+            superseded = self._queue.get(key)
+            if superseded is not None:
+                self.stats["superseded"] += 1
+                superseded[1].command_done(False, superseded=True)
+            # Replacing an existing key keeps its place in the queue
+            self._queue[key] = (command, batch)
+        self.stats["submitted"] += len(commands)
+        self._wakeup.set()
+
+        succeeded = await batch.future
+        self.batch_latencies.append(loop.time() - batch.submitted_at)
+        if not succeeded and not batch.failed:
+            raise BatchSuperseded(f"{batch.superseded} of {len(commands)} commands were superseded")
+        return succeeded
+
+    async def forward(self, command: str) -> bool:
+        """
+        Queue a command of another telnet client and wait until it was written.
+
+        Forwarded commands keep their order and are neither coalesced, dropped as stale nor retried,
+        since the receiver doesn't echo queries and a client may repeat a command like MVUP on purpose.
+
+        Returns:
+            bool: False if the command couldn't be written.
+        """
+        loop = asyncio.get_running_loop()
+        batch = CommandBatch(1, loop.time(), expect_echo=False)
+        self._forwarded += 1
+        self._queue[("forwarded", self._forwarded)] = (command, batch)
+        self._wakeup.set()
+        return await batch.future
+
+    def drop_pending(self):
+        """Drop every command that hasn't been sent yet, for example because a newer volume made it stale."""
+        stale = [key for key, (_, batch) in self._queue.items() if batch.expect_echo]
+        if not stale:
+            return
+        logger.info(f"Dropping {len(stale)} stale commands")
+        for key in stale:
+            _, batch = self._queue.pop(key)
+            self.stats["superseded"] += 1
+            batch.command_done(False, superseded=True)
+
+    async def on_echo(self, message: str):
+        """Handle a telnet message from the receiver, acknowledging the command it echoes."""
+        ack = self._pending_acks.get(message.strip())
+        if ack is not None:
+            ack.set()
+
+    async def _worker(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._queue:
+                self._wakeup.clear()
+                continue
+
+            _, (command, batch) = self._queue.popitem(last=False)
+            if batch.expect_echo and asyncio.get_running_loop().time() >= batch.deadline:
+                logger.warning(f"Not sending {command}, its batch ran out of time")
+                self.stats["failed"] += 1
+                batch.command_done(False)
+                continue
+            if batch.expect_echo:
+                batch.command_done(await self._send_with_retries(command, batch.deadline))
+            else:
+                batch.command_done(await self._send_once(command))
+
+            # Give the receiver time to process the command before the next one
+            await asyncio.sleep(self.interval)
+
+    async def _send_once(self, command: str) -> bool:
+        try:
+            await self.send_command(command)
+        except Exception as e:
+            logger.error(f"Failed to forward {command}: {e}")
+            return False
+        self.stats["forwarded"] += 1
+        return True
+
+    async def _send_with_retries(self, command: str, deadline: float) -> bool:
+        loop = asyncio.get_running_loop()
+        ack = asyncio.Event()
+        self._pending_acks[command] = ack
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt > 0:
+                    if self.shutting_down or loop.time() >= deadline:
+                        break
+                    self.stats["retried"] += 1
+                    logger.info(f"Retrying {command}, attempt {attempt + 1}")
+
+                sent_at = loop.time()
+                try:
+                    await asyncio.wait_for(self.send_command(command), max(deadline - sent_at, 0))
+                    self.stats["sent"] += 1
+                    # denonavr waits for the echo as confirmation, so it has usually arrived already
+                    if not ack.is_set():
+                        now = loop.time()
+                        timeout = min(sent_at + self.ack_timeout, deadline) - now
+                        await asyncio.wait_for(ack.wait(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    logger.warning(f"No echo from the receiver for {command}")
+                    continue
+                except Exception as e:
+                    logger.error(f"Failed to send {command}: {e}")
+                    await asyncio.sleep(self.interval)
+                    continue
+
+                latency = loop.time() - sent_at
+                self.stats["acknowledged"] += 1
+                self.ack_latencies.append(latency)
+                if self.on_ack is not None:
+                    self.on_ack(latency)
+                return True
+        finally:
+            del self._pending_acks[command]
+
+        self.stats["failed"] += 1
+        return False
+
+    def summary(self) -> dict:
+        """Counters plus median and worst latencies in seconds."""
+        summary = dict(self.stats)
+        for name, samples in (
+            ("ack_latency", self.ack_latencies),
+            ("batch_latency", self.batch_latencies),
+        ):
+            ordered = sorted(samples)
+            summary[f"{name}_median"] = ordered[len(ordered) // 2] if ordered else None
+            summary[f"{name}_max"] = ordered[-1] if ordered else None
+        return summary
+
+
+def command_queue_from_env(send_command, on_ack=None) -> CommandQueue:
+    """Build the command queue from the COMMAND_* environment variables."""
+    return CommandQueue(
+        send_command,
+        interval=float(os.getenv("COMMAND_INTERVAL", "0.05")),
+        ack_timeout=float(os.getenv("COMMAND_ACK_TIMEOUT", "1.0")),
+        retries=int(os.getenv("COMMAND_RETRIES", "2")),
+        batch_timeout=float(os.getenv("COMMAND_BATCH_TIMEOUT", "5.0")),
+        on_ack=on_ack,
+    )
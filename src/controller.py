@@ -0,0 +1,738 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from adjustmentlogic import (
+    AdjustmentState,
+    activate_adjustment_table,
+    adjust_speaker_volumes,
+    compile_profile_table,
+    handle_threshold_crossing,
+    handle_volume_change_callback,
+    parse_adjustment_command,
+    parse_volume,
+    prepare_adjustment_table,
+    send_level_changes,
+)
+from applied_levels import applied_levels_record_from_env
+from command_queue import BatchSuperseded, command_queue_from_env
+from debounce import Debouncer, debounce_policy_from_env
+from discovery import (
+    StartupTimer,
+    apply_receiver_metadata,
+    discovery_cache_path,
+    discovery_cache_ttl,
+    read_receiver_metadata,
+    write_receiver_metadata,
+)
+from json_loader import (
+    load_calibration_profile,
+    load_calibration_profiles,
+    watch_calibration_profile,
+    watch_calibration_profiles,
+)
+from metrics import BATCH_SIZE, COMPUTE_TIME, DEBOUNCE_WAIT, RECOVERY_TIME, SEND_LATENCY
+from profiles import load_profile_selector
+from reconnect import reconnect_policy_from_env
+from state_api import ADJUSTMENT_HISTORY, STATE_FEED
+from telnet_proxy import TelnetProxy, telnet_proxy_port_from_env
+
+logger = logging.getLogger(__name__)
+
+
+def load_receiver_configs():
+    """
+    Read which receivers to drive.
+
+    RECEIVERS_CONFIG points to a JSON file with a "receivers" list, each entry holding a "name", "ip",
+    "config_path" and optionally "reference_volume", "speaker_config", "curve", "profiles" and
+    "telnet_proxy_port". Without it a single receiver is configured from RECEIVER_IP, CONFIG_PATH,
+    REFERENCE_VOLUME, SPEAKER_CONFIG, CORRECTION_CURVE, CALIBRATION_PROFILES and TELNET_PROXY_PORT.
+    """
+    receivers_config_path = os.getenv("RECEIVERS_CONFIG")
+    if receivers_config_path:
+        with open(receivers_config_path, encoding="utf-8") as file:
+            receiver_configs = json.load(file).get("receivers", [])
+
+        for receiver_config in receiver_configs:
+            if not receiver_config.get("ip"):
+                raise ValueError(
+                    f"Receiver '{receiver_config.get('name')}' in {receivers_config_path} has no ip"
+                )
+        return receiver_configs
+
+    # Get receiver IP from env variable
+    receiver_ip = os.getenv("RECEIVER_IP")
+    # Ensure that receiver_ip is supplied
+    if not receiver_ip:
+        raise ValueError(
+            "Receiver IP is required but not provided. To set the environment variable use set RECEIVER_IP=<receiver ip> in Windows or export RECEIVER_IP=<receiver ip> in MacOS or Linux"
+        )
+    return [
+        {
+            "name": receiver_ip,
+            "ip": receiver_ip,
+            "config_path": os.getenv("CONFIG_PATH", "config"),
+        }
+    ]
+
+
+def threshold_hysteresis_from_env():
+    """The hysteresis in dB for threshold corrections, or None when they are disabled."""
+    if os.getenv("THRESHOLD_CORRECTIONS", "false").lower() in ("1", "true", "yes"):
+        return float(os.getenv("THRESHOLD_HYSTERESIS", "0.5"))
+    return None
+
+
+def startup_sync_timeout_from_env():
+    """Seconds to wait for the current volume when starting, or None when startup sync is disabled."""
+    if os.getenv("STARTUP_SYNC", "true").lower() in ("1", "true", "yes"):
+        return float(os.getenv("STARTUP_SYNC_TIMEOUT", "2.0"))
+    return None
+
+
+class ReceiverController:
+    """
+    Drives the DEQ correction of a single receiver.
+
+    Bundles the receiver connection, its calibration, the debounce state and what was last applied to
+    it, so that one event loop can drive any number of receivers independently of each other.
+    """
+
+    def __init__(
+        self,
+        name,
+        receiver,
+        config_path,
+        tasks: set,
+        reference_volume=None,
+        speaker_config=None,
+        journal=None,
+        curve=None,
+        create_receiver=None,
+        profiles=None,
+        telnet_proxy_port=None,
+    ):
+        self.name = name
+        self.receiver = receiver
+        self.create_receiver = create_receiver  # Coroutine function making the receiver when none is given
+        self.config_path = config_path
+        self.profile_options = {
+            "reference_volume": reference_volume,
+            "speaker_config": speaker_config,
+            "curve": curve,
+        }
+        self.tasks = tasks
+        self.running_tasks = set()  # The tasks of this controller among the shared ones, stopped on shutdown
+        self.journal = journal  # Optional JournalRecorder
+
+        self.state = AdjustmentState()
+        self.calibration_profile = None
+        self.profile_selector = load_profile_selector(profiles)
+        self.profiles = {}  # (profile, compiled table) keyed by file name, when switching profiles
+        self.active_profile = None
+        self.input_source = None
+        self.sound_mode = None
+        self.dynamic_eq = None  # Whether Dynamic EQ is on, None until the receiver reports it
+        self.latest_volume = None
+        self.threshold_hysteresis = threshold_hysteresis_from_env()
+        self.startup_sync_timeout = startup_sync_timeout_from_env()
+        self.calibration_poll_interval = float(os.getenv("CALIBRATION_POLL_INTERVAL", "5"))
+        self.sync_levels = None  # Channel levels reported by the receiver while syncing
+        self.sync_volume = None  # Set once the receiver reported its volume while syncing
+        self.applied_record = applied_levels_record_from_env(config_path, name)
+        self.send_time = 0.0  # Seconds spent waiting for the receiver during the current correction
+        self.reconnects = 0
+        self.reconnect_policy = reconnect_policy_from_env()
+        self.last_heard_at = None  # Loop time of the last message from the receiver
+        self.startup_timer = None
+        self.first_correction_logged = False
+        self.last_batch = []
+        self.recent_adjustments = deque(maxlen=ADJUSTMENT_HISTORY)
+        self.state_feed = STATE_FEED
+
+        # All commands go through a single writer
+        self.command_queue = command_queue_from_env(
+            self.send_command, lambda latency: SEND_LATENCY.observe(self.name, latency)
+        )
+        self.debouncer = Debouncer(
+            debounce_policy_from_env(),
+            self.send_debounced_volume,
+            tasks,
+            on_stale=self.command_queue.drop_pending,
+        )
+
+        # Other telnet clients share this connection instead of competing for the receiver's sessions
+        if telnet_proxy_port is None:
+            telnet_proxy_port = telnet_proxy_port_from_env()
+        self.telnet_proxy_port = telnet_proxy_port
+        self.telnet_proxy = TelnetProxy(name, self.command_queue) if telnet_proxy_port else None
+
+    def _track(self, coroutine):
+        return self._keep(asyncio.create_task(coroutine))
+
+    def _keep(self, task):
+        for tasks in (self.tasks, self.running_tasks):
+            tasks.add(task)  # Track the task
+            task.add_done_callback(tasks.discard)  # Remove from set when done
+        return task
+
+    async def start(self):
+        """Load the calibration and start monitoring the receiver."""
+        self.startup_timer = StartupTimer()
+        self._keep(self.command_queue.start())
+
+        if self.threshold_hysteresis is not None:
+            logger.info(
+                f"{self.name}: Correcting on adjustment boundaries with a hysteresis of {self.threshold_hysteresis}dB"
+            )
+
+        if self.profile_selector is not None:
+            await self.load_profiles()
+        else:
+            # Load the JSON calibration data and resolve everything needed per volume change
+            self.calibration_profile = await load_calibration_profile(
+                self.config_path, **self.profile_options
+            )
+            self.startup_timer.phase("calibration")
+
+            # Compile the adjustments for every main volume once
+            prepare_adjustment_table(self.state, self.calibration_profile)
+            self.startup_timer.phase("table")
+
+        # Reload the calibration when the .ady file changes
+        poll_interval = self.calibration_poll_interval
+        if poll_interval > 0 and self.profile_selector is not None:
+            self._track(
+                watch_calibration_profiles(
+                    self.config_path,
+                    lambda: {name: profile for name, (profile, _) in self.profiles.items()},
+                    self.reload_profile,
+                    poll_interval,
+                    **self.profile_options,
+                )
+            )
+        elif poll_interval > 0:
+            self._track(
+                watch_calibration_profile(
+                    self.config_path,
+                    lambda: self.calibration_profile,
+                    self.reload_calibration_profile,
+                    poll_interval,
+                    **self.profile_options,
+                )
+            )
+
+        # Levels left on the receiver by the last run, in case it didn't shut down cleanly
+        if self.applied_record is not None:
+            recorded_levels = self.applied_record.load()
+            if recorded_levels:
+                logger.info(
+                    f"{self.name}: Last run left {len(recorded_levels)} channel levels applied, sending only what differs"
+                )
+                self.state.applied_levels.update(recorded_levels)
+
+        if self.receiver is None:
+            self.receiver = await self.create_receiver()
+            self.startup_timer.phase("receiver")
+
+        # Set up AVR with the loaded JSON data
+        await self.setup_volume_monitoring()
+        logger.info(f"{self.name}: Monitoring volume changes, started in {self.startup_timer.summary()}")
+        self.publish_state()
+
+        if self.telnet_proxy is not None:
+            try:
+                await self.telnet_proxy.start(self.telnet_proxy_port)
+            except OSError as e:
+                logger.error(f"{self.name}: Failed to share the telnet connection: {e}")
+
+        if self.reconnect_policy.poll_interval > 0:
+            self._track(self.supervise_connection())
+
+    async def load_profiles(self):
+        """Load and compile every calibration in the config folder, ready to be switched to."""
+        profiles = await load_calibration_profiles(self.config_path, **self.profile_options)
+        self.startup_timer.phase("calibration")
+
+        missing = self.profile_selector.file_names() - profiles.keys()
+        if missing:
+            logger.error(
+                f"{self.name}: Calibration files {', '.join(sorted(missing))} not found in {self.config_path}"
+            )
+
+        self.profiles = {
+            name: (profile, compile_profile_table(profile)) for name, profile in profiles.items()
+        }
+        self.startup_timer.phase("table")
+        logger.info(f"{self.name}: Compiled calibration profiles {', '.join(self.profiles)}")
+
+        name = self.select_profile()
+        if name is not None:
+            self.switch_profile(name)
+
+    def select_profile(self):
+        """The file name of the profile for the current input source and sound mode."""
+        name = self.profile_selector.select(self.input_source, self.sound_mode)
+        if name in self.profiles:
+            return name
+        # Like without profiles, fall back to the first file by name
+        return next(iter(sorted(self.profiles)), None)
+
+    def switch_profile(self, name):
+        """Make a compiled profile the active one, without reading or compiling anything."""
+        profile, table = self.profiles[name]
+        activate_adjustment_table(self.state, profile, table)
+        self.calibration_profile = profile
+        self.active_profile = name
+        self.publish_state()
+
+    async def profile_callback(self, zone, event, parameter):
+        if zone != "Main":
+            return
+        if event == "SI":
+            self.input_source = parameter
+        else:
+            self.sound_mode = parameter
+
+        name = self.select_profile()
+        if name is None or name == self.active_profile:
+            return
+        logger.info(f"{self.name}: {event} {parameter}, switching to calibration {name}")
+        self.switch_profile(name)
+
+        # The base levels differ, so the correction has to be sent even if the factor is the same
+        self.state.latest_adjustment = None
+        if self.latest_volume is not None and self.sync_volume is None:
+            self._track(self.apply_latest_volume())
+
+    async def dynamic_eq_callback(self, zone, event, parameter):
+        """Follow the receiver's Dynamic EQ and its reference level offset, which the correction depends on."""
+        setting, _, value = parameter.partition(" ")
+        syncing = self.sync_volume is not None  # The sync applies the correction once it is done
+        if setting == "DYNEQ" and value in ("ON", "OFF"):
+            enabled = value == "ON"
+            if enabled == self.dynamic_eq:
+                return
+            was_off = self.dynamic_eq is False
+            self.dynamic_eq = enabled
+            self.publish_state()
+            if not enabled:
+                logger.info(f"{self.name}: Dynamic EQ is off, suspending corrections")
+                if not syncing:
+                    self._track(self.restore_base_levels())
+            elif was_off:
+                logger.info(f"{self.name}: Dynamic EQ is on, resuming corrections")
+                self.state.latest_adjustment = None
+                if self.latest_volume is not None and not syncing:
+                    self._track(self.apply_latest_volume())
+        elif setting == "REFLEV" and value.isdigit():
+            offset = int(value)
+            if offset == self.state.reference_level_offset:
+                return
+            logger.info(f"{self.name}: Dynamic EQ reference level offset is {offset}dB")
+            self.state.reference_level_offset = offset
+            self.publish_state()
+            if self.dynamic_eq is not False and self.latest_volume is not None and not syncing:
+                self._track(self.apply_latest_volume())
+
+    async def restore_base_levels(self):
+        """Put the calibrated levels back once, the correction only makes sense while Dynamic EQ is on."""
+        async with self.debouncer.lock:
+            await self.reset_speaker_volume()
+            self.state.latest_adjustment = None
+        self.publish_state()
+
+    async def apply_latest_volume(self):
+        """Apply the correction for the latest volume right away, outside of the debounce."""
+        async with self.debouncer.lock:
+            await self.send_debounced_volume(self.latest_volume)
+
+    async def setup_volume_monitoring(self):
+        # Skip the HTTP discovery when only telnet is available, like with the fake receiver
+        telnet_only = os.getenv("TELNET_ONLY", "false").lower() in ("1", "true", "yes")
+
+        # Discovery only tells us what the receiver is, so a recent one is reused
+        host = getattr(self.receiver, "host", None)
+        cache_path = discovery_cache_path(self.config_path)
+        metadata = None
+        if not telnet_only and host is not None:
+            metadata = read_receiver_metadata(cache_path, host, discovery_cache_ttl())
+            if metadata is not None:
+                logger.info(
+                    f"{self.name}: Using cached discovery of {metadata.get('manufacturer')} {metadata.get('model_name')}"
+                )
+                apply_receiver_metadata(self.receiver, metadata)
+        discover = not telnet_only and metadata is None
+
+        if discover:
+            await self.receiver.async_setup()
+            if host is not None:
+                write_receiver_metadata(cache_path, host, self.receiver)
+            self.phase("discovery")
+        await self.receiver.async_telnet_connect()
+        self.phase("telnet")
+        self.receiver.register_callback("MV", self.update_callback)
+        self.receiver.register_callback("SS", self.echo_callback)
+        self.receiver.register_callback("ALL", self.heard_callback)
+        self.receiver.register_callback("PS", self.dynamic_eq_callback)
+        if self.telnet_proxy is not None:
+            self.receiver.register_callback("ALL", self.telnet_proxy.on_message)
+        if self.profile_selector is not None:
+            self.receiver.register_callback("SI", self.profile_callback)
+            self.receiver.register_callback("MS", self.profile_callback)
+
+        if discover:
+            await self.receiver.async_update()  # Initial update to get the current state
+            self.phase("update")
+
+        if self.startup_sync_timeout is not None:
+            await self.sync_with_receiver(self.startup_sync_timeout)
+            self.phase("sync")
+
+    def phase(self, name):
+        if self.startup_timer is not None:
+            self.startup_timer.phase(name)
+
+    async def sync_with_receiver(self, timeout: float):
+        """
+        Read the current main volume and channel levels and apply the correction for them once.
+
+        Channels already at their corrected level aren't sent again. Volume changes arriving while
+        syncing are folded in, only the latest one is applied.
+        """
+        self.sync_levels = {}
+        self.sync_volume = asyncio.Event()
+        try:
+            # Queries aren't echoed, so they bypass the command queue.
+            # The receiver answers in order, so the input, sound mode, Dynamic EQ and levels are in once the volume is.
+            queries = ("PSDYNEQ ?", "PSREFLEV ?", "SSLEV ?", "MV?")
+            if self.profile_selector is not None:
+                queries = ("SI?", "MS?") + queries
+            await self.receiver.async_send_telnet_commands(*queries)
+            await asyncio.wait_for(self.sync_volume.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name}: The receiver didn't report its volume")
+        except Exception as e:
+            logger.error(f"{self.name}: Failed to query the receiver: {e}")
+        finally:
+            levels = self.sync_levels
+            self.sync_levels = None
+            self.sync_volume = None
+
+        # The receiver knows best, the recorded levels only stand in for channels it didn't report
+        differing = [
+            speaker
+            for speaker, level in levels.items()
+            if self.state.applied_levels.get(speaker, level) != level
+        ]
+        if differing:
+            logger.info(
+                f"{self.name}: Levels of {', '.join(differing)} were changed outside of this tool"
+            )
+        # Only speakers whose level differs from the receiver's are sent
+        self.state.applied_levels.update(levels)
+        if self.dynamic_eq is False:
+            logger.info(f"{self.name}: Dynamic EQ is off, restoring the calibrated levels")
+            await self.restore_base_levels()
+            return
+        if self.latest_volume is None:
+            return
+
+        logger.info(
+            f"{self.name}: Receiver is at {self.latest_volume}dB with {len(levels)} channel levels, applying the correction"
+        )
+        await self.apply_latest_volume()
+
+    async def update_callback(self, zone, event, parameter):
+        logger.info(f"{self.name}: Zone: {zone}, Event: {event}, Parameter: {parameter}")
+        # Skip anything that isn't a volume, like the MAX the receiver sends along
+        if zone == "Main" and event == "MV" and parameter.isdigit():
+            await self.on_volume(parse_volume(parameter))
+
+    async def on_volume(self, volume: float):
+        """Handle a new main volume of the receiver."""
+        if self.journal is not None:
+            self.journal.record_volume(self.name, volume)
+        self.latest_volume = volume
+        self.publish_state()
+        if self.sync_volume is not None:
+            # The startup sync applies the latest volume once it is done
+            self.sync_volume.set()
+            return
+        if self.dynamic_eq is False:
+            # Nothing to correct, don't even debounce
+            return
+        await self.debounce_send_volume(volume)
+        if self.threshold_hysteresis is not None:
+            await self.correct_on_threshold(volume)
+
+    async def heard_callback(self, zone, event, parameter):
+        self.last_heard_at = asyncio.get_running_loop().time()
+
+    async def echo_callback(self, zone, event, parameter):
+        if self.sync_levels is not None:
+            level = parse_adjustment_command(event + parameter)
+            if level is not None:
+                self.sync_levels[level[0]] = level[1]
+        await self.command_queue.on_echo(event + parameter)
+
+    async def debounce_send_volume(self, volume: float):
+        """Debounce the volume and send only the latest when the debounce policy says so."""
+        self.latest_volume = volume
+        self.debouncer.trigger(volume)
+
+    async def send_debounced_volume(self, volume: float):
+        """Apply the correction for a volume released by the debouncer."""
+        if self.dynamic_eq is False:
+            # Dynamic EQ was turned off while this volume was waiting
+            return
+        if self.debouncer.last_wait is not None:
+            DEBOUNCE_WAIT.observe(self.name, self.debouncer.last_wait)
+
+        started_at = time.perf_counter()
+        self.send_time = 0.0
+        await handle_volume_change_callback(
+            self.state, volume, self.calibration_profile, self.send_adjustments
+        )
+        COMPUTE_TIME.observe(self.name, time.perf_counter() - started_at - self.send_time)
+        self.publish_state()
+
+    async def correct_on_threshold(self, volume: float):
+        """Correct during a volume ramp as soon as the adjustment factor changes."""
+        # A correction in flight or about to start covers the ramp already, and waiting for it would
+        # only replay a volume that is stale by then
+        callback_task = self.debouncer.callback_task
+        if self.debouncer.lock.locked() or (callback_task is not None and not callback_task.done()):
+            return
+        if volume != self.latest_volume:
+            return
+        # Share the debouncer's lock so corrections never overlap
+        async with self.debouncer.lock:
+            await handle_threshold_crossing(
+                self.state, volume, self.threshold_hysteresis, self.send_adjustments
+            )
+        self.publish_state()
+
+    async def send_adjustments(self, adjustments):
+        logger.info(f"{self.name}: Sending adjustments")
+        if self.journal is not None:
+            self.journal.record_batch(self.name, adjustments)
+        BATCH_SIZE.observe(self.name, len(adjustments))
+
+        started_at = time.perf_counter()
+        try:
+            succeeded = await self.command_queue.submit(adjustments)
+            if succeeded and self.applied_record is not None:
+                await self.applied_record.update(adjustments)
+        except BatchSuperseded:
+            # A newer volume took over, the superseded counter keeps track of these
+            logger.debug(f"{self.name}: Adjustments superseded before they were sent")
+            return False
+        finally:
+            self.send_time += time.perf_counter() - started_at
+
+        if succeeded:
+            logger.info(
+                f"{self.name}: Adjustments acknowledged by the receiver in {self.command_queue.batch_latencies[-1]:.3f}s"
+            )
+            self.record_batch(adjustments)
+            if not self.first_correction_logged and self.startup_timer is not None:
+                self.first_correction_logged = True
+                logger.info(f"{self.name}: First correction applied {self.startup_timer.elapsed():.3f}s after start")
+            return True
+
+        logger.error(f"{self.name}: Failed to send adjustments")
+        return False
+
+    async def send_command(self, command):
+        await self.receiver.async_send_telnet_commands(command)
+
+    async def supervise_connection(self):
+        """Notice when the telnet connection is lost and bring the receiver back to the current correction."""
+        policy = self.reconnect_policy
+        loop = asyncio.get_running_loop()
+        keepalive_sent_at = None
+        while True:
+            await asyncio.sleep(policy.poll_interval)
+            now = loop.time()
+
+            # Receivers without the property are assumed healthy
+            lost = not getattr(self.receiver, "telnet_healthy", True)
+            # Only receivers that report every message can be checked for silence
+            if not lost and self.last_heard_at is not None:
+                silence = now - self.last_heard_at
+                if policy.timed_out(silence):
+                    logger.warning(f"{self.name}: No answer from the receiver for {silence:.1f}s")
+                    lost = True
+                elif policy.keepalive_due(silence) and (
+                    keepalive_sent_at is None or keepalive_sent_at < self.last_heard_at
+                ):
+                    keepalive_sent_at = now
+                    await self.send_keepalive()
+            if not lost:
+                continue
+
+            logger.warning(f"{self.name}: Telnet connection lost, reconnecting")
+            await self.reconnect()
+            recovery_time = loop.time() - now
+            self.reconnects += 1
+            RECOVERY_TIME.observe(self.name, recovery_time)
+            logger.info(f"{self.name}: Telnet connection restored, recovered in {recovery_time:.3f}s")
+            keepalive_sent_at = None
+
+    async def send_keepalive(self):
+        # Through the single writer like every other command, the receiver doesn't echo queries
+        if not await self.command_queue.forward("PW?"):
+            logger.warning(f"{self.name}: Failed to send keepalive")
+
+    async def reconnect(self):
+        """Reconnect with jittered backoff, then read the receiver's state and re-apply the correction."""
+        # Take over from denonavr's own reconnect loop, and drop a connection that went silent
+        await self.disconnect_telnet()
+
+        attempt = 0
+        while True:
+            try:
+                await self.receiver.async_telnet_connect()
+                break
+            except Exception as e:
+                delay = self.reconnect_policy.backoff(attempt)
+                attempt += 1
+                logger.warning(
+                    f"{self.name}: Reconnect attempt {attempt} failed: {e}, retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+        # Callbacks stay registered with denonavr across connections. The receiver may have been
+        # changed while nobody was listening, so forget what was applied and read it again.
+        self.last_heard_at = None
+        self.state.latest_adjustment = None
+        self.state.applied_levels.clear()
+        if self.startup_sync_timeout is not None:
+            await self.sync_with_receiver(self.startup_sync_timeout)
+        elif self.latest_volume is not None:
+            await self.apply_latest_volume()
+
+    async def disconnect_telnet(self):
+        disconnect = getattr(self.receiver, "async_telnet_disconnect", None)
+        if disconnect is not None:
+            try:
+                await disconnect()
+            except Exception as e:
+                logger.warning(f"{self.name}: Failed to close the telnet connection: {e}")
+
+    def record_batch(self, commands):
+        """Keep an acknowledged batch for the state API and push it to its clients."""
+        self.last_batch = list(commands)
+        entry = {"time": time.time(), "volume": self.latest_volume, "commands": self.last_batch}
+        self.recent_adjustments.append(entry)
+        self.state_feed.broadcast({"receiver": self.name, "adjustment": entry})
+
+    def state_snapshot(self) -> dict:
+        """What is known about the receiver, as served by the state API."""
+        table = self.state.adjustment_table
+        return {
+            "volume": self.latest_volume,
+            "reference_volume": table.reference_volume if table is not None else None,
+            "latest_adjustment": self.state.latest_adjustment,
+            "profile": self.active_profile,
+            "dynamic_eq": self.dynamic_eq,
+            "reference_level_offset": self.state.reference_level_offset,
+            "last_batch": self.last_batch,
+            "connected": self.receiver is not None
+            and getattr(self.receiver, "telnet_healthy", True),
+        }
+
+    def publish_state(self):
+        """Push what changed in the state to the state API clients."""
+        self.state_feed.publish(self.name, self.state_snapshot())
+
+    def counters(self) -> dict:
+        """Counters exported as metrics."""
+        stats = self.command_queue.stats
+        return {
+            "avr_debounce_cancelled_total": self.debouncer.cancelled,
+            "avr_skipped_events_total": self.state.skipped_events,
+            "avr_reconnects_total": self.reconnects,
+            "avr_commands_sent_total": stats["sent"],
+            "avr_commands_failed_total": stats["failed"],
+            "avr_commands_superseded_total": stats["superseded"],
+        }
+
+    def reload_calibration_profile(self, profile):
+        """Swap in a rebuilt calibration profile and re-apply the correction with it."""
+        prepare_adjustment_table(self.state, profile)
+        self.calibration_profile = profile
+
+        # The base levels may have changed, so the next correction has to be sent even if the factor is the same
+        self.state.latest_adjustment = None
+        # Wait for a correction in flight instead of interleaving with it, the startup sync applies it itself
+        if self.latest_volume is not None and self.sync_volume is None:
+            self._track(self.apply_latest_volume())
+
+    def reload_profile(self, profile):
+        """Swap in one rebuilt profile of the set, re-applying the correction if it is the active one."""
+        name = os.path.basename(profile.source_path)
+        self.profiles[name] = (profile, compile_profile_table(profile))
+        if name != self.active_profile:
+            return
+
+        self.switch_profile(name)
+        self.state.latest_adjustment = None
+        # The startup sync applies the correction itself once it is done
+        if self.latest_volume is not None and self.sync_volume is None:
+            self._track(self.apply_latest_volume())
+
+    async def reset_speaker_volume(self):
+        logger.info(f"{self.name}: Resetting speaker volumes to initial levels")
+        table = self.state.adjustment_table
+        if table is not None:
+            if table.reset_commands:
+                await send_level_changes(
+                    self.state,
+                    table.reset_levels,
+                    table.reset_commands,
+                    self.send_adjustments,
+                )
+            return
+
+        if self.calibration_profile is not None:
+            await adjust_speaker_volumes(
+                self.state,
+                self.calibration_profile.speaker_levels,
+                0,
+                self.send_adjustments,
+                True,
+            )
+
+    async def shutdown(self):
+        """Stop correcting and put the initial speaker levels back."""
+        # Send the reset once, a receiver that doesn't answer shouldn't hold up the shutdown
+        self.command_queue.shutting_down = True
+
+        # Stop waiting for pending volume changes and let a running correction finish
+        timer_task = self.debouncer.cancel()
+        if timer_task is not None:
+            await asyncio.gather(timer_task, return_exceptions=True)
+            logger.info(f"{self.name}: Debounce task canceled during shutdown.")
+        if self.debouncer.callback_task is not None:
+            await asyncio.gather(self.debouncer.callback_task, return_exceptions=True)
+
+        # Reset speaker volumes explicitly, nothing was sent if the receiver was never made
+        if self.receiver is not None:
+            await self.reset_speaker_volume()
+        if self.telnet_proxy is not None:
+            await self.telnet_proxy.close()
+
+        # Stop the command writer, the calibration watcher and the connection supervisor
+        running = [task for task in self.running_tasks if task is not asyncio.current_task()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        if self.receiver is not None:
+            await self.disconnect_telnet()
+        logger.info(f"{self.name}: Command statistics: {self.command_queue.summary()}")
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+from bisect import bisect_right
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class PiecewiseCurve(NamedTuple):
+    """
+    Piecewise linear curve through knots, continued with a fixed slope on either side.
+
+    knots is a tuple of (x, y) pairs with increasing x.
+    """
+
+    knots: tuple
+    slope_below: float = 0.0
+    slope_above: float = 0.0
+
+    def value(self, x):
+        first_x, first_y = self.knots[0]
+        if x <= first_x:
+            return first_y - (first_x - x) * self.slope_below
+
+        last_x, last_y = self.knots[-1]
+        if x >= last_x:
+            return last_y + (x - last_x) * self.slope_above
+
+        index = bisect_right([knot[0] for knot in self.knots], x)
+        (x0, y0), (x1, y1) = self.knots[index - 1], self.knots[index]
+        return y0 + (x - x0) * ((y1 - y0) / (x1 - x0))
+
+
+class CorrectionCurve(NamedTuple):
+    """
+    Shape of the DEQ correction.
+
+    The correction at a main volume is the reference curve at the reference volume minus the boost
+    curve at the main volume. Half and quarter adjusted speakers are changed by the correction times
+    their scale.
+    """
+
+    boost: PiecewiseCurve
+    reference: PiecewiseCurve
+    half_scale: float = 1.0
+    quarter_scale: float = 0.5
+
+
+# The correction this tool has always applied
+DEFAULT_CURVE = CorrectionCurve(
+    boost=PiecewiseCurve(knots=((49, 0), (50, 1), (55, 3.5)), slope_above=0.2),
+    reference=PiecewiseCurve(knots=((55, 3.5),), slope_below=0.2, slope_above=0.2),
+)
+
+
+def parse_piecewise_curve(config: dict, default: PiecewiseCurve) -> PiecewiseCurve:
+    knots = tuple(
+        (float(x), float(y)) for x, y in config.get("knots", default.knots)
+    )
+    if not knots:
+        raise ValueError("A curve needs at least one knot")
+    if any(left[0] >= right[0] for left, right in zip(knots, knots[1:])):
+        raise ValueError(f"Curve knots must have increasing volumes: {knots}")
+
+    return PiecewiseCurve(
+        knots=knots,
+        slope_below=float(config.get("slope_below", default.slope_below)),
+        slope_above=float(config.get("slope_above", default.slope_above)),
+    )
+
+
+def parse_correction_curve(config: dict) -> CorrectionCurve:
+    """
+    Build a correction curve from its JSON form. Anything left out keeps its default:
+
+        {
+            "boost": {"knots": [[49, 0], [50, 1], [55, 3.5]], "slope_above": 0.2},
+            "reference": {"knots": [[55, 3.5]], "slope_below": 0.2, "slope_above": 0.2},
+            "group_scales": {"half": 1.0, "quarter": 0.5}
+        }
+    """
+    group_scales = config.get("group_scales", {})
+    half_scale = float(group_scales.get("half", DEFAULT_CURVE.half_scale))
+    quarter_scale = float(group_scales.get("quarter", DEFAULT_CURVE.quarter_scale))
+    if half_scale < 0 or quarter_scale < 0:
+        raise ValueError("Group scales can't be negative")
+
+    return CorrectionCurve(
+        boost=parse_piecewise_curve(config.get("boost", {}), DEFAULT_CURVE.boost),
+        reference=parse_piecewise_curve(config.get("reference", {}), DEFAULT_CURVE.reference),
+        half_scale=half_scale,
+        quarter_scale=quarter_scale,
+    )
+
+
+def load_correction_curve(curve_config=None) -> CorrectionCurve:
+    """
+    Load the correction curve from the given config or the CORRECTION_CURVE environment variable.
+
+    The config can be a dict, a JSON string or the path to a JSON file. Without any the default
+    curve is used, and so is it when the config is invalid.
+    """
+    if curve_config is None:
+        curve_config = os.getenv("CORRECTION_CURVE")
+    if not curve_config:
+        return DEFAULT_CURVE
+
+    try:
+        if isinstance(curve_config, str):
+            if curve_config.lstrip().startswith("{"):
+                curve_config = json.loads(curve_config)
+            else:
+                with open(curve_config, encoding="utf-8") as file:
+                    curve_config = json.load(file)
+        return parse_correction_curve(curve_config)
+    except (OSError, ValueError, TypeError) as e:
+        logger.error(f"Invalid correction curve, using the default curve: {e}")
+        return DEFAULT_CURVE
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# In adaptive mode the quiet window is this many times the observed interval between volume events
+ADAPTIVE_MULTIPLIER = 3.0
+
+# Weight of the newest interval in the smoothed interval between volume events
+RATE_SMOOTHING = 0.3
+
+
+class DebouncePolicy:
+    """
+    Decides when a burst of volume events should trigger a correction.
+
+    Args:
+        delay (float): Quiet window after the last event before the correction is sent.
+            In adaptive mode this is the longest window used.
+        max_wait (float): Longest a burst of events may postpone a correction. 0 disables the cap.
+        leading (bool): Send a correction on the first event of a burst as well.
+        adaptive (bool): Shrink the quiet window when events arrive quickly.
+        min_delay (float): Shortest quiet window used in adaptive mode.
+    """
+
+    def __init__(
+        self,
+        delay: float = 2.0,
+        max_wait: float = 0,
+        leading: bool = False,
+        adaptive: bool = False,
+        min_delay: float = 0.5,
+    ):
+        self.delay = delay
+        self.max_wait = max_wait
+        self.leading = leading
+        self.adaptive = adaptive
+        self.min_delay = min(min_delay, delay)
+
+        self.event_interval = None  # Smoothed interval between events within a burst
+        self.last_event = None
+        self.burst_start = None  # Start of the burst, or time of the last correction within it
+        self.pending = False  # True if events arrived since the last correction
+        self.decisions = {"leading": 0, "trailing": 0, "max_wait": 0, "rescheduled": 0}
+
+    def window(self) -> float:
+        """The quiet window after which a burst is considered finished."""
+        if not self.adaptive or self.event_interval is None:
+            return self.delay
+        return max(self.min_delay, min(self.delay, self.event_interval * ADAPTIVE_MULTIPLIER))
+
+    def on_event(self, now: float):
+        """
+        Register a volume event.
+
+        Returns:
+            tuple: (fire_now, fire_at, reason). fire_now tells whether to send a correction right away,
+            fire_at is when to check again and reason is the decision for fire_at.
+        """
+        in_burst = self.burst_start is not None
+        if in_burst:
+            interval = now - self.last_event
+            # Intervals longer than the window are gaps between bursts and say nothing about the knob speed
+            if interval <= self.delay:
+                if self.event_interval is None:
+                    self.event_interval = interval
+                else:
+                    self.event_interval += RATE_SMOOTHING * (interval - self.event_interval)
+        self.last_event = now
+
+        fire_now = False
+        if not in_burst:
+            self.burst_start = now
+            if self.leading:
+                fire_now = True
+                self._record("leading", now)
+                self.pending = False
+            else:
+                self.pending = True
+        else:
+            self.pending = True
+            self.decisions["rescheduled"] += 1
+
+        fire_at, reason = self.deadline()
+        logger.debug(f"Debounce: window {self.window():.2f}s, next check at {fire_at:.2f} ({reason})")
+        return fire_now, fire_at, reason
+
+    def deadline(self):
+        """When the current burst should be checked next, and why."""
+        fire_at = self.last_event + self.window()
+        reason = "trailing"
+        if self.max_wait > 0 and self.burst_start + self.max_wait < fire_at:
+            fire_at = self.burst_start + self.max_wait
+            reason = "max_wait"
+        return fire_at, reason
+
+    def on_deadline(self, now: float, reason: str) -> bool:
+        """
+        The deadline returned by on_event has passed.
+
+        Returns:
+            bool: True if a correction should be sent now.
+        """
+        fire = self.pending
+        if reason == "max_wait":
+            # The knob is still moving, start a new max wait period from this correction
+            self.burst_start = now
+        else:
+            self.burst_start = None
+        self.pending = False
+
+        if fire:
+            self._record(reason, now)
+        return fire
+
+    def _record(self, reason, now):
+        self.decisions[reason] += 1
+        logger.info(
+            f"Debounce: sending correction ({reason}) after a window of {self.window():.2f}s"
+        )
+
+
+class Debouncer:
+    """
+    Runs a debounce policy on the event loop and calls the callback with the latest value.
+
+    Only one callback runs at a time. The timer waiting for a deadline can be cancelled, a running
+    callback is left to finish so that a batch of commands is never cut off halfway. If on_stale is
+    given it is called when a new value is released while a callback is still running.
+    """
+
+    def __init__(self, policy: DebouncePolicy, callback, tasks: set = None, on_stale=None):
+        self.policy = policy
+        self.callback = callback
+        self.on_stale = on_stale
+        self.tasks = tasks if tasks is not None else set()
+        self.latest_value = None
+        self.timer_task = None
+        self.callback_task = None
+        self.lock = asyncio.Lock()
+
+        self.pending_since = None  # Time of the first value not yet released
+        self.last_wait = None  # Seconds the latest released value was held back
+        self.cancelled = 0  # Timers cancelled because a newer value came in
+
+    def trigger(self, value):
+        """Register a new value, for example a main volume from the receiver."""
+        self.latest_value = value
+        now = asyncio.get_running_loop().time()
+        if self.pending_since is None:
+            self.pending_since = now
+
+        fire_now, fire_at, reason = self.policy.on_event(now)
+        if fire_now:
+            self._fire()
+
+        if self.timer_task is not None and not self.timer_task.done():
+            self.timer_task.cancel()
+            self.cancelled += 1
+        self.timer_task = self._track(self._wait_for_deadline(fire_at, reason))
+
+    async def _wait_for_deadline(self, fire_at, reason):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(max(0, fire_at - loop.time()))
+        except asyncio.CancelledError:
+            logger.debug("Debounce timer was cancelled.")
+            return
+
+        if self.policy.on_deadline(loop.time(), reason):
+            self._fire()
+
+        if reason == "max_wait":
+            # Keep watching the burst until it goes quiet
+            fire_at, reason = self.policy.deadline()
+            self.timer_task = self._track(self._wait_for_deadline(fire_at, reason))
+
+    def _fire(self):
+        if self.pending_since is not None:
+            self.last_wait = asyncio.get_running_loop().time() - self.pending_since
+            self.pending_since = None
+        if self.lock.locked() and self.on_stale is not None:
+            self.on_stale()
+        self.callback_task = self._track(self._run_callback(self.latest_value))
+
+    async def _run_callback(self, value):
+        async with self.lock:
+            await self.callback(value)
+
+    def _track(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)  # Track the task
+        task.add_done_callback(self.tasks.discard)  # Remove from set when done
+        return task
+
+    def cancel(self):
+        """Cancel a pending deadline. Returns the task that was cancelled, if any."""
+        timer_task = self.timer_task
+        if timer_task is not None and not timer_task.done():
+            timer_task.cancel()
+            return timer_task
+        return None
+
+
+def debounce_policy_from_env() -> DebouncePolicy:
+    """Build the debounce policy from the DEBOUNCE_* environment variables."""
+    policy = DebouncePolicy(
+        delay=float(os.getenv("DEBOUNCE_DELAY", "2.0")),
+        max_wait=float(os.getenv("DEBOUNCE_MAX_WAIT", "6.0")),
+        leading=os.getenv("DEBOUNCE_LEADING", "false").lower() in ("1", "true", "yes"),
+        adaptive=os.getenv("DEBOUNCE_ADAPTIVE", "false").lower() in ("1", "true", "yes"),
+        min_delay=float(os.getenv("DEBOUNCE_MIN_DELAY", "0.5")),
+    )
+    logger.info(
+        f"Debounce policy: delay {policy.delay}s, max wait {policy.max_wait}s, leading {policy.leading}, adaptive {policy.adaptive}"
+    )
+    return policy
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Receiver properties worth remembering from denonavr's HTTP discovery
+METADATA_FIELDS = ("name", "manufacturer", "model_name", "serial_number", "receiver_type")
+
+
+def discovery_cache_path(config_path):
+    """The file caching the discovered receiver, hidden in the receiver's config folder."""
+    return os.path.join(config_path, ".receiver.cache.json")
+
+
+def discovery_cache_ttl():
+    """Seconds a discovered receiver is trusted, 0 when the cache is disabled."""
+    return float(os.getenv("DISCOVERY_CACHE_TTL", "86400"))
+
+
+def read_receiver_metadata(cache_path, host, ttl, now=None):
+    """
+    Read the cached discovery of a receiver.
+
+    Returns:
+        dict or None: The metadata, or None if there is none for this host or it is older than the ttl.
+    """
+    if ttl <= 0:
+        return None
+    try:
+        with open(cache_path, encoding="utf-8") as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    now = time.time() if now is None else now
+    if metadata.get("host") != host or now - metadata.get("discovered_at", 0) > ttl:
+        return None
+    return metadata
+
+
+def write_receiver_metadata(cache_path, host, receiver):
+    """Remember what denonavr discovered about a receiver."""
+    metadata = {field: getattr(receiver, field, None) for field in METADATA_FIELDS}
+    metadata.update({"host": host, "discovered_at": time.time()})
+    try:
+        temporary_path = f"{cache_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(metadata, file)
+        os.replace(temporary_path, cache_path)
+    except OSError as e:
+        logger.info(f"Could not write receiver cache {cache_path}: {e}")
+    return metadata
+
+
+def apply_receiver_metadata(receiver, metadata):
+    """
+    Give the receiver what a cached discovery found, like async_setup would have.
+
+    denonavr only fills these in while discovering and has no setters for them, so they go to its
+    device info. Receivers without one, like the fake receiver, are left as they are.
+    """
+    device = getattr(receiver, "_device", None)
+    if device is None:
+        return
+    # denonavr is imported by the time a receiver exists
+    from denonavr.const import VALID_RECEIVER_TYPES
+
+    for receiver_type in VALID_RECEIVER_TYPES:
+        if receiver_type.type == metadata.get("receiver_type"):
+            device.receiver = receiver_type
+            device.api.port = receiver_type.port
+    for field in ("manufacturer", "model_name", "serial_number"):
+        if metadata.get(field) is not None:
+            setattr(device, field, metadata[field])
+    if metadata.get("name") is not None:
+        device.friendly_name = metadata["name"]
+        if receiver.name is None:
+            receiver._name = metadata["name"]
+
+
+class StartupTimer:
+    """Measures the phases of a start, to log where the time to the first correction goes."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started_at = clock()
+        self.phase_started_at = self.started_at
+        self.phases = {}
+
+    def phase(self, name):
+        """End the running phase, naming it."""
+        now = self.clock()
+        self.phases[name] = now - self.phase_started_at
+        self.phase_started_at = now
+
+    def elapsed(self):
+        return self.clock() - self.started_at
+
+    def summary(self):
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        return f"{self.elapsed():.3f}s ({phases})"
@@ -0,0 +1,252 @@
+"""
+A stand-in Denon/Marantz receiver speaking enough of the telnet protocol to run the daemon offline.
+
+denonavr always connects to telnet port 23, so give every fake receiver its own loopback address and
+point RECEIVER_IP at it, with TELNET_ONLY=true to skip the HTTP discovery the fake doesn't implement:
+
+    python src/fake_avr.py --host 127.0.0.2 --script storm
+    RECEIVER_IP=127.0.0.2 TELNET_ONLY=true python src/main.py
+
+Binding port 23 needs root or CAP_NET_BIND_SERVICE.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+
+from adjustmentlogic import format_volume
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL_LEVELS = {
+    "FL": 50.0,
+    "C": 50.0,
+    "FR": 50.0,
+    "SL": 50.0,
+    "SR": 50.0,
+    "SBL": 50.0,
+    "SBR": 50.0,
+    "FHL": 50.0,
+    "FHR": 50.0,
+    "TML": 50.0,
+    "TMR": 50.0,
+}
+
+# Fixed answers to the status queries denonavr sends when it connects
+STATUS_REPLIES = {
+    "PW?": ["PWON"],
+    "ZM?": ["ZMON"],
+    "SI?": ["SIGAME"],
+    "MU?": ["MUOFF"],
+    "Z2?": ["Z2OFF"],
+    "Z2MU?": ["Z2MUOFF"],
+    "Z3?": ["Z3OFF"],
+    "Z3MU?": ["Z3MUOFF"],
+    "PSTONE CTRL ?": ["PSTONE CTRL OFF"],
+    "PSBAS ?": ["PSBAS 50"],
+    "PSTRE ?": ["PSTRE 50"],
+    "PSMULTEQ: ?": ["PSMULTEQ:AUDYSSEY"],
+    "PSDYNVOL ?": ["PSDYNVOL OFF"],
+    "MS?": ["MSDOLBY ATMOS"],
+}
+
+
+def parse_level(value: str) -> float:
+    """Parse a level or volume as sent over telnet, '485' meaning 48.5 and '50' meaning 50."""
+    return float(value) / 10 if len(value) == 3 else float(value)
+
+
+class FakeAVR:
+    """
+    Fake receiver serving any number of telnet clients.
+
+    Like a real receiver every reply and state change is sent to all connected clients.
+
+    Args:
+        volume (float): Initial main volume in dB, 0 to 98.
+        channel_levels (dict): Initial channel levels keyed by channel, 50 meaning 0dB.
+        latency (float): Seconds before the receiver replies to a command.
+        drop_rate (float): Share of commands silently ignored, to test retries.
+    """
+
+    def __init__(self, volume=50.0, channel_levels=None, latency=0.0, drop_rate=0.0, seed=None):
+        self.volume = volume
+        self.channel_levels = dict(channel_levels or DEFAULT_CHANNEL_LEVELS)
+        self.dynamic_eq = {"DYNEQ": "ON", "REFLEV": "0"}  # Audyssey settings the correction depends on
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+
+        self.server = None
+        self.clients = set()
+        self.received = []  # Every command received, in order
+        self.stats = {"connections": 0, "commands": 0, "dropped": 0, "events": 0}
+
+    async def start(self, host="127.0.0.1", port=23):
+        """Start listening. Use port 0 to pick a free port, see the port property."""
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        logger.info(f"Fake receiver listening on {host}:{self.port}")
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def drop_connections(self):
+        """Close every client connection, like a receiver going to standby or a Wi-Fi blip."""
+        for writer in list(self.clients):
+            writer.close()
+        self.clients.clear()
+
+    async def _handle_client(self, reader, writer):
+        self.clients.add(writer)
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\r")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                command = line[:-1].decode("utf-8", errors="replace")
+                if command:
+                    await self._process(command)
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def _process(self, command: str):
+        self.received.append(command)
+        self.stats["commands"] += 1
+
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            self.stats["dropped"] += 1
+            return
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        for reply in self.handle_command(command):
+            self.broadcast(reply)
+
+    def handle_command(self, command: str):
+        """Apply a command and return the lines the receiver answers with."""
+        if command == "MV?":
+            return [self.volume_event(), "MVMAX 980"]
+        if command in ("MVUP", "MVDOWN"):
+            step = 0.5 if command == "MVUP" else -0.5
+            self.volume = min(98.0, max(0.0, self.volume + step))
+            return [self.volume_event()]
+        if command.startswith("MV") and command[2:].isdigit():
+            self.volume = parse_level(command[2:])
+            return [self.volume_event()]
+        if command == "SSLEV ?":
+            return [
+                f"SSLEV{channel} {format_volume(level)}"
+                for channel, level in self.channel_levels.items()
+            ] + ["SSLEV END"]
+        if command.startswith("SSLEV"):
+            channel, _, value = command[5:].partition(" ")
+            if channel in self.channel_levels and value.isdigit():
+                self.channel_levels[channel] = parse_level(value)
+                return [f"SSLEV{channel} {format_volume(self.channel_levels[channel])}"]
+            return []
+        if command.startswith(("PSDYNEQ ", "PSREFLEV ")):
+            setting, _, value = command[2:].partition(" ")
+            if value != "?":
+                self.dynamic_eq[setting] = value
+            return [f"PS{setting} {self.dynamic_eq[setting]}"]
+        return STATUS_REPLIES.get(command, [])
+
+    def volume_event(self) -> str:
+        # Whole volumes are sent with two digits, half steps with three: MV05, MV055, MV505
+        if float(self.volume).is_integer():
+            return f"MV{int(self.volume):02d}"
+        return f"MV{int(self.volume * 10):03d}"
+
+    def broadcast(self, line: str):
+        self.stats["events"] += 1
+        for writer in list(self.clients):
+            if not writer.is_closing():
+                writer.write(f"{line}\r".encode("utf-8"))
+
+    def turn_knob(self, volume: float):
+        """Change the main volume from the front panel or remote."""
+        self.volume = min(98.0, max(0.0, volume))
+        self.broadcast(self.volume_event())
+
+
+async def knob_sweep(avr: FakeAVR, start: float, end: float, interval=0.05):
+    """Turn the volume from start to end in 0.5 dB steps."""
+    step = 0.5 if end >= start else -0.5
+    for index in range(int(abs(end - start) / 0.5) + 1):
+        avr.turn_knob(start + index * step)
+        await asyncio.sleep(interval)
+
+
+async def knob_storm(avr: FakeAVR, events=200, interval=0.02, low=30.0, high=70.0, seed=None):
+    """Turn the volume back and forth at random, in bursts with short pauses between them."""
+    rng = random.Random(seed)
+    volume = avr.volume
+    for _ in range(events):
+        volume = min(high, max(low, volume + rng.choice((-1.0, -0.5, 0.5, 1.0))))
+        avr.turn_knob(volume)
+        pause = interval if rng.random() > 0.05 else interval * 50
+        await asyncio.sleep(pause)
+
+
+async def connection_churn(avr: FakeAVR, cycles=10, interval=2.0):
+    """Drop every client connection over and over."""
+    for _ in range(cycles):
+        await asyncio.sleep(interval)
+        logger.info("Dropping all connections")
+        avr.drop_connections()
+
+
+async def run_fake_avr(args):
+    avr = FakeAVR(volume=args.volume, latency=args.latency, drop_rate=args.drop_rate)
+    await avr.start(args.host, args.port)
+
+    if args.script == "sweep":
+        await asyncio.sleep(args.warmup)
+        await knob_sweep(avr, avr.volume, args.volume + 20, args.interval)
+    elif args.script == "storm":
+        await asyncio.sleep(args.warmup)
+        await knob_storm(avr, args.events, args.interval)
+    elif args.script == "churn":
+        await connection_churn(avr, args.events, args.interval)
+
+    if args.script != "idle":
+        logger.info(f"Script finished: {avr.stats}")
+    await avr.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Denon/Marantz receiver")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=23)
+    parser.add_argument("--volume", type=float, default=50.0, help="Initial main volume in dB")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before replying")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of commands ignored")
+    parser.add_argument(
+        "--script", choices=("idle", "sweep", "storm", "churn"), default="idle"
+    )
+    parser.add_argument("--events", type=int, default=200, help="Knob events or churn cycles")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between events")
+    parser.add_argument(
+        "--warmup", type=float, default=5.0, help="Seconds to wait for the daemon to connect"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(run_fake_avr(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Check and precompile the calibrations of a whole fleet of rooms at once.
+
+Walks a directory tree, treating every folder holding .ady files as a room, and parses, validates and
+compiles each calibration in a pool of processes. For every calibration the compiled correction
+table and a summary are written to the output folder, mirroring the tree:
+
+    python src/fleet.py /srv/rooms --output fleet-report
+    python src/fleet.py /srv/rooms --receivers receivers.json --workers 8
+
+Rooms listed with their config_path in a RECEIVERS_CONFIG file get their own reference_volume,
+speaker_config and curve, others use the REFERENCE_VOLUME, SPEAKER_CONFIG and CORRECTION_CURVE
+environment variables like the daemon. Exits with 1 when any calibration has an error.
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from adjustmentlogic import MAX_LEVEL, MIN_LEVEL, VOLUME_STEPS, compile_profile_table, normal_round
+from ady_parser import read_calibration_file
+from json_loader import build_calibration_profile, get_reference_volume, load_speaker_config
+
+
+def find_rooms(root):
+    """
+    Every folder below root holding .ady files.
+
+    Returns:
+        list: (room, [.ady paths]) pairs sorted by room, the room being the folder relative to root.
+    """
+    rooms = []
+    for directory, directories, files in os.walk(root):
+        directories.sort()
+        calibrations = sorted(file for file in files if file.endswith(".ady"))
+        if calibrations:
+            room = os.path.relpath(directory, root)
+            rooms.append((room, [os.path.join(directory, file) for file in calibrations]))
+    return rooms
+
+
+def load_room_options(receivers_config_path):
+    """The profile options of each room in a RECEIVERS_CONFIG file, keyed by the absolute config_path."""
+    with open(receivers_config_path, encoding="utf-8") as file:
+        receivers = json.load(file).get("receivers", [])
+    return {
+        os.path.abspath(receiver["config_path"]): {
+            key: receiver[key]
+            for key in ("reference_volume", "speaker_config", "curve")
+            if receiver.get(key) is not None
+        }
+        for receiver in receivers
+        if receiver.get("config_path")
+    }
+
+
+def requested_level(profile, speaker, initial_level, adjustment_factor):
+    """The level compute_speaker_adjustments asks for, before capping at MIN_LEVEL and MAX_LEVEL."""
+    curve = profile.curve
+    if speaker in profile.quarter_change_speakers:
+        adjusted_level = initial_level - normal_round(adjustment_factor * curve.quarter_scale * 2) / 2
+    else:
+        adjusted_level = initial_level - adjustment_factor * curve.half_scale
+    return normal_round(adjusted_level * 2) / 2
+
+
+def find_clamped_channels(profile, table):
+    """
+    The channels the correction can't move as far as asked, as the receiver's levels end at 38 and 62.
+
+    Returns:
+        dict: Per channel, the level it is capped at and the lowest and highest main volume where that happens.
+    """
+    clamped = {}
+    for absolute_volume, entry in zip(VOLUME_STEPS, table.entries):
+        for speaker, adjusted_level in entry.levels:
+            initial_level = profile.speaker_levels[speaker]
+            if requested_level(profile, speaker, initial_level, entry.adjustment_factor) != adjusted_level:
+                clamp = clamped.setdefault(speaker, {"level": adjusted_level, "volumes": [absolute_volume]})
+                clamp["volumes"][1:] = [absolute_volume]
+    return clamped
+
+
+def write_table(path, table):
+    """The compiled correction: the factor and the level of every corrected channel per main volume."""
+    speakers = [speaker for speaker, _ in table.entries[0].levels]
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["main_volume", "adjustment_factor"] + speakers)
+        for absolute_volume, entry in zip(VOLUME_STEPS, table.entries):
+            writer.writerow(
+                [absolute_volume, entry.adjustment_factor] + [level for _, level in entry.levels]
+            )
+
+
+def check_calibration(job):
+    """
+    Parse, validate and compile one calibration, writing its table and summary.
+
+    Runs in a worker process, so it takes and returns plain data.
+
+    Args:
+        job (tuple): The room, the .ady path, the profile options and the output folder of the room.
+
+    Returns:
+        dict: The summary, with "errors" that keep the calibration from working and "warnings".
+    """
+    room, path, options, output_directory = job
+    summary = {"room": room, "file": os.path.basename(path), "errors": [], "warnings": []}
+    errors, warnings = summary["errors"], summary["warnings"]
+
+    try:
+        json_data = read_calibration_file(path)
+    except Exception as e:
+        # Any malformed file is reported instead of stopping the whole fleet
+        errors.append(f"Unreadable calibration: {e}")
+        return summary
+
+    if get_reference_volume(json_data) is None:
+        message = f"Title {json_data.get('title')!r} has no MV..dB reference volume"
+        if options.get("reference_volume") is None and not os.getenv("REFERENCE_VOLUME", "").isdigit():
+            errors.append(message)
+            return summary
+        warnings.append(message + ", using the configured reference volume")
+
+    try:
+        load_speaker_config(options.get("speaker_config"))
+    except ValueError as e:
+        # The daemon would run without correcting any speaker
+        errors.append(str(e))
+        return summary
+
+    try:
+        profile = build_calibration_profile(json_data, path, **options)
+        if profile is None:
+            errors.append("No reference volume found")
+            return summary
+        if not profile.speaker_levels:
+            errors.append("No channel levels found")
+            return summary
+        table = compile_profile_table(profile)
+    except Exception as e:
+        # Like an unreadable file, a calibration the daemon couldn't compile only fails its own check
+        errors.append(f"Invalid calibration: {e}")
+        return summary
+
+    corrected = set(profile.half_change_speakers) | set(profile.quarter_change_speakers)
+    corrected_channels = sorted(corrected & set(profile.speaker_levels))
+    if not corrected_channels:
+        warnings.append("None of the channels is corrected by the speaker config")
+    for speaker, level in sorted(profile.speaker_levels.items()):
+        if not MIN_LEVEL <= level <= MAX_LEVEL:
+            warnings.append(f"{speaker} is calibrated at {level - 50}dB, beyond what the receiver can set")
+    clamped = find_clamped_channels(profile, table)
+    for speaker, clamp in sorted(clamped.items()):
+        warnings.append(
+            f"{speaker} is capped at {clamp['level'] - 50}dB at main volumes from {clamp['volumes'][0]}dB to {clamp['volumes'][-1]}dB"
+        )
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    os.makedirs(output_directory, exist_ok=True)
+    write_table(os.path.join(output_directory, f"{name}.table.csv"), table)
+
+    factors = [entry.adjustment_factor for entry in table.entries]
+    summary.update(
+        reference_volume=profile.reference_volume,
+        channels=len(profile.speaker_levels),
+        corrected_channels=corrected_channels,
+        max_adjustment=max(factors),
+        corrected_below=max(
+            (volume for volume, factor in zip(VOLUME_STEPS, factors) if factor > 0), default=None
+        ),
+        distinct_corrections=len(set(factors)),
+        clamped=clamped,
+    )
+    with open(os.path.join(output_directory, f"{name}.summary.json"), "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+    return summary
+
+
+def check_fleet(root, output, room_options=None, workers=None):
+    """
+    Check every calibration below root, spread over a pool of processes.
+
+    Args:
+        root (str): Folder holding a folder per room.
+        output (str): Where the tables and summaries are written, mirroring the rooms below root.
+        room_options (dict): Profile options keyed by the absolute folder of a room.
+        workers (int): Number of processes, 1 to check in this process, None for one per CPU.
+
+    Returns:
+        list: The summary of every calibration, ordered by room and file.
+    """
+    room_options = room_options or {}
+    jobs = [
+        (
+            room,
+            path,
+            room_options.get(os.path.abspath(os.path.join(root, room)), {}),
+            os.path.normpath(os.path.join(output, room)),
+        )
+        for room, paths in find_rooms(root)
+        for path in paths
+    ]
+    if workers == 1:
+        return [check_calibration(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Spread the jobs evenly, small batches keep the pickling overhead down
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(check_calibration, jobs, chunksize=chunksize))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and precompile the calibrations of many rooms")
+    parser.add_argument("root", help="Folder with a folder of .ady files per room")
+    parser.add_argument("--output", default="fleet-report", help="Folder for the tables and summaries")
+    parser.add_argument("--receivers", help="RECEIVERS_CONFIG file with the options of each room")
+    parser.add_argument("--workers", type=int, help="Number of processes, defaults to one per CPU")
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    room_options = load_room_options(args.receivers) if args.receivers else None
+    summaries = check_fleet(args.root, args.output, room_options, args.workers)
+
+    for summary in summaries:
+        status = "ERROR" if summary["errors"] else "WARN" if summary["warnings"] else "OK"
+        print(f"{status:5} {os.path.join(summary['room'], summary['file'])}")
+        for message in summary["errors"] + summary["warnings"]:
+            print(f"      {message}")
+
+    failed = sum(1 for summary in summaries if summary["errors"])
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "fleet.json"), "w", encoding="utf-8") as file:
+        json.dump(summaries, file, indent=2)
+    print(
+        f"Checked {len(summaries)} calibrations of {len({summary['room'] for summary in summaries})} rooms "
+        f"in {time.perf_counter() - started_at:.2f}s, {failed} with errors"
+    )
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
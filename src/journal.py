@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+VOLUME = "MV"
+BATCH = "TX"
+
+
+class JournalRecord(NamedTuple):
+    """
+    One line of the journal.
+
+    payload is the main volume for VOLUME records and the tuple of commands for BATCH records.
+    """
+
+    timestamp: float
+    receiver: str
+    kind: str
+    payload: object
+
+
+class JournalRecorder:
+    """
+    Appends volume events and command batches to a journal, one tab separated line per record.
+
+        12345.678901	living	MV	50.5
+        12347.679214	living	TX	SSLEVSL 455,SSLEVSR 455
+
+    Timestamps come from a monotonic clock, so only the differences between them are meaningful.
+
+    Args:
+        stream: Text stream the records are written to.
+        clock: Returns the current time in seconds.
+    """
+
+    def __init__(self, stream, clock=time.monotonic):
+        self.stream = stream
+        self.clock = clock
+
+    @classmethod
+    def open(cls, path, clock=time.monotonic):
+        # Line buffered, so a crash loses at most the record being written
+        return cls(open(path, "a", encoding="utf-8", buffering=1), clock)
+
+    def record_volume(self, receiver, volume: float):
+        self.stream.write(f"{self.clock():.6f}\t{receiver}\t{VOLUME}\t{volume}\n")
+
+    def record_batch(self, receiver, commands):
+        self.stream.write(f"{self.clock():.6f}\t{receiver}\t{BATCH}\t{','.join(commands)}\n")
+
+    def close(self):
+        self.stream.close()
+
+
+def parse_journal_line(line: str):
+    """Parse a journal line, returning None for blank or malformed lines."""
+    fields = line.rstrip("\n").split("\t")
+    if len(fields) != 4:
+        return None
+
+    timestamp, receiver, kind, payload = fields
+    try:
+        if kind == VOLUME:
+            return JournalRecord(float(timestamp), receiver, kind, float(payload))
+        if kind == BATCH:
+            commands = tuple(payload.split(",")) if payload else ()
+            return JournalRecord(float(timestamp), receiver, kind, commands)
+    except ValueError:
+        pass
+    return None
+
+
+def read_journal(path, receiver=None):
+    """Read the records of a journal, optionally only those of one receiver."""
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            record = parse_journal_line(line)
+            if record is None:
+                if line.strip():
+                    logger.warning(f"Skipping malformed journal line: {line.strip()}")
+                continue
+            if receiver is None or record.receiver == receiver:
+                records.append(record)
+    return records
+
+
+def journal_from_env():
+    """Open the journal at JOURNAL_PATH, or return None when recording is disabled."""
+    journal_path = os.getenv("JOURNAL_PATH")
+    if not journal_path:
+        return None
+    logger.info(f"Recording volume events and command batches to {journal_path}")
+    return JournalRecorder.open(journal_path)
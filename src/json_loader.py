@@ -1,42 +1,186 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
 import re
+from types import MappingProxyType
+from typing import NamedTuple
 
-import aiofiles
+from ady_parser import read_calibration_file
+from curve import DEFAULT_CURVE, CorrectionCurve, load_correction_curve
 
 # Set up logging for error and info messages
 logger = logging.getLogger(__name__)
 
-async def load_json_data(config_path):
+# Bump when the content of the calibration cache changes
+CACHE_VERSION = 1
+
+DEFAULT_SPEAKER_CONFIG = {
+    "half": ["SL", "SR", "SBL", "SBR", "SB"],
+    "quarter": [
+        "FHL",
+        "FHR",
+        "FWL",
+        "FWR",
+        "TFL",
+        "TFR",
+        "TML",
+        "TMR",
+        "TRL",
+        "TRR",
+        "RHL",
+        "RHR",
+        "FDL",
+        "FDR",
+        "SDL",
+        "SDR",
+        "BDL",
+        "BDR",
+        "SHL",
+        "SHR",
+        "TS",
+        "CH",
+    ],
+}
+
+
+class CalibrationProfile(NamedTuple):
+    """
+    Everything the adjustment logic needs from a calibration, resolved once.
+
+    Profiles are never modified. A changed calibration file produces a new profile
+    which replaces the old one in a single assignment.
+    """
+
+    source_path: str
+    mtime_ns: int
+    reference_volume: int
+    half_change_speakers: frozenset
+    quarter_change_speakers: frozenset
+    speaker_levels: MappingProxyType
+    curve: CorrectionCurve = DEFAULT_CURVE
+
+
+def find_calibration_files(config_path):
+    """
+    Find every calibration file in the config directory.
+
+    Returns:
+        list: The full paths of the files ending with '.ady', sorted by name.
+    """
+    # Ensure that config_path is supplied
+    if not config_path:
+        raise ValueError("config_path is required but not provided.")
+
+    # Check if the directory exists
+    if not os.path.isdir(config_path):
+        raise FileNotFoundError(f"Config directory '{config_path}' does not exist.")
+
+    # The order of os.listdir is arbitrary, sort it so the same file is always picked first
+    files = sorted(file for file in os.listdir(config_path) if file.endswith('.ady'))
+
+    return [os.path.join(config_path, file) for file in files]
+
+
+def find_calibration_file(config_path):
+    """
+    Find the calibration file in the config directory.
+
+    Returns:
+        str or None: The full path of the first file ending with '.ady' by name, or None if there is none.
+    """
+    files = find_calibration_files(config_path)
+    return files[0] if files else None
+
+
+def calibration_cache_path(json_file_path):
+    """The sidecar caching what was extracted from an .ady file, hidden next to it."""
+    directory, file_name = os.path.split(json_file_path)
+    return os.path.join(directory, f".{file_name}.cache.json")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_calibration_cache(json_file_path, stat, sha256, calibration):
+    cache_path = calibration_cache_path(json_file_path)
+    cache = {
+        'version': CACHE_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+        'calibration': calibration,
+    }
     try:
-        # Ensure that config_path is supplied
-        if not config_path:
-            raise ValueError("config_path is required but not provided.")
+        # Write to a temporary file first so a crash never leaves a half written cache
+        temporary_path = f"{cache_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(cache, file)
+        os.replace(temporary_path, cache_path)
+    except OSError as err:
+        # A read-only config directory only means the next start parses the file again
+        logger.info('Could not write calibration cache %s: %s', cache_path, err)
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
 
-        # Check if the directory exists
-        if not os.path.isdir(config_path):
-            raise FileNotFoundError(f"Config directory '{config_path}' does not exist.")
 
-        # List all files in the directory
-        files = os.listdir(config_path)
-        
-        # Find the first file that matches the criteria
-        json_file = next((file for file in files if file.endswith('.ady')), None)
-        
-        if not json_file:
-            logger.error('Error loading calibration file: No file ending with ".ady" found.')
-            return None
+def read_cached_calibration(json_file_path):
+    """
+    Read the calibration through its sidecar cache, parsing the .ady file only when it changed.
+
+    The cache matches when the file has the same size and modification time, or the same size and
+    SHA-256 hash for files that were copied or touched without changing.
+    """
+    stat = os.stat(json_file_path)
+    sha256 = None
+    try:
+        with open(calibration_cache_path(json_file_path), encoding='utf-8') as file:
+            cache = json.load(file)
+        if cache.get('version') == CACHE_VERSION and cache.get('size') == stat.st_size:
+            if cache.get('mtime_ns') == stat.st_mtime_ns:
+                return cache['calibration']
+
+            sha256 = file_sha256(json_file_path)
+            if cache.get('sha256') == sha256:
+                write_calibration_cache(json_file_path, stat, sha256, cache['calibration'])
+                return cache['calibration']
+    except (OSError, ValueError, KeyError):
+        pass  # Missing or unreadable cache
+
+    calibration = read_calibration_file(json_file_path)
+    if sha256 is None:
+        sha256 = file_sha256(json_file_path)
+
+    # Don't cache if the file was replaced while it was being read
+    if os.stat(json_file_path).st_mtime_ns == stat.st_mtime_ns:
+        write_calibration_cache(json_file_path, stat, sha256, calibration)
+    return calibration
+
+
+async def read_json_file(json_file_path):
+    # Parse in a worker thread, keeping only the title and channel levels instead of the whole file
+    if os.getenv('CALIBRATION_CACHE', 'true').lower() in ('1', 'true', 'yes'):
+        return await asyncio.to_thread(read_cached_calibration, json_file_path)
+    return await asyncio.to_thread(read_calibration_file, json_file_path)
 
-        # Full path to the JSON file
-        json_file_path = os.path.join(config_path, json_file)
 
-        # Read the file asynchronously
-        async with aiofiles.open(json_file_path, mode='r', encoding='utf-8') as file:
-            file_data = await file.read()
+async def load_json_data(config_path):
+    try:
+        json_file_path = find_calibration_file(config_path)
 
-        # Parse the JSON data
-        json_data = json.loads(file_data)
+        if not json_file_path:
+            logger.error('Error loading calibration file: No file ending with ".ady" found.')
+            return None
+
+        json_data = await read_json_file(json_file_path)
         logger.info('Loaded calibration file.')
 
         return json_data
@@ -45,6 +189,214 @@ async def load_json_data(config_path):
         logger.error('Error loading calibration file: %s', err)
         return None
 
+
+def load_speaker_config(speaker_config=None):
+    """
+    Load the half/quarter speaker groups, from the given dict or the SPEAKER_CONFIG environment variable.
+    """
+    if speaker_config is None:
+        speaker_config_json = os.getenv("SPEAKER_CONFIG", json.dumps(DEFAULT_SPEAKER_CONFIG))
+        speaker_config = json.loads(speaker_config_json)
+
+    half_change_speakers = set(speaker_config.get("half", []))
+    quarter_change_speakers = set(speaker_config.get("quarter", []))
+
+    overlap = half_change_speakers.intersection(quarter_change_speakers)
+    if overlap:
+        raise ValueError(
+            f"Invalid configuration: Overlap detected in speaker sets. Conflicting speakers: {overlap}"
+        )
+
+    return half_change_speakers, quarter_change_speakers
+
+
+def resolve_reference_volume(json_data, reference_volume=None):
+    """
+    Resolve the reference volume, preferring the given value, then the REFERENCE_VOLUME environment variable
+    and finally the .ady title.
+    """
+    if reference_volume is not None:
+        logger.info("Retrieving reference volume from receiver configuration")
+        return int(reference_volume)
+
+    # Try to get the REFERENCE_VOLUME environment variable as an integer
+    reference_volume_env = os.getenv("REFERENCE_VOLUME")
+    if reference_volume_env and reference_volume_env.isdigit():
+        logger.info("Retrieving reference volume from environment variable")
+        return int(reference_volume_env)
+
+    # Fallback if REFERENCE_VOLUME is empty or not a valid integer
+    logger.info("Retrieving reference volume from ady file")
+    return get_reference_volume(json_data)
+
+
+def build_calibration_profile(
+    json_data,
+    source_path=None,
+    mtime_ns=None,
+    reference_volume=None,
+    speaker_config=None,
+    curve=None,
+):
+    """
+    Resolve the reference volume, speaker groups and base levels of a calibration.
+
+    Args:
+        json_data (dict): The parsed .ady file.
+        source_path (str): The file the data was read from.
+        mtime_ns (int): Modification time of the file when it was read.
+        reference_volume (int): Overrides REFERENCE_VOLUME and the .ady title.
+        speaker_config (dict): Overrides SPEAKER_CONFIG.
+        curve (dict or str): Correction curve config or file, overrides CORRECTION_CURVE.
+
+    Returns:
+        CalibrationProfile or None: The resolved profile, or None if no reference volume could be found.
+    """
+    reference_volume = resolve_reference_volume(json_data, reference_volume)
+    if reference_volume is None:
+        logger.error("Reference volume not found")
+        return None
+
+    try:
+        half_change_speakers, quarter_change_speakers = load_speaker_config(speaker_config)
+    except ValueError as e:
+        logger.error(e)
+        half_change_speakers, quarter_change_speakers = set(), set()
+
+    return CalibrationProfile(
+        source_path=source_path,
+        mtime_ns=mtime_ns,
+        reference_volume=reference_volume,
+        half_change_speakers=frozenset(half_change_speakers),
+        quarter_change_speakers=frozenset(quarter_change_speakers),
+        speaker_levels=MappingProxyType(get_speaker_levels(json_data)),
+        curve=load_correction_curve(curve),
+    )
+
+
+async def load_calibration_profile(config_path, json_file_path=None, **profile_options):
+    try:
+        if json_file_path is None:
+            json_file_path = find_calibration_file(config_path)
+
+        if not json_file_path:
+            logger.error('Error loading calibration file: No file ending with ".ady" found.')
+            return None
+
+        mtime_ns = os.stat(json_file_path).st_mtime_ns
+        json_data = await read_json_file(json_file_path)
+        logger.info('Loaded calibration file %s.', json_file_path)
+
+        return build_calibration_profile(
+            json_data, json_file_path, mtime_ns, **profile_options
+        )
+
+    except Exception as err:
+        logger.error('Error loading calibration file: %s', err)
+        return None
+
+
+async def load_calibration_profiles(config_path, **profile_options):
+    """
+    Load every calibration file in the config directory.
+
+    Returns:
+        dict: The profiles keyed by file name, leaving out files that failed to load.
+    """
+    try:
+        json_file_paths = find_calibration_files(config_path)
+    except Exception as err:
+        logger.error('Error loading calibration files: %s', err)
+        return {}
+
+    # The files are parsed in worker threads, so they are read in parallel
+    profiles = await asyncio.gather(
+        *(
+            load_calibration_profile(config_path, json_file_path, **profile_options)
+            for json_file_path in json_file_paths
+        )
+    )
+    return {
+        os.path.basename(profile.source_path): profile
+        for profile in profiles
+        if profile is not None
+    }
+
+
+def calibration_file_changed(config_path, profile):
+    """Check whether the calibration file differs from the one the profile was built from."""
+    try:
+        json_file_path = find_calibration_file(config_path)
+        if not json_file_path:
+            return False
+        if profile is None or json_file_path != profile.source_path:
+            return True
+        return os.stat(json_file_path).st_mtime_ns != profile.mtime_ns
+    except OSError:
+        # The file may be in the middle of being replaced, check again next time
+        return False
+
+
+async def watch_calibration_profile(
+    config_path, get_profile, on_reload, interval=5.0, **profile_options
+):
+    """
+    Poll the config directory and rebuild the profile when the calibration file changes.
+
+    Args:
+        config_path (str): Directory containing the .ady file.
+        get_profile (callable): Returns the profile currently in use.
+        on_reload (callable): Called with the new profile once it has been built.
+        interval (float): Seconds between checks of the file's modification time.
+        profile_options: Passed on to build_calibration_profile.
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        if not calibration_file_changed(config_path, get_profile()):
+            continue
+
+        logger.info('Calibration file changed, reloading.')
+        profile = await load_calibration_profile(config_path, **profile_options)
+        if profile is not None:
+            on_reload(profile)
+        else:
+            logger.error('Keeping previous calibration after failed reload.')
+
+
+async def watch_calibration_profiles(
+    config_path, get_profiles, on_reload, interval=5.0, **profile_options
+):
+    """
+    Poll a set of calibration files and rebuild each profile whose file changed.
+
+    Args:
+        config_path (str): Directory containing the .ady files.
+        get_profiles (callable): Returns the profiles in use, keyed by file name.
+        on_reload (callable): Called with each new profile once it has been built.
+        interval (float): Seconds between checks of the files' modification times.
+        profile_options: Passed on to build_calibration_profile.
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        for profile in list(get_profiles().values()):
+            try:
+                if os.stat(profile.source_path).st_mtime_ns == profile.mtime_ns:
+                    continue
+            except OSError:
+                # The file may be in the middle of being replaced, check again next time
+                continue
+
+            logger.info('Calibration file %s changed, reloading.', profile.source_path)
+            reloaded = await load_calibration_profile(
+                config_path, profile.source_path, **profile_options
+            )
+            if reloaded is not None:
+                on_reload(reloaded)
+            else:
+                logger.error('Keeping previous calibration after failed reload.')
+
 def get_reference_volume(json_data):
     """
     Extracts the reference volume from the 'title' field of the given JSON data.
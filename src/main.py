@@ -1,80 +1,40 @@
 import asyncio
+import importlib
 import logging
-import os
 import platform
 import signal
+import time
 
-import denonavr
-
-from adjustmentlogic import (
-    adjust_speaker_volumes,
-    handle_volume_change_callback,
-    parse_volume,
-)
-from json_loader import get_speaker_levels, load_json_data
+from controller import ReceiverController, load_receiver_configs
+from journal import journal_from_env
+from metrics import metrics_port_from_env, start_metrics_server
+from profiling import profiling_session_from_env
+from state_api import start_state_server, state_api_port_from_env
 
 
-debounce_task = None
-latest_volume = None
-json_data = None
+receiver_configs = []
+controllers = []  # One controller per receiver
 shutdown_flag = False
 tasks = set()  # Set to track ongoing tasks
+metrics_server = None
+state_server = None
+journal = None  # Optional recorder of volume events and command batches
+denonavr_import = None  # denonavr and its HTTP stack load in a thread while the calibration is read
+profiler = None  # Optional profiling session toggled by SIGUSR1
+started_at = time.perf_counter()
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
+logger = logging.getLogger(__name__)
 
 
-async def debounce_send_volume(volume: str, delay: float = 2.0):
-    """Debounce the volume and send only the latest after a delay."""
-    global debounce_task, latest_volume
-    latest_volume = volume
-    if debounce_task is not None:
-        debounce_task.cancel()
-
-    debounce_task = asyncio.create_task(delayed_send_volume(delay))
-    tasks.add(debounce_task)  # Track the task
-    debounce_task.add_done_callback(tasks.discard)  # Remove from set when done
-
-
-async def delayed_send_volume(delay: float):
-    """Wait for the debounce delay, then send the latest volume."""
-    global latest_volume
+async def start_controller(controller):
+    # A receiver that can't be reached must not keep the others from working
     try:
-        await asyncio.sleep(delay)
-        await handle_volume_change_callback(latest_volume, json_data, send_adjustments)
-    except asyncio.CancelledError:
-        logger.debug("Volume send task was cancelled.")
-
-
-async def send_adjustments(adjustments, force_send=False):
-    logger.info("Sending adjustments")
-    try:
-        await receiver.async_send_telnet_commands(*adjustments)
+        await controller.start()
     except Exception as e:
-        logger.error(f"Failed to send adjustments: {e}")
-
-
-# Define the callback function
-async def update_callback(zone, event, parameter):
-    logger.info(f"Zone: {zone}, Event: {event}, Parameter: {parameter}")
-    if zone == "Main" and event == "MV":
-        await debounce_send_volume(parse_volume(parameter))
-
-
-# Function to set up the AVR connection and register callback
-async def setup_volume_monitoring():
-    await receiver.async_setup()
-    await receiver.async_telnet_connect()
-    receiver.register_callback("MV", update_callback)
-
-    await receiver.async_update()  # Initial update to get the current state
-
-
-async def reset_speaker_volume(json_data):
-    logger.info("Resetting speaker volumes to initial levels")
-    initial_speaker_levels = get_speaker_levels(json_data)
-    await adjust_speaker_volumes(initial_speaker_levels, 0, send_adjustments, True)
+        logger.error(f"{controller.name}: Failed to start: {e}")
 
 
 async def handle_shutdown(loop, signame=None):
@@ -82,23 +42,39 @@ async def handle_shutdown(loop, signame=None):
     logger.info(f"Handling shutdown due to {signame}")
     shutdown_flag = True
 
-    # Await completion of the reset task explicitly if it's running
-    if debounce_task and not debounce_task.done():
-        debounce_task.cancel()
-        try:
-            await debounce_task
-        except asyncio.CancelledError:
-            logger.info("Debounce task canceled during shutdown.")
+    # Reset the speaker volumes of every receiver
+    results = await asyncio.gather(
+        *(controller.shutdown() for controller in controllers), return_exceptions=True
+    )
+    for controller, result in zip(controllers, results):
+        if isinstance(result, Exception):
+            logger.error(f"{controller.name}: Failed to shut down: {result}")
+
+    if journal is not None:
+        journal.close()
+
+    # Keep what was profiled so far
+    if profiler is not None and profiler.active:
+        await profiler.toggle()
 
-    # Reset speaker volumes explicitly
-    await reset_speaker_volume(json_data)
+    # Don't leave tasks pending when the loop closes
+    remaining = [task for task in tasks if task is not asyncio.current_task()]
+    for task in remaining:
+        task.cancel()
+    await asyncio.gather(*remaining, return_exceptions=True)
 
     # Close the loop after reset to ensure all commands are sent
     loop.stop()
 
 
+async def create_receiver(ip):
+    denonavr = await denonavr_import
+    return denonavr.DenonAVR(ip)
+
+
 # Main entry point
 def main():
+    global profiler
     try:
         loop = asyncio.get_event_loop()
     except RuntimeError:
@@ -114,6 +90,13 @@ def main():
                 ),
             )
 
+        # Opt-in profiling of the running daemon: start with SIGUSR1, stop and write the reports with the next
+        profiler = profiling_session_from_env(tasks)
+        if profiler is not None:
+            loop.add_signal_handler(
+                signal.SIGUSR1, lambda: asyncio.create_task(profiler.toggle())
+            )
+
     loop.run_until_complete(main_async())
 
     try:
@@ -127,24 +110,45 @@ def main():
 
 # Function to run the async tasks
 async def main_async():
-    global json_data
+    global metrics_server, state_server, journal, denonavr_import
+    logger.info(f"Imports done in {time.perf_counter() - started_at:.3f}s")
+    denonavr_import = asyncio.ensure_future(
+        asyncio.to_thread(importlib.import_module, "denonavr")
+    )
+    journal = journal_from_env()
+
+    for receiver_config in receiver_configs:
+        controllers.append(
+            ReceiverController(
+                receiver_config.get("name", receiver_config["ip"]),
+                None,  # The receiver is made once denonavr is imported
+                receiver_config.get("config_path", "config"),
+                tasks,
+                reference_volume=receiver_config.get("reference_volume"),
+                speaker_config=receiver_config.get("speaker_config"),
+                journal=journal,
+                curve=receiver_config.get("curve"),
+                profiles=receiver_config.get("profiles"),
+                telnet_proxy_port=receiver_config.get("telnet_proxy_port"),
+                create_receiver=lambda ip=receiver_config["ip"]: create_receiver(ip),
+            )
+        )
+
+    # Optional Prometheus endpoint, metrics are only rendered when scraped
+    metrics_port = metrics_port_from_env()
+    if metrics_port is not None:
+        metrics_server = await start_metrics_server(metrics_port, controllers)
 
-    # Load the JSON calibration data
-    config_path = os.getenv("CONFIG_PATH", "config")
-    json_data = await load_json_data(config_path)
+    # Optional local state API, so dashboards don't have to poll the receivers
+    state_api_port = state_api_port_from_env()
+    if state_api_port is not None:
+        state_server = await start_state_server(state_api_port, controllers)
 
-    # Set up AVR with the loaded JSON data
-    await setup_volume_monitoring()
+    await asyncio.gather(*(start_controller(controller) for controller in controllers))
+    logger.info(f"Started {len(controllers)} receiver(s) {time.perf_counter() - started_at:.3f}s after launch")
 
 
 if __name__ == "__main__":
-    logger = logging.getLogger(__name__)
-    # Get receiver IP from env variable
-    receiver_ip = os.getenv("RECEIVER_IP")
-    # Ensure that config_path is supplied
-    if not receiver_ip:
-        raise ValueError(
-            "Receiver IP is required but not provided. To set the environment variable use set RECEIVER_IP=<receiver ip> in Windows or export RECEIVER_IP=<receiver ip> in MacOS or Linux"
-        )
-    receiver = denonavr.DenonAVR(receiver_ip)  # Define the receiver
+    # Get the receivers from the environment, fails if no receiver is configured
+    receiver_configs = load_receiver_configs()
     main()
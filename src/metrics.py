@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in seconds, from sub-millisecond computations to multi-second debounce waits
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Bucket upper bounds in seconds for recovering from a lost connection, up to several backoff rounds
+RECOVERY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Bucket upper bounds for the number of commands in a batch
+COUNT_BUCKETS = (1, 2, 4, 8, 12, 16, 24, 32)
+
+
+class Histogram:
+    """
+    Cumulative histogram per receiver, rendered in the Prometheus text format.
+
+    Observing only increments a few numbers, everything else happens when the metrics are scraped.
+    """
+
+    def __init__(self, name, documentation, buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.values = {}  # receiver -> [bucket counts..., sum, count]
+
+    def observe(self, receiver, value):
+        values = self.values.get(receiver)
+        if values is None:
+            values = self.values[receiver] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            values[index] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for receiver, values in self.values.items():
+            label = f'receiver="{escape_label(receiver)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {values[-2]}")
+            lines.append(f"{self.name}_count{{{label}}} {values[-1]}")
+        return lines
+
+
+DEBOUNCE_WAIT = Histogram(
+    "avr_debounce_wait_seconds",
+    "Time from the first volume event of a burst until its correction was released.",
+)
+COMPUTE_TIME = Histogram(
+    "avr_adjustment_compute_seconds",
+    "Time spent calculating a correction, without waiting for the receiver.",
+)
+SEND_LATENCY = Histogram(
+    "avr_command_ack_seconds",
+    "Time from writing a command until the receiver echoed it.",
+)
+BATCH_SIZE = Histogram(
+    "avr_commands_per_batch",
+    "Number of commands sent for a single correction.",
+    COUNT_BUCKETS,
+)
+RECOVERY_TIME = Histogram(
+    "avr_reconnect_recovery_seconds",
+    "Time from noticing a lost telnet connection until the correction was re-applied.",
+    RECOVERY_BUCKETS,
+)
+HISTOGRAMS = (DEBOUNCE_WAIT, COMPUTE_TIME, SEND_LATENCY, BATCH_SIZE, RECOVERY_TIME)
+
+# Counters read from the controllers when the metrics are scraped
+COUNTERS = {
+    "avr_debounce_cancelled_total": "Debounce timers cancelled by a newer volume event.",
+    "avr_skipped_events_total": "Volume events that needed no adjustment.",
+    "avr_reconnects_total": "Times the telnet connection to the receiver was restored.",
+    "avr_commands_sent_total": "Commands written to the receiver, retries included.",
+    "avr_commands_failed_total": "Commands the receiver never echoed.",
+    "avr_commands_superseded_total": "Queued commands replaced or dropped before being sent.",
+}
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(controllers) -> str:
+    """Render every metric in the Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    counters = [(controller.name, controller.counters()) for controller in controllers]
+    for name, documentation in COUNTERS.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} counter")
+        for receiver, values in counters:
+            lines.append(f'{name}{{receiver="{escape_label(receiver)}"}} {values.get(name, 0)}')
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(port: int, controllers, host="0.0.0.0"):
+    """Serve the metrics on GET /metrics. They are only rendered when scraped."""
+
+    async def handle_request(reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Skip the headers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status = "200 OK"
+                body = render_metrics(controllers).encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1")
+                + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_request, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def metrics_port_from_env():
+    """The port to serve metrics on, or None when METRICS_PORT is not set."""
+    port = int(os.getenv("METRICS_PORT", "0"))
+    return port if port > 0 else None
@@ -0,0 +1,84 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileSelector:
+    """
+    Picks the calibration file for the receiver's input source and sound mode.
+
+    A sound mode mapped to a file wins over the input source, so a music sound mode can pick the
+    music calibration whatever the input. Anything not mapped uses the default file.
+
+    Args:
+        inputs (dict): File names keyed by input source as the receiver reports it, like 'BD' or 'CD'.
+        sound_modes (dict): File names keyed by sound mode, like 'STEREO' or 'DOLBY ATMOS'.
+        default (str): File name used when nothing matches.
+    """
+
+    def __init__(self, inputs=None, sound_modes=None, default=None):
+        self.inputs = {source.upper(): name for source, name in (inputs or {}).items()}
+        self.sound_modes = {mode.upper(): name for mode, name in (sound_modes or {}).items()}
+        self.default = default
+
+    def file_names(self) -> set:
+        """Every file name the selector can pick."""
+        names = set(self.inputs.values()) | set(self.sound_modes.values())
+        if self.default is not None:
+            names.add(self.default)
+        return names
+
+    def select(self, input_source=None, sound_mode=None):
+        """The file name for the source and mode, or the default."""
+        if sound_mode is not None and sound_mode.upper() in self.sound_modes:
+            return self.sound_modes[sound_mode.upper()]
+        if input_source is not None and input_source.upper() in self.inputs:
+            return self.inputs[input_source.upper()]
+        return self.default
+
+
+def parse_profile_selector(config: dict) -> ProfileSelector:
+    """
+    Build a profile selector from its JSON form:
+
+        {
+            "inputs": {"BD": "film.ady", "CD": "music.ady"},
+            "sound_modes": {"STEREO": "music.ady"},
+            "default": "film.ady"
+        }
+    """
+    for key in ("inputs", "sound_modes"):
+        if not isinstance(config.get(key, {}), dict):
+            raise ValueError(f'"{key}" must map names to .ady files')
+    return ProfileSelector(
+        inputs=config.get("inputs"),
+        sound_modes=config.get("sound_modes"),
+        default=config.get("default"),
+    )
+
+
+def load_profile_selector(profiles_config=None):
+    """
+    Load the profile selector from the given config or the CALIBRATION_PROFILES environment variable.
+
+    The config can be a dict, a JSON string or the path to a JSON file. Without any, or when it is
+    invalid, None is returned and a single calibration file is used.
+    """
+    if profiles_config is None:
+        profiles_config = os.getenv("CALIBRATION_PROFILES")
+    if not profiles_config:
+        return None
+
+    try:
+        if isinstance(profiles_config, str):
+            if profiles_config.lstrip().startswith("{"):
+                profiles_config = json.loads(profiles_config)
+            else:
+                with open(profiles_config, encoding="utf-8") as file:
+                    profiles_config = json.load(file)
+        return parse_profile_selector(profiles_config)
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Invalid calibration profiles, using a single calibration file: {e}")
+        return None
@@ -0,0 +1,164 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Number of event loop lag samples kept while profiling
+LAG_SAMPLES = 10000
+
+# Lines of the profile and memory reports
+REPORT_LINES = 40
+
+
+class ProfilingSession:
+    """
+    Profiles the running daemon between two calls of toggle, triggered by SIGUSR1.
+
+    While active, every function call is profiled with cProfile, memory allocations are traced and
+    the event loop's lag is measured. Stopping writes the reports to the directory, each file named
+    after the time profiling started:
+
+    - <stamp>.pstats: The raw profile, for snakeviz or pstats.
+    - <stamp>-profile.txt: The functions taking the most time.
+    - <stamp>-memory.txt: Where memory was allocated since profiling started.
+    - <stamp>-tasks.txt: The stack of every tracked asyncio task.
+    - <stamp>-loop-lag.txt: How late the event loop ran a timer.
+
+    Args:
+        directory (str): Where the reports are written.
+        tasks (set): The daemon's tracked tasks, dumped when stopping.
+        lag_interval (float): Seconds between two event loop lag measurements.
+    """
+
+    def __init__(self, directory, tasks: set, lag_interval=0.1):
+        self.directory = directory
+        self.tasks = tasks
+        self.lag_interval = lag_interval
+
+        self.profiler = None
+        self.started_at = None
+        self.memory_baseline = None
+        self.started_tracemalloc = False
+        self.lag_task = None
+        self.lags = deque(maxlen=LAG_SAMPLES)
+
+    @property
+    def active(self) -> bool:
+        return self.profiler is not None
+
+    async def toggle(self):
+        """Start profiling, or stop it and write the reports. Returns the paths written when stopping."""
+        if not self.active:
+            self.start()
+            return []
+        return await self.stop()
+
+    def start(self):
+        self.started_at = time.time()
+        # Keep a trace started by PYTHONTRACEMALLOC running after profiling
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+        self.memory_baseline = tracemalloc.take_snapshot()
+
+        self.lags.clear()
+        self.lag_task = asyncio.create_task(self.measure_loop_lag())
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+        logger.info(f"Profiling started, send SIGUSR1 again to write the reports to {self.directory}")
+
+    async def stop(self):
+        self.profiler.disable()
+        profiler, self.profiler = self.profiler, None
+        self.lag_task.cancel()
+        await asyncio.gather(self.lag_task, return_exceptions=True)
+
+        memory = tracemalloc.take_snapshot().compare_to(self.memory_baseline, "lineno")
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        self.memory_baseline = None
+
+        duration = time.time() - self.started_at
+        reports = {
+            "profile.txt": render_profile(profiler, duration),
+            "memory.txt": render_memory(memory),
+            "tasks.txt": render_tasks(self.tasks),
+            "loop-lag.txt": render_lags(self.lags, self.lag_interval),
+        }
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        try:
+            paths = await asyncio.to_thread(self.write_reports, stamp, profiler, reports)
+        except OSError as e:
+            logger.error(f"Failed to write the profiling reports to {self.directory}: {e}")
+            return []
+        logger.info(f"Profiled {duration:.1f}s, reports written to {self.directory}")
+        return paths
+
+    def write_reports(self, stamp, profiler, reports):
+        os.makedirs(self.directory, exist_ok=True)
+        paths = [os.path.join(self.directory, f"{stamp}.pstats")]
+        profiler.dump_stats(paths[0])
+        for name, report in reports.items():
+            path = os.path.join(self.directory, f"{stamp}-{name}")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(report)
+            paths.append(path)
+        return paths
+
+    async def measure_loop_lag(self):
+        """Record how much later than asked the event loop wakes up a sleeping task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.lags.append(loop.time() - expected)
+
+
+def render_profile(profiler, duration) -> str:
+    output = io.StringIO()
+    output.write(f"Profiled for {duration:.1f}s\n")
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(REPORT_LINES)
+    return output.getvalue()
+
+
+def render_memory(differences) -> str:
+    lines = [f"Largest {REPORT_LINES} changes of allocated memory since profiling started"]
+    lines.extend(str(difference) for difference in differences[:REPORT_LINES])
+    return "\n".join(lines) + "\n"
+
+
+def render_tasks(tasks) -> str:
+    output = io.StringIO()
+    output.write(f"{len(tasks)} tracked tasks, {len(asyncio.all_tasks())} tasks in total\n")
+    for task in sorted(tasks, key=lambda task: task.get_name()):
+        output.write(f"\n{task!r}\n")
+        if not task.done():
+            task.print_stack(file=output)
+    return output.getvalue()
+
+
+def render_lags(lags, interval) -> str:
+    if not lags:
+        return "No event loop lag measured\n"
+    ordered = sorted(lags)
+    return (
+        f"{len(ordered)} samples every {interval}s\n"
+        f"median: {ordered[len(ordered) // 2] * 1000:.2f}ms\n"
+        f"p99: {ordered[int(len(ordered) * 0.99)] * 1000:.2f}ms\n"
+        f"max: {ordered[-1] * 1000:.2f}ms\n"
+    )
+
+
+def profiling_session_from_env(tasks: set):
+    """The profiling session toggled by SIGUSR1, or None when PROFILE_DIR is not set."""
+    directory = os.getenv("PROFILE_DIR")
+    if not directory:
+        return None
+    return ProfilingSession(directory, tasks, float(os.getenv("PROFILE_LAG_INTERVAL", "0.1")))
@@ -0,0 +1,60 @@
+import os
+import random
+
+
+class ReconnectPolicy:
+    """
+    Decides when the telnet connection is considered lost and how long to wait between reconnects.
+
+    Args:
+        poll_interval (float): Seconds between two checks of the connection. 0 disables supervision.
+        keepalive_interval (float): Seconds of silence from the receiver before asking it for its power
+            state, to check it still answers. 0 disables the keepalive.
+        keepalive_timeout (float): Seconds the receiver has to answer the keepalive before the connection
+            is considered lost.
+        backoff_initial (float): Delay before the second reconnect attempt, doubled for every further one.
+        backoff_max (float): Longest delay between two reconnect attempts.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = 1.0,
+        keepalive_interval: float = 10.0,
+        keepalive_timeout: float = 5.0,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0,
+        rng=None,
+    ):
+        self.poll_interval = poll_interval
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_timeout = keepalive_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = max(backoff_max, backoff_initial)
+        self.random = rng or random.Random()
+
+    def keepalive_due(self, silence: float) -> bool:
+        return 0 < self.keepalive_interval < silence
+
+    def timed_out(self, silence: float) -> bool:
+        return self.keepalive_interval > 0 and silence > self.keepalive_interval + self.keepalive_timeout
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Seconds to wait after the given failed attempt, counting from 0.
+
+        The delay doubles up to backoff_max, and its upper half is random so that receivers dropped
+        at the same time, for example by a Wi-Fi blip, don't all reconnect at the same moment.
+        """
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** min(attempt, 32))
+        return delay / 2 + self.random.uniform(0, delay / 2)
+
+
+def reconnect_policy_from_env() -> ReconnectPolicy:
+    """Build the reconnect policy from the CONNECTION_*, KEEPALIVE_* and RECONNECT_* environment variables."""
+    return ReconnectPolicy(
+        poll_interval=float(os.getenv("CONNECTION_POLL_INTERVAL", "1.0")),
+        keepalive_interval=float(os.getenv("KEEPALIVE_INTERVAL", "10.0")),
+        keepalive_timeout=float(os.getenv("KEEPALIVE_TIMEOUT", "5.0")),
+        backoff_initial=float(os.getenv("RECONNECT_BACKOFF", "0.5")),
+        backoff_max=float(os.getenv("RECONNECT_BACKOFF_MAX", "30.0")),
+    )
@@ -0,0 +1,229 @@
+"""
+Replay a recorded journal through the debounce and adjustment logic on a virtual clock.
+
+The event loop's clock only moves forward when nothing is ready to run, jumping straight to the next
+timer, so hours of recorded volume changes replay in moments while every debounce window, command
+interval and timeout keeps its length in virtual time:
+
+    python src/replay.py journal.log --config-path config
+    DEBOUNCE_DELAY=1 python src/replay.py journal.log --config-path config --output replay.json
+
+Use --speed to replay at a multiple of real time instead, for example to watch the logs go by.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import selectors
+import statistics
+import time
+
+from controller import ReceiverController
+from journal import BATCH, VOLUME, JournalRecorder, parse_journal_line, read_journal
+
+logger = logging.getLogger(__name__)
+
+
+class VirtualClockSelector(selectors.DefaultSelector):
+    """
+    Selector advancing a virtual clock instead of waiting for timers.
+
+    Args:
+        speed (float): Multiple of real time to run at, 0 to jump ahead without waiting.
+    """
+
+    def __init__(self, speed=0.0):
+        super().__init__()
+        self.speed = speed
+        self.now = 0.0
+
+    def select(self, timeout=None):
+        # Without timers, or with work ready, there is nothing to skip
+        if timeout is None or timeout <= 0:
+            return super().select(timeout)
+
+        started_at = time.monotonic()
+        ready = super().select(timeout / self.speed if self.speed > 0 else 0)
+        if ready:
+            self.now += min(timeout, (time.monotonic() - started_at) * self.speed)
+        else:
+            self.now += timeout
+        return ready
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop running on the clock of a VirtualClockSelector."""
+
+    def __init__(self, speed=0.0):
+        self.clock = VirtualClockSelector(speed)
+        super().__init__(self.clock)
+
+    def time(self):
+        return self.clock.now
+
+
+class ReplayReceiver:
+    """Receiver acknowledging every command after a fixed latency, in virtual time."""
+
+    def __init__(self, ack_latency=0.0):
+        self.ack_latency = ack_latency
+        self.callbacks = {}
+        self.commands = []
+
+    async def async_setup(self):
+        pass
+
+    async def async_telnet_connect(self):
+        pass
+
+    async def async_update(self):
+        pass
+
+    def register_callback(self, event, callback):
+        self.callbacks.setdefault(event, []).append(callback)
+
+    async def async_send_telnet_commands(self, *commands):
+        for command in commands:
+            self.commands.append(command)
+            if self.ack_latency:
+                await asyncio.sleep(self.ack_latency)
+            for callback in self.callbacks.get(command[:2], []):
+                await callback("Main", command[:2], command[2:])
+
+
+def correction_delays(records):
+    """Seconds from the last volume event before each batch to the batch itself."""
+    delays = []
+    latest_volume_at = None
+    for record in records:
+        if record.kind == VOLUME:
+            latest_volume_at = record.timestamp
+        elif record.kind == BATCH and latest_volume_at is not None:
+            delays.append(record.timestamp - latest_volume_at)
+    return delays
+
+
+def summarize(records) -> dict:
+    batches = [record for record in records if record.kind == BATCH]
+    delays = correction_delays(records)
+    return {
+        "volume_events": sum(1 for record in records if record.kind == VOLUME),
+        "batches": len(batches),
+        "commands": sum(len(record.payload) for record in batches),
+        "correction_delay_median": statistics.median(delays) if delays else None,
+        "correction_delay_max": max(delays) if delays else None,
+    }
+
+
+async def replay_records(records, config_path, ack_latency=0.0, **profile_options):
+    """
+    Feed the volume events of a journal through a controller at their recorded pace.
+
+    Returns:
+        tuple: The records the replay produced and the controller that produced them.
+    """
+    loop = asyncio.get_running_loop()
+    output = io.StringIO()
+    tasks = set()
+
+    controller = ReceiverController(
+        "replay",
+        ReplayReceiver(ack_latency),
+        config_path,
+        tasks,
+        journal=JournalRecorder(output, loop.time),
+        **profile_options,
+    )
+    # A journal starts at its first volume event, there is no receiver state to read before it,
+    # and nothing may be recorded into the config folder
+    controller.startup_sync_timeout = None
+    controller.applied_record = None
+    await controller.start()
+
+    events = [record for record in records if record.kind == VOLUME]
+    if events:
+        offset = loop.time() - events[0].timestamp
+        for record in events:
+            await asyncio.sleep(max(0, record.timestamp + offset - loop.time()))
+            await controller.on_volume(record.payload)
+
+    # Let the last burst run out before stopping
+    debouncer = controller.debouncer
+    while any(
+        task is not None and not task.done()
+        for task in (debouncer.timer_task, debouncer.callback_task)
+    ):
+        await asyncio.sleep(debouncer.policy.window())
+
+    for task in list(tasks):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    replayed = [parse_journal_line(line) for line in output.getvalue().splitlines()]
+    return [record for record in replayed if record is not None], controller
+
+
+def run_replay(records, config_path, speed=0.0, ack_latency=0.0, **profile_options) -> dict:
+    """Replay the records on a virtual clock and compare the result with the recording."""
+    loop = VirtualClockLoop(speed)
+    started_at = time.monotonic()
+    try:
+        replayed, controller = loop.run_until_complete(
+            replay_records(records, config_path, ack_latency, **profile_options)
+        )
+    finally:
+        loop.close()
+
+    return {
+        "recorded": summarize(records),
+        "replayed": summarize(replayed),
+        "command_queue": controller.command_queue.summary(),
+        "debounce_decisions": dict(controller.debouncer.policy.decisions),
+        "virtual_seconds": replayed[-1].timestamp - replayed[0].timestamp if replayed else 0,
+        "real_seconds": time.monotonic() - started_at,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a journal of volume events")
+    parser.add_argument("journal", help="Journal written with JOURNAL_PATH")
+    parser.add_argument("--config-path", default="config", help="Folder with the .ady file")
+    parser.add_argument("--receiver", help="Receiver to replay, defaults to the first in the journal")
+    parser.add_argument("--reference-volume", type=int, help="Overrides the .ady reference volume")
+    parser.add_argument(
+        "--speed", type=float, default=0.0, help="Multiple of real time, 0 for as fast as possible"
+    )
+    parser.add_argument(
+        "--ack-latency", type=float, default=0.0, help="Seconds the receiver takes to echo"
+    )
+    parser.add_argument("--output", help="Write the summary to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Log every event and command")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+
+    records = read_journal(args.journal, args.receiver)
+    if args.receiver is None and records:
+        receiver = records[0].receiver
+        records = [record for record in records if record.receiver == receiver]
+
+    summary = run_replay(
+        records,
+        args.config_path,
+        args.speed,
+        args.ack_latency,
+        reference_volume=args.reference_volume,
+    )
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Number of recent command batches each controller keeps for the snapshot
+ADJUSTMENT_HISTORY = 50
+
+# Messages waiting for a WebSocket client before it is considered too slow and disconnected
+CLIENT_QUEUE_SIZE = 100
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# Clients only send pings and close frames, anything longer is refused before it is read
+MAX_FRAME_SIZE = 4096
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+
+def encode_frame(payload: bytes, opcode=OPCODE_TEXT) -> bytes:
+    """Frame a WebSocket message from the server, which is never masked."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_frame(reader, max_size=MAX_FRAME_SIZE):
+    """
+    Read a WebSocket frame sent by a client, which is always masked.
+
+    Returns:
+        tuple: The opcode and the unmasked payload.
+
+    Raises:
+        ValueError: When the payload is longer than max_size.
+    """
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    if length > max_size:
+        raise ValueError(f"WebSocket frame of {length} bytes is over the limit of {max_size}")
+    mask = await reader.readexactly(4) if second & 0x80 else b"\x00" * 4
+    payload = await reader.readexactly(length)
+    return first & 0x0F, bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+
+
+def websocket_accept(key: str) -> str:
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+class StateFeed:
+    """
+    Pushes the changes of every receiver's state to the connected WebSocket clients.
+
+    Keeps the state last published per receiver, so only the fields that changed are sent. Messages
+    are encoded once for all clients.
+    """
+
+    def __init__(self):
+        self.published = {}
+        self.subscribers = set()  # One bounded queue of encoded frames per client
+
+    def publish(self, receiver, state: dict):
+        """Send the fields of the state that changed since the last call, returning them."""
+        previous = self.published.get(receiver, {})
+        changes = {key: value for key, value in state.items() if previous.get(key) != value}
+        if not changes:
+            return None
+        self.published[receiver] = dict(state)
+        self.broadcast({"receiver": receiver, "changes": changes})
+        return changes
+
+    def broadcast(self, message: dict):
+        if not self.subscribers:
+            return
+        frame = encode_frame(json.dumps(message).encode("utf-8"))
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # A client that can't keep up is dropped instead of holding on to every message
+                logger.warning("Disconnecting a state client that doesn't keep up")
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def subscribe(self):
+        queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+
+# Shared by every controller of the process, like the metrics
+STATE_FEED = StateFeed()
+
+
+def render_state(controllers) -> dict:
+    """Snapshot of everything the daemon knows about each receiver, without asking the receivers."""
+    return {
+        "receivers": {
+            controller.name: dict(
+                controller.state_snapshot(),
+                recent_adjustments=list(controller.recent_adjustments),
+            )
+            for controller in controllers
+        }
+    }
+
+
+async def read_headers(reader) -> dict:
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def stream_state(reader, writer, key, controllers, feed):
+    """Upgrade the connection to a WebSocket, send a snapshot and then every change."""
+    writer.write(
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n".encode("latin-1")
+    )
+    queue = feed.subscribe()
+    snapshot = json.dumps({"snapshot": render_state(controllers)}).encode("utf-8")
+    queue.put_nowait(encode_frame(snapshot))
+
+    async def send_frames():
+        while True:
+            frame = await queue.get()
+            if frame is None:
+                return
+            writer.write(frame)
+            await writer.drain()
+
+    sender = asyncio.create_task(send_frames())
+    try:
+        # Clients only talk to close the connection or to ping
+        while not sender.done():
+            receive = asyncio.ensure_future(read_frame(reader))
+            await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if not receive.done():
+                receive.cancel()
+                break
+            try:
+                opcode, payload = receive.result()
+            except ValueError as e:
+                logger.warning(f"Closing a state client: {e}")
+                writer.write(encode_frame(struct.pack("!H", CLOSE_MESSAGE_TOO_BIG), OPCODE_CLOSE))
+                break
+            if opcode == OPCODE_CLOSE:
+                writer.write(encode_frame(payload[:2], OPCODE_CLOSE))
+                break
+            if opcode == OPCODE_PING:
+                writer.write(encode_frame(payload, OPCODE_PONG))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        feed.unsubscribe(queue)
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+
+
+async def start_state_server(port: int, controllers, host="0.0.0.0", feed=None):
+    """
+    Serve the receivers' state: a JSON snapshot on GET /state and a WebSocket pushing every change
+    on /state/stream.
+    """
+    feed = feed or STATE_FEED
+
+    async def handle_request(reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = await read_headers(reader)
+
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) >= 2 and parts[0] == "GET" else None
+            key = headers.get("sec-websocket-key")
+            if path == "/state/stream" and key and headers.get("upgrade", "").lower() == "websocket":
+                await stream_state(reader, writer, key, controllers, feed)
+                return
+
+            if path == "/state":
+                status = "200 OK"
+                body = json.dumps(render_state(controllers)).encode("utf-8")
+                content_type = "application/json"
+            else:
+                status = "404 Not Found"
+                body = b"Not found\n"
+                content_type = "text/plain; charset=utf-8"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1")
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_request, host, port)
+    logger.info(f"Serving receiver state on http://{host}:{port}/state")
+    return server
+
+
+def state_api_port_from_env():
+    """The port to serve the state API on, or None when STATE_API_PORT is not set."""
+    port = int(os.getenv("STATE_API_PORT", "0"))
+    return port if port > 0 else None
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Lines waiting for a downstream client before it is considered too slow and disconnected
+CLIENT_QUEUE_SIZE = 1000
+
+# Longest command a client may send, receivers ignore anything close to this anyway
+MAX_COMMAND_LENGTH = 135
+
+
+def telnet_message(zone, event, parameter) -> str:
+    """
+    Rebuild the telnet line the receiver sent from the zone, event and parameter denonavr split it into.
+
+    Zone 2 and 3 messages like 'Z250' or 'Z2CD' are reported as MV or SI events of that zone.
+    """
+    prefix = {"Zone2": "Z2", "Zone3": "Z3"}.get(zone)
+    if prefix is None:
+        return event + parameter
+    if event in ("MV", "SI"):
+        return prefix + parameter
+    return prefix + event + parameter
+
+
+class TelnetProxy:
+    """
+    Lets other telnet clients share the receiver's single telnet session.
+
+    The controller keeps the only connection to the receiver. Every message from the receiver is
+    sent to every connected client, and the commands of the clients go through the controller's
+    command queue, so they are paced together with the corrections and never interleave with them.
+
+    Args:
+        name (str): Name of the receiver for the logs.
+        command_queue: The controller's CommandQueue, the single writer to the receiver.
+    """
+
+    def __init__(self, name, command_queue):
+        self.name = name
+        self.command_queue = command_queue
+        self.server = None
+        self.clients = set()  # One bounded queue of lines per client
+
+    async def start(self, port: int, host="0.0.0.0"):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        logger.info(f"{self.name}: Sharing the telnet connection on {host}:{port}")
+        return self.server
+
+    async def close(self):
+        if self.server is None:
+            return
+        self.server.close()
+        for queue in list(self.clients):
+            self.disconnect(queue)
+        await self.server.wait_closed()
+
+    async def on_message(self, zone, event, parameter):
+        """denonavr callback for every event, relays the message to the clients."""
+        if not self.clients:
+            return
+        line = (telnet_message(zone, event, parameter) + "\r").encode("ascii", "replace")
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(line)
+            except asyncio.QueueFull:
+                # A client that doesn't read must not hold on to every message of the receiver
+                logger.warning(f"{self.name}: Disconnecting a telnet client that doesn't keep up")
+                self.disconnect(queue)
+
+    def disconnect(self, queue):
+        self.clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        logger.info(f"{self.name}: Telnet client {peer} connected")
+        queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.clients.add(queue)
+
+        async def send_lines():
+            while True:
+                line = await queue.get()
+                if line is None:
+                    return
+                writer.write(line)
+                await writer.drain()
+
+        sender = asyncio.create_task(send_lines())
+        buffer = b""
+        try:
+            while not sender.done():
+                receive = asyncio.ensure_future(reader.read(1024))
+                await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+                if not receive.done():
+                    receive.cancel()
+                    break
+                data = receive.result()
+                if not data:
+                    break
+                # Receivers end commands with CR, most telnet clients send CR LF
+                *lines, buffer = (buffer + data).replace(b"\n", b"\r").split(b"\r")
+                buffer = buffer[-MAX_COMMAND_LENGTH:]
+                for line in lines:
+                    command = line.decode("ascii", "replace").strip()
+                    if command and len(command) <= MAX_COMMAND_LENGTH:
+                        # Commands of one client stay in order, the queue paces them with everything else
+                        await self.command_queue.forward(command)
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(queue)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            writer.close()
+            logger.info(f"{self.name}: Telnet client {peer} disconnected")
+
+
+def telnet_proxy_port_from_env():
+    """The port to share the telnet connection on, or None when TELNET_PROXY_PORT is not set."""
+    port = int(os.getenv("TELNET_PROXY_PORT", "0"))
+    return port if port > 0 else None
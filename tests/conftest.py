@@ -0,0 +1,162 @@
+import asyncio
+import json
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.controller import ReceiverController
+
+
+class FakeReceiver:
+    """
+    Stand-in for denonavr.DenonAVR, answering the queries of the controller from its state.
+
+    Commands changing the volume or a setting are echoed like the receiver confirms them, and every
+    message also goes to the "ALL" callbacks. The telnet connection can be made to drop, to refuse
+    connecting and to stop answering.
+    """
+
+    def __init__(
+        self,
+        volume="50",
+        levels=None,
+        source="BD",
+        sound_mode="DOLBY ATMOS",
+        dynamic_eq="ON",
+        reference_level_offset="0",
+    ):
+        self.volume = volume
+        self.levels = dict(levels or {})
+        self.source = source
+        self.sound_mode = sound_mode
+        self.settings = {"DYNEQ": dynamic_eq, "REFLEV": reference_level_offset}
+        self.telnet_healthy = True
+        self.failed_connects = 0  # Connection attempts still to refuse
+        self.connects = 0
+        self.disconnects = 0
+        self.answering = True
+        self.callbacks = {}
+        self.commands = []
+
+    async def async_setup(self):
+        pass
+
+    async def async_telnet_connect(self):
+        if self.failed_connects:
+            self.failed_connects -= 1
+            raise OSError("Connection refused")
+        self.connects += 1
+        self.telnet_healthy = True
+
+    async def async_telnet_disconnect(self):
+        self.disconnects += 1
+        self.telnet_healthy = False
+
+    async def async_update(self):
+        pass
+
+    def register_callback(self, event, callback):
+        self.callbacks.setdefault(event, []).append(callback)
+
+    async def emit(self, event, parameter, zone="Main"):
+        for callback in self.callbacks.get(event, []) + self.callbacks.get("ALL", []):
+            await callback(zone, event, parameter)
+
+    async def change(self, setting, value):
+        """Change a Dynamic EQ setting on the receiver itself."""
+        self.settings[setting] = value
+        await self.emit("PS", f"{setting} {value}")
+
+    async def async_send_telnet_commands(self, *commands):
+        for command in commands:
+            self.commands.append(command)
+            if self.answering:
+                await self.answer(command)
+
+    async def answer(self, command):
+        if command == "MV?":
+            await self.emit("MV", self.volume)
+            await self.emit("MV", "MAX 980")
+        elif command == "SSLEV ?":
+            for speaker, level in list(self.levels.items()):
+                await self.emit("SS", f"LEV{speaker} {level}")
+        elif command == "SI?":
+            await self.emit("SI", self.source)
+        elif command == "MS?":
+            await self.emit("MS", self.sound_mode)
+        elif command == "PW?":
+            await self.emit("PW", "ON")
+        elif command in ("PSDYNEQ ?", "PSREFLEV ?"):
+            setting = command[2:-2]
+            await self.emit("PS", f"{setting} {self.settings[setting]}")
+        elif command.startswith("SSLEV"):
+            speaker, _, level = command[5:].partition(" ")
+            self.levels[speaker] = level
+            await self.emit("SS", command[2:])
+        elif command.startswith("MV"):
+            self.volume = command[2:]
+            await self.emit("MV", self.volume)
+
+
+@pytest.fixture
+def controller_environment(monkeypatch):
+    """Fast timings for running controllers, without the startup sync and the applied levels record."""
+    for name in (
+        "RECEIVERS_CONFIG",
+        "TELNET_ONLY",
+        "REFERENCE_VOLUME",
+        "SPEAKER_CONFIG",
+        "CORRECTION_CURVE",
+        "CALIBRATION_PROFILES",
+        "TELNET_PROXY_PORT",
+        "DISCOVERY_CACHE_TTL",
+        "STARTUP_SYNC_TIMEOUT",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("CALIBRATION_POLL_INTERVAL", "0")
+    monkeypatch.setenv("CONNECTION_POLL_INTERVAL", "0")
+    monkeypatch.setenv("DEBOUNCE_DELAY", "0.01")
+    monkeypatch.setenv("COMMAND_INTERVAL", "0")
+    monkeypatch.setenv("APPLIED_LEVELS_RECORD", "false")
+    monkeypatch.setenv("STARTUP_SYNC", "false")
+
+
+def write_ady(directory, reference_volume=65, level=0, name="room.ady", channels=("SLA",)):
+    """Write a calibration with every channel at the same level, returning its folder."""
+    directory.mkdir(parents=True, exist_ok=True)
+    ady = {
+        "title": f"MV{reference_volume}dB",
+        "detectedChannels": [
+            {"commandId": channel, "customLevel": str(level)} for channel in channels
+        ],
+    }
+    (directory / name).write_text(json.dumps(ady), encoding="utf-8")
+    return str(directory)
+
+
+def run_controller(receiver, config_path, scenario=None, name="living", **options):
+    """Start a controller, play the scenario and stop without resetting the levels, like after a crash."""
+
+    async def run():
+        tasks = set()
+        controller = ReceiverController(name, receiver, config_path, tasks, **options)
+        await controller.start()
+        if scenario is not None:
+            await scenario(controller)
+            await asyncio.sleep(0.05)
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return controller
+
+    return asyncio.run(run())
+
+
+def turn_volume(volume):
+    """Scenario turning the volume on the receiver itself."""
+
+    async def scenario(controller):
+        await controller.receiver.emit("MV", volume)
+
+    return scenario
@@ -0,0 +1,92 @@
+import pytest
+import sys
+
+sys.path.append("./src")
+
+np = pytest.importorskip("numpy")
+
+from src.adjustment_grid import GROUPS, evaluate_grid, parse_range, write_csv
+from src.adjustmentlogic import (
+    VOLUME_STEPS,
+    calculate_adjustment,
+    compile_adjustment_table,
+    compute_speaker_adjustments,
+)
+from src.curve import parse_correction_curve
+
+REFERENCE_VOLUMES = list(range(45, 81))
+
+
+def bits(values):
+    return np.asarray(values, dtype=np.float64).view(np.uint64)
+
+
+@pytest.mark.parametrize("initial_level", [38, 41.5, 44.5, 50, 55.5, 62])
+def test_grid_is_bit_identical_to_the_scalar_path(initial_level):
+    factors, levels = evaluate_grid(VOLUME_STEPS, REFERENCE_VOLUMES, initial_level)
+
+    expected_factors = []
+    expected_levels = []
+    for main_volume in VOLUME_STEPS:
+        factor_row = []
+        level_row = []
+        for reference_volume in REFERENCE_VOLUMES:
+            factor = calculate_adjustment(main_volume, reference_volume)
+            adjustments = compute_speaker_adjustments(
+                {"SL": initial_level, "FHL": initial_level},
+                factor,
+                False,
+                half_change_speakers={"SL"},
+                quarter_change_speakers={"FHL"},
+            )
+            by_group = {"half": adjustments[0][3], "quarter": adjustments[1][3]}
+            factor_row.append(float(factor))
+            level_row.append([float(by_group[group]) for group in GROUPS])
+        expected_factors.append(factor_row)
+        expected_levels.append(level_row)
+
+    assert np.array_equal(bits(factors), bits(expected_factors))
+    assert np.array_equal(bits(levels), bits(expected_levels))
+
+
+def test_grid_follows_a_custom_curve_like_the_daemon():
+    curve = parse_correction_curve(
+        {
+            "boost": {"knots": [[40, 0], [47.5, 1.5], [60, 4]], "slope_below": 0.1, "slope_above": 0.3},
+            "reference": {"knots": [[60, 5], [75, 8]], "slope_below": 0.25, "slope_above": 0.1},
+            "group_scales": {"half": 0.75, "quarter": 0.3},
+        }
+    )
+    factors, levels = evaluate_grid(VOLUME_STEPS, REFERENCE_VOLUMES, 48.5, curve)
+
+    for column, reference_volume in enumerate(REFERENCE_VOLUMES):
+        table = compile_adjustment_table(
+            {"SL": 48.5, "FHL": 48.5}, reference_volume, {"SL"}, {"FHL"}, curve
+        )
+        expected_factors = [float(entry.adjustment_factor) for entry in table.entries]
+        expected_levels = [
+            [float(dict(entry.levels)[speaker]) for speaker in ("SL", "FHL")]
+            for entry in table.entries
+        ]
+        assert np.array_equal(bits(factors[:, column]), bits(expected_factors))
+        assert np.array_equal(bits(levels[:, column]), bits(expected_levels))
+
+
+def test_parse_range_includes_the_stop():
+    assert parse_range("45:47:0.5").tolist() == [45.0, 45.5, 46.0, 46.5, 47.0]
+
+
+def test_csv_keeps_full_precision(tmp_path):
+    main_volumes = parse_range("50:51:0.5")
+    reference_volumes = parse_range("65:65:1")
+    factors, levels = evaluate_grid(main_volumes, reference_volumes)
+    path = tmp_path / "grid.csv"
+
+    write_csv(str(path), main_volumes, reference_volumes, factors, levels)
+
+    assert path.read_text(encoding="utf-8").splitlines() == [
+        "main_volume,reference_volume,adjustment_factor,half_level,quarter_level",
+        "50.0,65.0,4.5,45.5,47.5",
+        "50.5,65.0,4.5,45.5,47.5",
+        "51.0,65.0,4.0,46.0,48.0",
+    ]
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.adjustmentlogic import (
+    AdjustmentState,
+    adjust_speaker_volumes,
+    send_level_changes,
+)
+
+speaker_levels = {"SL": 50.0, "SR": 51.0, "FHL": 50.0, "TFL": 38.0}
+
+
+@pytest.fixture
+def state():
+    state = AdjustmentState()
+    state.half_change_speakers = {"SL", "SR"}
+    state.quarter_change_speakers = {"FHL", "TFL"}
+    return state
+
+
+class Sender:
+    def __init__(self, succeed=True):
+        self.batches = []
+        self.succeed = succeed
+
+    async def __call__(self, adjustments):
+        self.batches.append(list(adjustments))
+        return self.succeed
+
+
+def adjust(state, sender, adjustment_factor, reset=False):
+    asyncio.run(
+        adjust_speaker_volumes(state, speaker_levels, adjustment_factor, sender, reset)
+    )
+
+
+def test_only_changed_levels_are_sent(state):
+    sender = Sender()
+
+    adjust(state, sender, 1.5)
+    # Quarter speakers stay at 49 for 1.5 and 2.0, TFL is pinned at 38
+    adjust(state, sender, 2.0)
+
+    assert sender.batches == [
+        ["SSLEVSL 485", "SSLEVSR 495", "SSLEVFHL 49", "SSLEVTFL 38"],
+        ["SSLEVSL 48", "SSLEVSR 49"],
+    ]
+
+
+def test_nothing_is_sent_when_all_levels_are_applied(state):
+    sender = Sender()
+
+    adjust(state, sender, 2.0)
+    adjust(state, sender, 2.0)
+
+    assert len(sender.batches) == 1
+
+
+def test_reset_only_restores_adjusted_channels(state):
+    sender = Sender()
+
+    adjust(state, sender, 1.0)
+    adjust(state, sender, 0, reset=True)
+
+    # TFL is pinned at 38 and was never moved
+    assert sender.batches[-1] == ["SSLEVSL 50", "SSLEVSR 51", "SSLEVFHL 50"]
+
+
+def test_failed_send_is_retried_in_full(state):
+    failing_sender = Sender(succeed=False)
+    adjust(state, failing_sender, 1.0)
+
+    sender = Sender()
+    adjust(state, sender, 1.0)
+
+    assert sender.batches == failing_sender.batches
+
+
+def test_send_level_changes_with_unknown_state_sends_everything(state):
+    sender = Sender()
+    levels = (("SL", 49.0), ("SR", 50.0))
+    commands = ("SSLEVSL 49", "SSLEVSR 50")
+
+    asyncio.run(send_level_changes(state, levels, commands, sender))
+
+    assert sender.batches == [list(commands)]
+    assert state.applied_levels == {"SL": 49.0, "SR": 50.0}
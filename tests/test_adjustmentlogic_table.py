@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src import adjustmentlogic
+from src.adjustmentlogic import (
+    VOLUME_STEPS,
+    AdjustmentState,
+    adjust_speaker_volumes,
+    calculate_adjustment,
+    compile_adjustment_table,
+)
+
+from .test_input_output_data import reference_values
+
+# Speaker levels as returned by get_speaker_levels, including channels pinned at the limits
+speaker_levels = {
+    "SL": 50.5,
+    "SR": 49.0,
+    "SBL": 38.5,
+    "SBR": 61.5,
+    "FHL": 52.0,
+    "FHR": 47.5,
+    "TFL": 38.0,
+    "TFR": 62.0,
+    "SW1": 45.0,
+}
+
+
+half_change_speakers = {"SL", "SR", "SBL", "SBR"}
+quarter_change_speakers = {"FHL", "FHR", "TFL", "TFR"}
+
+
+def sent_commands(adjustment_factor, reset):
+    sent = []
+
+    async def send_adjustments(adjustments):
+        sent.extend(adjustments)
+        return True
+
+    # Start from an unknown receiver state so every level is sent
+    state = AdjustmentState()
+    state.half_change_speakers = half_change_speakers
+    state.quarter_change_speakers = quarter_change_speakers
+
+    asyncio.run(
+        adjust_speaker_volumes(
+            state, speaker_levels, adjustment_factor, send_adjustments, reset
+        )
+    )
+    return tuple(sent)
+
+
+def compile_table(reference_volume):
+    return compile_adjustment_table(
+        speaker_levels, reference_volume, half_change_speakers, quarter_change_speakers
+    )
+
+
+@pytest.mark.parametrize("reference_volume", reference_values)
+def test_compiled_table_matches_scalar_path(reference_volume):
+    table = compile_table(reference_volume)
+
+    assert table.reference_volume == reference_volume
+    assert len(table.entries) == len(VOLUME_STEPS)
+    for absolute_volume, entry in zip(VOLUME_STEPS, table.entries):
+        assert table.entry(absolute_volume) is entry
+        adjustment_factor = calculate_adjustment(absolute_volume, reference_volume)
+        assert entry.adjustment_factor == adjustment_factor
+        assert entry.commands == sent_commands(adjustment_factor, False)
+        assert entry.commands == tuple(
+            adjustmentlogic.format_adjustment_command(*level) for level in entry.levels
+        )
+    assert table.reset_commands == sent_commands(0, True)
+
+
+def test_compiled_table_is_indexed_by_parsed_volume():
+    table = compile_table(65)
+
+    assert table.entry(adjustmentlogic.parse_volume("505")) is table.entries[101]
+    assert table.entry(adjustmentlogic.parse_volume("50")) is table.entries[100]
+    assert table.entry(50.25) is None
+    assert table.entry(99.0) is None
+
+
+@pytest.mark.parametrize("reference_level_offset", [0, 5, 10, 15])
+def test_reference_level_offset_matches_scalar_path(reference_level_offset):
+    table = compile_table(75)
+
+    for absolute_volume in VOLUME_STEPS:
+        entry = table.entry(absolute_volume, reference_level_offset)
+        assert entry.adjustment_factor == calculate_adjustment(
+            absolute_volume, 75, reference_level_offset
+        ), f"Failed for volume {absolute_volume}"
+    # An offset lowers the correction, like a volume that much closer to the reference
+    assert table.entry(50.0, 5) is table.entry(55.0)
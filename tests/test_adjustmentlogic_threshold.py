@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.adjustmentlogic import (
+    AdjustmentState,
+    compile_adjustment_table,
+    handle_threshold_crossing,
+    handle_volume_change_callback,
+)
+
+speaker_levels = {"SL": 50.0, "SR": 50.0}
+
+
+@pytest.fixture
+def state():
+    state = AdjustmentState()
+    state.adjustment_table = compile_adjustment_table(speaker_levels, 65, {"SL", "SR"})
+    return state
+
+
+async def send_adjustments(adjustments):
+    return True
+
+
+def ramp(state, volumes, hysteresis=0.5):
+    async def run():
+        await handle_volume_change_callback(state, volumes[0], None, send_adjustments)
+        return [
+            await handle_threshold_crossing(state, volume, hysteresis, send_adjustments)
+            for volume in volumes[1:]
+        ]
+
+    return asyncio.run(run())
+
+
+def test_ramp_corrects_once_past_the_boundary(state):
+    # The factor drops from 2.0 to 1.5 between 56 and 56.5 at reference 65
+    # Only once the volume is a full hysteresis step past the boundary
+    assert ramp(state, [55, 55.5, 56, 56.5, 57, 57.5, 58]) == [
+        False,
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+    assert state.latest_adjustment == 1.5
+    assert state.latest_adjustment_volume == 57
+
+
+def test_moving_back_and_forth_across_an_edge_does_not_flap(state):
+    assert ramp(state, [56, 56.5, 56, 56.5, 56, 56.5]) == [False] * 5
+    assert state.latest_adjustment == 2.0
+
+
+def test_no_threshold_correction_before_the_first_correction(state):
+    async def run():
+        return await handle_threshold_crossing(state, 70, 0.5, send_adjustments)
+
+    assert asyncio.run(run()) is False
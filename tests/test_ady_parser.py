@@ -0,0 +1,79 @@
+import json
+import pytest
+import sys
+import tracemalloc
+
+sys.path.append("./src")
+
+from src.ady_parser import parse_calibration, read_calibration_file
+
+# Shaped like an A1 EVO Nexus .ady file, with strings that look like JSON structure
+ady = {
+    "title": "MV75dB \"Living\" [room]",
+    "targetModelName": "AVR-X3800H",
+    "enMultEQType": 2,
+    "detectedChannels": [
+        {
+            "enChannelType": 0,
+            "commandId": "FL",
+            "customLevel": "-1.5",
+            "responseData": {"0": [0.1, -0.2, 1e-05], "1": [3, 4]},
+            "customFilter": {"coefficient48kHz": [[1.0, 2.0], [3.0]], "note": "}]\\"},
+        },
+        {"commandId": "SLA", "customLevel": 2.5, "midrangeCompensation": False},
+        {"commandId": "SWMIX1", "customLevel": "0", "customCrossover": None},
+    ],
+    "trailing": {"detectedChannels": "not the channels"},
+}
+
+expected = {
+    "title": ady["title"],
+    "detectedChannels": [
+        {"commandId": "FL", "customLevel": "-1.5"},
+        {"commandId": "SLA", "customLevel": 2.5},
+        {"commandId": "SWMIX1", "customLevel": "0"},
+    ],
+}
+
+
+@pytest.mark.parametrize("indent", [None, 2, "\t"])
+def test_only_title_and_channel_levels_are_extracted(indent):
+    buffer = json.dumps(ady, indent=indent).encode("utf-8")
+
+    assert parse_calibration(buffer) == expected
+
+
+def test_byte_order_mark_is_skipped(tmp_path):
+    path = tmp_path / "windows.ady"
+    path.write_bytes(b"\xef\xbb\xbf" + json.dumps(ady).encode("utf-8"))
+
+    assert read_calibration_file(str(path)) == expected
+
+
+@pytest.mark.parametrize("text", ['{"title": "MV75dB"', '{"title": [1, 2}', ""])
+def test_malformed_files_raise(tmp_path, text):
+    path = tmp_path / "broken.ady"
+    path.write_text(text, encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        read_calibration_file(str(path))
+
+
+def test_memory_does_not_grow_with_the_skipped_arrays(tmp_path):
+    large = dict(ady)
+    large["detectedChannels"] = [
+        dict(channel, responseData={str(i): [0.123456] * 2000 for i in range(50)})
+        for channel in ady["detectedChannels"]
+    ]
+    path = tmp_path / "large.ady"
+    path.write_text(json.dumps(large), encoding="utf-8")
+
+    tracemalloc.start()
+    try:
+        assert read_calibration_file(str(path)) == expected
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert path.stat().st_size > 2_000_000
+    assert peak < 100_000
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.adjustmentlogic import parse_adjustment_command
+from src.applied_levels import AppliedLevelsRecord, applied_levels_path
+from tests.conftest import FakeReceiver, run_controller, turn_volume, write_ady
+
+
+@pytest.fixture(autouse=True)
+def environment(controller_environment, monkeypatch):
+    monkeypatch.delenv("APPLIED_LEVELS_RECORD")
+
+
+def write_room(directory):
+    return write_ady(directory, channels=("SLA", "SRA"))
+
+
+def test_parse_adjustment_command():
+    assert parse_adjustment_command("SSLEVSL 455") == ("SL", 45.5)
+    assert parse_adjustment_command("SSLEVFHL 50") == ("FHL", 50.0)
+    assert parse_adjustment_command("SSLEV END") is None
+    assert parse_adjustment_command("SSLEV ?") is None
+    assert parse_adjustment_command("MV50") is None
+
+
+def test_record_round_trip(tmp_path):
+    path = str(tmp_path / "applied.json")
+
+    async def run():
+        record = AppliedLevelsRecord(path)
+        await record.update(["SSLEVSL 455", "SSLEVSR 455"])
+        await record.update(["SSLEVSL 50", "MV50"])
+
+    asyncio.run(run())
+
+    assert AppliedLevelsRecord(path).load() == {"SL": 50.0, "SR": 45.5}
+    assert os.listdir(tmp_path) == ["applied.json"]
+
+
+def test_unreadable_record_is_ignored(tmp_path):
+    path = tmp_path / "applied.json"
+    path.write_text('{"levels": ', encoding="utf-8")
+
+    assert AppliedLevelsRecord(str(path)).load() == {}
+    assert AppliedLevelsRecord(str(tmp_path / "missing.json")).load() == {}
+
+
+def test_failed_write_keeps_running(tmp_path):
+    async def run():
+        record = AppliedLevelsRecord(str(tmp_path / "missing" / "applied.json"))
+        await record.update(["SSLEVSL 455"])
+        return record
+
+    record = asyncio.run(run())
+
+    assert record.failed
+    assert record.levels == {"SL": 45.5}
+
+
+def test_levels_are_recorded_after_each_batch(tmp_path):
+    config_path = write_room(tmp_path)
+
+    run_controller(FakeReceiver(), config_path, turn_volume("50"))
+
+    with open(applied_levels_path(config_path, "living"), encoding="utf-8") as file:
+        assert json.load(file)["levels"] == {"SL": 45.5, "SR": 45.5}
+
+
+def test_receivers_sharing_a_folder_keep_their_own_record(tmp_path):
+    config_path = write_room(tmp_path)
+    run_controller(FakeReceiver(), config_path, turn_volume("50"))
+
+    # Nothing was applied to the other receiver, so everything is sent to it
+    receiver = FakeReceiver()
+    run_controller(receiver, config_path, turn_volume("50"), name="cinema")
+
+    assert receiver.commands == ["SSLEVSL 455", "SSLEVSR 455"]
+    assert applied_levels_path(config_path, "192.168.1.2/cinema").endswith(".applied-levels.192.168.1.2_cinema.json")
+
+
+def test_restart_after_crash_sends_only_what_differs(tmp_path):
+    config_path = write_room(tmp_path)
+    run_controller(FakeReceiver(), config_path, turn_volume("50"))
+
+    # The receiver still has the corrected levels, 50.5dB needs the same correction
+    receiver = FakeReceiver()
+    controller = run_controller(receiver, config_path, turn_volume("505"))
+
+    assert receiver.commands == []
+    assert controller.state.latest_adjustment == 4.5
+
+
+def test_receiver_levels_win_over_the_record(tmp_path, monkeypatch):
+    config_path = write_room(tmp_path)
+    run_controller(FakeReceiver(), config_path, turn_volume("50"))
+
+    # SR was reset on the receiver itself after the crash
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    receiver = FakeReceiver("50", {"SL": "455", "SR": "50"})
+    run_controller(receiver, config_path)
+
+    assert receiver.commands == ["PSDYNEQ ?", "PSREFLEV ?", "SSLEV ?", "MV?", "SSLEVSR 455"]
+
+
+def test_record_can_be_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("APPLIED_LEVELS_RECORD", "false")
+    config_path = write_room(tmp_path)
+
+    run_controller(FakeReceiver(), config_path, turn_volume("50"))
+
+    assert not os.path.exists(applied_levels_path(config_path, "living"))
@@ -0,0 +1,40 @@
+import asyncio
+import sys
+
+sys.path.append("./src")
+
+from benchmarks.hot_path import compare_results, run_benchmarks
+
+
+def test_benchmarks_produce_every_metric():
+    results = asyncio.run(run_benchmarks(samples=4, events=50, calls=10))
+
+    latency = results["results"]["event_to_last_command"]
+    assert latency["commands_per_event"] > 0
+    assert 0 < latency["median_ms"] <= latency["max_ms"]
+    assert results["results"]["throughput"]["events_per_second"] > 0
+    assert results["results"]["adjust_speaker_volumes"]["peak_bytes"] > 0
+
+
+def test_regressions_beyond_tolerance_are_reported():
+    baseline = {
+        "results": {
+            "event_to_last_command": {"median_ms": 1.0, "p95_ms": 2.0},
+            "throughput": {"events_per_second": 1000.0, "cpu_us_per_event": 10.0},
+            "adjust_speaker_volumes": {"mean_us": 20.0, "peak_bytes": 4000},
+        }
+    }
+    results = {
+        "results": {
+            "event_to_last_command": {"median_ms": 1.5, "p95_ms": 2.1},
+            "throughput": {"events_per_second": 500.0, "cpu_us_per_event": 10.0},
+            "adjust_speaker_volumes": {"mean_us": 10.0, "peak_bytes": 4000},
+        }
+    }
+
+    regressions = compare_results(results, baseline, 0.25)
+
+    assert [regression.split(":")[0] for regression in regressions] == [
+        "event_to_last_command.median_ms",
+        "throughput.events_per_second",
+    ]
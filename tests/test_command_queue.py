@@ -0,0 +1,164 @@
+import asyncio
+import sys
+
+sys.path.append("./src")
+
+import pytest
+
+from src.command_queue import BatchSuperseded, CommandQueue, command_key
+
+
+class FakeReceiver:
+    """Echoes every command back, except the ones listed in silent, after confirmation_delay like denonavr."""
+
+    def __init__(self, silent=(), confirmation_delay=0):
+        self.written = []
+        self.silent = set(silent)
+        self.confirmation_delay = confirmation_delay
+        self.queue = None
+
+    async def send_command(self, command):
+        self.written.append(command)
+        if command not in self.silent:
+            await self.queue.on_echo(command)
+        elif self.confirmation_delay:
+            await asyncio.sleep(self.confirmation_delay)
+
+
+def run_queue(scenario, receiver=None, **kwargs):
+    receiver = receiver or FakeReceiver()
+
+    async def run():
+        queue = CommandQueue(receiver.send_command, interval=0, **kwargs)
+        receiver.queue = queue
+        worker = queue.start()
+        try:
+            return await scenario(queue)
+        finally:
+            worker.cancel()
+
+    return receiver, asyncio.run(run())
+
+
+def test_command_key():
+    assert command_key("SSLEVSL 485") == "SSLEVSL"
+    assert command_key("MV?") == "MV?"
+
+
+def test_batch_is_acknowledged():
+    async def scenario(queue):
+        return await queue.submit(["SSLEVSL 485", "SSLEVSR 49"])
+
+    receiver, succeeded = run_queue(scenario)
+
+    assert succeeded is True
+    assert receiver.written == ["SSLEVSL 485", "SSLEVSR 49"]
+
+
+def test_queued_commands_are_superseded_per_channel():
+    async def scenario(queue):
+        first = asyncio.ensure_future(queue.submit(["SSLEVSL 485", "SSLEVSR 49"]))
+        second = asyncio.ensure_future(queue.submit(["SSLEVSL 48"]))
+        return await asyncio.gather(first, second, return_exceptions=True), queue.stats
+
+    receiver, ((first, second), stats) = run_queue(scenario)
+
+    assert isinstance(first, BatchSuperseded)
+    assert second is True
+    assert receiver.written == ["SSLEVSL 48", "SSLEVSR 49"]
+    assert stats["superseded"] == 1
+
+
+def test_missing_echo_is_retried_then_fails():
+    async def scenario(queue):
+        return await queue.submit(["SSLEVSL 485"]), queue.stats
+
+    receiver, (succeeded, stats) = run_queue(
+        scenario, FakeReceiver(silent={"SSLEVSL 485"}), ack_timeout=0.01, retries=2
+    )
+
+    assert succeeded is False
+    assert receiver.written == ["SSLEVSL 485"] * 3
+    assert stats["retried"] == 2
+    assert stats["failed"] == 1
+
+
+def test_drop_pending_resolves_stale_batches():
+    async def scenario(queue):
+        stale = asyncio.ensure_future(queue.submit(["SSLEVSL 485"]))
+        await asyncio.sleep(0)
+        queue.drop_pending()
+        with pytest.raises(BatchSuperseded):
+            await stale
+        return queue.stats
+
+    receiver, stats = run_queue(scenario)
+
+    assert receiver.written == []
+    assert stats["superseded"] == 1
+    assert stats["failed"] == 0
+
+
+def test_confirmation_wait_counts_towards_the_ack_timeout():
+    async def scenario(queue):
+        started_at = asyncio.get_running_loop().time()
+        succeeded = await queue.submit(["SSLEVSL 485"])
+        return succeeded, asyncio.get_running_loop().time() - started_at
+
+    receiver, (succeeded, elapsed) = run_queue(
+        scenario,
+        FakeReceiver(silent={"SSLEVSL 485"}, confirmation_delay=0.05),
+        ack_timeout=0.05,
+        retries=1,
+    )
+
+    assert succeeded is False
+    assert receiver.written == ["SSLEVSL 485"] * 2
+    # Two confirmation waits, without another ack timeout on top of each
+    assert elapsed < 0.15
+
+
+def test_batch_gives_up_after_the_batch_timeout():
+    async def scenario(queue):
+        return await queue.submit(["SSLEVSL 485", "SSLEVSR 49"]), queue.stats
+
+    receiver, (succeeded, stats) = run_queue(
+        scenario, FakeReceiver(silent={"SSLEVSL 485"}), ack_timeout=0.02, retries=10, batch_timeout=0.05
+    )
+
+    assert succeeded is False
+    assert 1 < len(receiver.written) < 5
+    assert "SSLEVSR 49" not in receiver.written
+    assert stats["failed"] == 2
+
+
+def test_nothing_is_retried_when_shutting_down():
+    async def scenario(queue):
+        queue.shutting_down = True
+        return await queue.submit(["SSLEVSL 485"]), queue.stats
+
+    receiver, (succeeded, stats) = run_queue(
+        scenario, FakeReceiver(silent={"SSLEVSL 485"}), ack_timeout=0.01, retries=2
+    )
+
+    assert succeeded is False
+    assert receiver.written == ["SSLEVSL 485"]
+    assert stats["retried"] == 0
+
+
+def test_forwarded_commands_are_sent_once_in_order():
+    async def scenario(queue):
+        forwarded = [asyncio.ensure_future(queue.forward(command)) for command in ("MVUP", "MVUP", "MV?")]
+        correction = asyncio.ensure_future(queue.submit(["SSLEVSL 485"]))
+        await asyncio.sleep(0)
+        # Forwarded commands aren't made stale by a newer volume
+        queue.drop_pending()
+        return await asyncio.gather(*forwarded, correction, return_exceptions=True), queue.stats
+
+    receiver, (results, stats) = run_queue(scenario, FakeReceiver(silent={"MV?"}), ack_timeout=0.01)
+
+    assert results[:3] == [True, True, True]
+    assert isinstance(results[3], BatchSuperseded)
+    assert receiver.written == ["MVUP", "MVUP", "MV?"]
+    assert stats["forwarded"] == 3
+    assert stats["retried"] == 0
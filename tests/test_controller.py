@@ -0,0 +1,207 @@
+import asyncio
+import json
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.controller import ReceiverController, load_receiver_configs
+from tests.conftest import FakeReceiver, run_controller, write_ady
+
+
+@pytest.fixture(autouse=True)
+def environment(controller_environment, monkeypatch):
+    monkeypatch.setenv("RECEIVER_IP", "192.168.1.10")
+
+
+def test_single_receiver_from_environment(monkeypatch):
+    monkeypatch.setenv("CONFIG_PATH", "/app/config")
+
+    assert load_receiver_configs() == [
+        {"name": "192.168.1.10", "ip": "192.168.1.10", "config_path": "/app/config"}
+    ]
+
+
+def test_missing_receiver_ip(monkeypatch):
+    monkeypatch.delenv("RECEIVER_IP")
+
+    with pytest.raises(ValueError):
+        load_receiver_configs()
+
+
+def test_receivers_from_config_file(monkeypatch, tmp_path):
+    receivers = [
+        {"name": "living", "ip": "192.168.1.10", "config_path": "/config/living"},
+        {"name": "cinema", "ip": "192.168.1.11", "config_path": "/config/cinema"},
+    ]
+    config_file = tmp_path / "receivers.json"
+    config_file.write_text(json.dumps({"receivers": receivers}), encoding="utf-8")
+    monkeypatch.setenv("RECEIVERS_CONFIG", str(config_file))
+
+    assert load_receiver_configs() == receivers
+
+
+def test_receivers_are_corrected_independently(tmp_path):
+    living = FakeReceiver()
+    cinema = FakeReceiver()
+
+    async def run():
+        tasks = set()
+        controllers = [
+            ReceiverController(
+                "living", living, write_ady(tmp_path / "living", 65, 0), tasks
+            ),
+            ReceiverController(
+                "cinema",
+                cinema,
+                write_ady(tmp_path / "cinema", 75, 1),
+                tasks,
+                speaker_config={"half": ["SL"], "quarter": []},
+            ),
+        ]
+        for controller in controllers:
+            await controller.start()
+
+        await living.callbacks["MV"][0]("Main", "MV", "50")
+        await cinema.callbacks["MV"][0]("Main", "MV", "70")
+        await asyncio.sleep(0.1)
+
+        for task in tasks:
+            task.cancel()
+        return controllers
+
+    living_controller, cinema_controller = asyncio.run(run())
+
+    # 5.5dB - 1dB at 50dB vs 65dB reference, 7.5dB - 6.5dB at 70dB vs 75dB reference
+    assert living.commands == ["SSLEVSL 455"]
+    assert cinema.commands == ["SSLEVSL 50"]
+    assert living_controller.state.latest_adjustment == 4.5
+    assert cinema_controller.state.latest_adjustment == 1.0
+
+
+def test_startup_sync_applies_the_current_volume(tmp_path, monkeypatch):
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    receiver = FakeReceiver("50", {"SL": "50", "SR": "50"})
+    config_path = write_ady(tmp_path / "living", 65, 0)
+
+    controller = run_controller(receiver, config_path)
+
+    # Applied right away instead of waiting for the debounce
+    assert receiver.commands == ["PSDYNEQ ?", "PSREFLEV ?", "SSLEV ?", "MV?", "SSLEVSL 455"]
+    assert controller.state.latest_adjustment == 4.5
+    assert controller.state.applied_levels["SL"] == 45.5
+
+
+def test_startup_sync_skips_levels_already_applied(tmp_path, monkeypatch):
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    # Left corrected by an earlier run that didn't shut down cleanly
+    receiver = FakeReceiver("50", {"SL": "455"})
+
+    controller = run_controller(receiver, write_ady(tmp_path / "living", 65, 0))
+
+    assert receiver.commands == ["PSDYNEQ ?", "PSREFLEV ?", "SSLEV ?", "MV?"]
+    assert controller.state.latest_adjustment == 4.5
+
+
+def test_startup_sync_without_answer(tmp_path, monkeypatch):
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    monkeypatch.setenv("STARTUP_SYNC_TIMEOUT", "0.01")
+    receiver = FakeReceiver()
+    receiver.answering = False
+
+    controller = run_controller(receiver, write_ady(tmp_path / "living", 65, 0))
+
+    assert controller.state.latest_adjustment is None
+    assert controller.sync_volume is None
+
+
+def test_reload_waits_for_the_correction_in_flight(tmp_path):
+    receiver = FakeReceiver()
+    config_path = write_ady(tmp_path / "living", 65, 0)
+
+    async def run():
+        tasks = set()
+        controller = ReceiverController("living", receiver, config_path, tasks)
+        await controller.start()
+        controller.latest_volume = 50.0
+        reloaded = controller.calibration_profile._replace(reference_volume=75)
+
+        async with controller.debouncer.lock:
+            controller.reload_calibration_profile(reloaded)
+            await asyncio.sleep(0.01)
+            sent_during_correction = list(receiver.commands)
+        await asyncio.sleep(0.05)
+        for task in list(tasks):
+            task.cancel()
+        return sent_during_correction
+
+    sent_during_correction = asyncio.run(run())
+
+    assert sent_during_correction == []
+    # 50dB against the reloaded 75dB reference
+    assert receiver.commands == ["SSLEVSL 435"]
+
+
+def test_shutdown_stops_every_task(tmp_path, monkeypatch):
+    monkeypatch.setenv("CALIBRATION_POLL_INTERVAL", "0.01")
+    monkeypatch.setenv("CONNECTION_POLL_INTERVAL", "0.01")
+    receiver = FakeReceiver()
+
+    async def run():
+        tasks = set()
+        controller = ReceiverController("living", receiver, write_ady(tmp_path / "living", 65, 0), tasks)
+        await controller.start()
+        await receiver.emit("MV", "50")
+        await asyncio.sleep(0.05)
+        running = set(tasks)
+
+        await controller.shutdown()
+        return running, tasks
+
+    running, tasks = asyncio.run(run())
+
+    # The command writer, the calibration watcher and the connection supervisor
+    assert len(running) == 3
+    assert all(task.done() for task in running)
+    assert tasks == set()
+    # The correction was reset before the telnet connection was closed
+    assert receiver.commands == ["SSLEVSL 455", "SSLEVSL 50"]
+    assert receiver.disconnects == 1
+
+
+def test_threshold_correction_skipped_during_a_correction(tmp_path, monkeypatch):
+    monkeypatch.setenv("THRESHOLD_CORRECTIONS", "true")
+    monkeypatch.setenv("DEBOUNCE_DELAY", "0.05")
+    receiver = FakeReceiver()
+
+    async def run():
+        tasks = set()
+        controller = ReceiverController("living", receiver, write_ady(tmp_path / "living", 65, 0), tasks)
+        await controller.start()
+        await receiver.emit("MV", "50")
+        await asyncio.sleep(0.1)
+
+        # Crossing a boundary while a correction is in flight neither waits nor replays it later
+        async with controller.debouncer.lock:
+            await asyncio.wait_for(receiver.emit("MV", "60"), 0.01)
+            sent_during_correction = list(receiver.commands)
+        await asyncio.sleep(0.01)
+        sent_before_debounce = list(receiver.commands)
+
+        # Without a correction in flight the boundary is corrected right away
+        await receiver.emit("MV", "40")
+        sent_on_crossing = list(receiver.commands)
+        await asyncio.sleep(0.1)
+
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return sent_during_correction, sent_before_debounce, sent_on_crossing
+
+    sent_during_correction, sent_before_debounce, sent_on_crossing = asyncio.run(run())
+
+    assert sent_during_correction == ["SSLEVSL 455"]
+    assert sent_before_debounce == ["SSLEVSL 455"]
+    assert sent_on_crossing == ["SSLEVSL 455", "SSLEVSL 445"]
+    # The debounced correction for 40dB found nothing left to send
+    assert receiver.commands == sent_on_crossing
@@ -0,0 +1,71 @@
+import json
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.adjustmentlogic import (
+    VOLUME_STEPS,
+    calculate_adjustment,
+    compile_adjustment_table,
+    curve_adjustment,
+)
+from src.curve import (
+    DEFAULT_CURVE,
+    PiecewiseCurve,
+    load_correction_curve,
+    parse_correction_curve,
+)
+
+
+@pytest.mark.parametrize("reference_volume", range(30, 91))
+def test_default_curve_matches_calculate_adjustment(reference_volume):
+    for absolute_volume in VOLUME_STEPS:
+        assert curve_adjustment(
+            DEFAULT_CURVE, absolute_volume, reference_volume
+        ) == calculate_adjustment(absolute_volume, reference_volume)
+
+
+def test_piecewise_curve_interpolates_and_extends():
+    curve = PiecewiseCurve(knots=((10, 0), (20, 5)), slope_below=1, slope_above=0.5)
+
+    assert curve.value(5) == -5
+    assert curve.value(15) == 2.5
+    assert curve.value(30) == 10
+
+
+def test_partial_config_keeps_the_defaults():
+    curve = parse_correction_curve({"group_scales": {"quarter": 1.0}})
+
+    assert curve.boost == DEFAULT_CURVE.boost
+    assert curve.reference == DEFAULT_CURVE.reference
+    assert curve.half_scale == 1.0
+    assert curve.quarter_scale == 1.0
+
+
+def test_knots_must_increase():
+    with pytest.raises(ValueError):
+        parse_correction_curve({"boost": {"knots": [[50, 1], [49, 0]]}})
+
+
+def test_curve_from_environment_file(monkeypatch, tmp_path):
+    path = tmp_path / "curve.json"
+    path.write_text(json.dumps({"boost": {"knots": [[40, 0], [60, 4]]}}), encoding="utf-8")
+    monkeypatch.setenv("CORRECTION_CURVE", str(path))
+
+    assert load_correction_curve().boost.knots == ((40.0, 0.0), (60.0, 4.0))
+
+
+def test_invalid_curve_falls_back_to_default(monkeypatch):
+    monkeypatch.setenv("CORRECTION_CURVE", '{"boost": {"knots": []}}')
+
+    assert load_correction_curve() == DEFAULT_CURVE
+
+
+def test_group_scales_shape_the_compiled_table():
+    curve = parse_correction_curve({"group_scales": {"half": 0.5, "quarter": 1.0}})
+
+    table = compile_adjustment_table({"SL": 50, "FHL": 50}, 65, {"SL"}, {"FHL"}, curve)
+
+    # 5.5dB correction at MV40 against a 65dB reference
+    assert table.entry(40.0).levels == (("SL", 47.5), ("FHL", 44.5))
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.debounce import DebouncePolicy, Debouncer
+
+
+def test_trailing_window_restarts_on_every_event():
+    policy = DebouncePolicy(delay=2.0)
+
+    assert policy.on_event(0.0) == (False, 2.0, "trailing")
+    assert policy.on_event(1.5) == (False, 3.5, "trailing")
+    assert policy.on_deadline(3.5, "trailing") is True
+    assert policy.decisions["trailing"] == 1
+
+
+def test_max_wait_caps_a_slowly_turned_knob():
+    policy = DebouncePolicy(delay=2.0, max_wait=5.0)
+
+    for now in (0.0, 1.5, 3.0, 4.5):
+        fire_now, fire_at, reason = policy.on_event(now)
+
+    assert (fire_now, fire_at, reason) == (False, 5.0, "max_wait")
+    assert policy.on_deadline(5.0, "max_wait") is True
+    # The burst continues and the next cap is counted from the correction
+    assert policy.deadline() == (6.5, "trailing")
+    assert policy.on_event(6.0) == (False, 8.0, "trailing")
+
+
+def test_leading_edge_fires_once_per_burst():
+    policy = DebouncePolicy(delay=2.0, leading=True)
+
+    assert policy.on_event(0.0)[0] is True
+    assert policy.on_event(0.5)[0] is False
+    assert policy.on_deadline(2.5, "trailing") is True
+    # A single event only fires on the leading edge
+    assert policy.on_event(10.0)[0] is True
+    assert policy.on_deadline(12.0, "trailing") is False
+
+
+def test_adaptive_window_follows_event_rate():
+    policy = DebouncePolicy(delay=2.0, adaptive=True, min_delay=0.3)
+
+    assert policy.window() == 2.0
+    for step in range(10):
+        policy.on_event(step * 0.2)
+    assert policy.window() == pytest.approx(0.6)
+
+    # A long pause between bursts does not count as knob speed
+    policy.on_deadline(5.0, "trailing")
+    policy.on_event(30.0)
+    assert policy.window() == pytest.approx(0.6)
+
+
+def test_debouncer_sends_latest_value_once():
+    sent = []
+
+    async def callback(value):
+        sent.append(value)
+
+    async def run():
+        debouncer = Debouncer(DebouncePolicy(delay=0.05), callback)
+        for volume in (50.0, 50.5, 51.0):
+            debouncer.trigger(volume)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+
+    assert sent == [51.0]
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.controller import ReceiverController
+from src.discovery import (
+    StartupTimer,
+    apply_receiver_metadata,
+    discovery_cache_path,
+    read_receiver_metadata,
+    write_receiver_metadata,
+)
+from tests.conftest import FakeReceiver, run_controller, write_ady
+
+
+class DiscoveredReceiver(FakeReceiver):
+    """FakeReceiver at a host, counting its HTTP discoveries."""
+
+    def __init__(self, host="192.168.1.10"):
+        super().__init__()
+        self.host = host
+        self.name = "Living room"
+        self.manufacturer = "Denon"
+        self.model_name = "AVR-X3800H"
+        self.serial_number = "0123456789"
+        self.receiver_type = "avr-x-2016"
+        self.setups = 0
+        self.updates = 0
+
+    async def async_setup(self):
+        self.setups += 1
+
+    async def async_update(self):
+        self.updates += 1
+
+
+pytestmark = pytest.mark.usefixtures("controller_environment")
+
+
+def test_metadata_round_trip(tmp_path):
+    cache_path = str(tmp_path / "receiver.json")
+    written = write_receiver_metadata(cache_path, "192.168.1.10", DiscoveredReceiver())
+
+    metadata = read_receiver_metadata(cache_path, "192.168.1.10", 60)
+
+    assert metadata == written
+    assert metadata["model_name"] == "AVR-X3800H"
+    assert metadata["receiver_type"] == "avr-x-2016"
+
+
+def test_metadata_expires(tmp_path):
+    cache_path = str(tmp_path / "receiver.json")
+    written = write_receiver_metadata(cache_path, "192.168.1.10", DiscoveredReceiver())
+
+    assert read_receiver_metadata(cache_path, "192.168.1.10", 60, written["discovered_at"] + 59)
+    assert read_receiver_metadata(cache_path, "192.168.1.10", 60, written["discovered_at"] + 61) is None
+    assert read_receiver_metadata(cache_path, "192.168.1.10", 0) is None
+
+
+def test_metadata_of_another_host_is_ignored(tmp_path):
+    cache_path = str(tmp_path / "receiver.json")
+    write_receiver_metadata(cache_path, "192.168.1.10", DiscoveredReceiver())
+
+    assert read_receiver_metadata(cache_path, "192.168.1.11", 60) is None
+
+
+def test_missing_or_broken_cache(tmp_path):
+    cache_path = tmp_path / "receiver.json"
+    assert read_receiver_metadata(str(cache_path), "192.168.1.10", 60) is None
+
+    cache_path.write_text("{", encoding="utf-8")
+    assert read_receiver_metadata(str(cache_path), "192.168.1.10", 60) is None
+
+
+def test_discovery_is_cached_between_starts(tmp_path):
+    config_path = write_ady(tmp_path)
+
+    first = DiscoveredReceiver()
+    run_controller(first, config_path)
+    second = DiscoveredReceiver()
+    run_controller(second, config_path)
+
+    assert (first.setups, first.updates) == (1, 1)
+    assert (second.setups, second.updates) == (0, 0)
+    assert "MV" in second.callbacks
+    assert (tmp_path / ".receiver.cache.json").exists()
+
+
+def test_cached_discovery_is_given_to_the_receiver(tmp_path):
+    denonavr = pytest.importorskip("denonavr")
+    cache_path = str(tmp_path / "receiver.json")
+    write_receiver_metadata(cache_path, "192.168.1.10", DiscoveredReceiver())
+    metadata = read_receiver_metadata(cache_path, "192.168.1.10", 60)
+
+    async def run():
+        receiver = denonavr.DenonAVR("192.168.1.10")
+        apply_receiver_metadata(receiver, metadata)
+        return receiver
+
+    receiver = asyncio.run(run())
+
+    assert receiver.name == "Living room"
+    assert (receiver.manufacturer, receiver.model_name) == ("Denon", "AVR-X3800H")
+    assert receiver.serial_number == "0123456789"
+    assert receiver.receiver_type == "avr-x-2016"
+    assert receiver.receiver_port == 8080
+
+
+def test_discovery_runs_again_when_disabled(tmp_path, monkeypatch):
+    config_path = write_ady(tmp_path)
+    monkeypatch.setenv("DISCOVERY_CACHE_TTL", "0")
+
+    run_controller(DiscoveredReceiver(), config_path)
+    receiver = DiscoveredReceiver()
+    run_controller(receiver, config_path)
+
+    assert receiver.setups == 1
+
+
+def test_telnet_only_skips_discovery(tmp_path, monkeypatch):
+    config_path = write_ady(tmp_path)
+    monkeypatch.setenv("TELNET_ONLY", "true")
+
+    receiver = DiscoveredReceiver()
+    controller = run_controller(receiver, config_path)
+
+    assert (receiver.setups, receiver.updates) == (0, 0)
+    assert not (tmp_path / ".receiver.cache.json").exists()
+    assert set(controller.startup_timer.phases) == {"calibration", "table", "telnet"}
+
+
+def test_startup_sync_is_timed(tmp_path, monkeypatch):
+    monkeypatch.setenv("TELNET_ONLY", "true")
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    monkeypatch.setenv("STARTUP_SYNC_TIMEOUT", "0.01")
+
+    controller = run_controller(DiscoveredReceiver(), write_ady(tmp_path))
+
+    assert "sync" in controller.startup_timer.phases
+
+
+def test_receiver_made_after_calibration(tmp_path):
+    config_path = write_ady(tmp_path)
+    receiver = DiscoveredReceiver()
+
+    async def create_receiver():
+        return receiver
+
+    async def run():
+        tasks = set()
+        controller = ReceiverController(
+            "living", None, config_path, tasks, create_receiver=create_receiver
+        )
+        await controller.start()
+        return controller
+
+    controller = asyncio.run(run())
+
+    assert controller.receiver is receiver
+    assert list(controller.startup_timer.phases)[:3] == ["calibration", "table", "receiver"]
+
+
+def test_startup_timer_phases():
+    now = [0.0]
+    timer = StartupTimer(lambda: now[0])
+
+    now[0] = 0.25
+    timer.phase("calibration")
+    now[0] = 1.0
+    timer.phase("telnet")
+
+    assert timer.phases == {"calibration": 0.25, "telnet": 0.75}
+    assert timer.summary() == "1.000s (calibration 0.250s, telnet 0.750s)"
+
+
+def test_cache_lives_in_the_config_folder():
+    assert discovery_cache_path("config") == os.path.join("config", ".receiver.cache.json")
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from tests.conftest import FakeReceiver, run_controller, write_ady
+
+
+@pytest.fixture(autouse=True)
+def environment(controller_environment, monkeypatch):
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    monkeypatch.setenv("STARTUP_SYNC_TIMEOUT", "0.1")
+
+
+def corrections(receiver):
+    return [command for command in receiver.commands if command.startswith("SSLEVSL")]
+
+
+def test_corrections_follow_dynamic_eq(tmp_path):
+    receiver = FakeReceiver()
+
+    async def scenario(controller):
+        assert corrections(receiver) == ["SSLEVSL 455"]
+
+        # The calibrated level is put back once and volume changes are ignored
+        await receiver.change("DYNEQ", "OFF")
+        await asyncio.sleep(0.01)
+        await receiver.emit("MV", "40")
+        await receiver.emit("MV", "45")
+        await receiver.change("DYNEQ", "OFF")
+        await asyncio.sleep(0.05)
+        assert corrections(receiver) == ["SSLEVSL 455", "SSLEVSL 50"]
+        assert controller.state_snapshot()["dynamic_eq"] is False
+
+        # The correction for the latest volume comes back with Dynamic EQ
+        await receiver.change("DYNEQ", "ON")
+
+    run_controller(receiver, write_ady(tmp_path), scenario)
+
+    # The full 5.5dB correction of a 65dB reference at 45dB
+    assert corrections(receiver) == ["SSLEVSL 455", "SSLEVSL 50", "SSLEVSL 445"]
+
+
+def test_dynamic_eq_off_at_startup_restores_levels(tmp_path):
+    receiver = FakeReceiver(dynamic_eq="OFF")
+
+    async def scenario(controller):
+        await receiver.emit("MV", "45")
+
+    controller = run_controller(receiver, write_ady(tmp_path), scenario)
+
+    assert corrections(receiver) == ["SSLEVSL 50"]
+    assert controller.state.latest_adjustment is None
+
+
+def test_reference_level_offset_lowers_the_correction(tmp_path):
+    receiver = FakeReceiver(reference_level_offset="5")
+
+    async def scenario(controller):
+        assert controller.state.reference_level_offset == 5
+        await receiver.change("REFLEV", "0")
+
+    run_controller(receiver, write_ady(tmp_path), scenario)
+
+    # At 50dB with a 5dB offset the correction is the one for 55dB: 2dB, then 4.5dB without offset
+    assert corrections(receiver) == ["SSLEVSL 48", "SSLEVSL 455"]
@@ -0,0 +1,68 @@
+import asyncio
+import sys
+
+sys.path.append("./src")
+
+from src.fake_avr import FakeAVR, knob_sweep
+
+
+async def read_lines(reader, count):
+    return [
+        (await asyncio.wait_for(reader.readuntil(b"\r"), 1))[:-1].decode()
+        for _ in range(count)
+    ]
+
+
+def run_with_client(scenario, **kwargs):
+    async def run():
+        avr = FakeAVR(**kwargs)
+        await avr.start(port=0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", avr.port)
+        try:
+            return avr, await scenario(avr, reader, writer)
+        finally:
+            writer.close()
+            await avr.close()
+
+    return asyncio.run(run())
+
+
+def test_volume_query_and_level_echo():
+    async def scenario(avr, reader, writer):
+        writer.write(b"MV?\rSSLEVSL 485\r")
+        return await read_lines(reader, 3)
+
+    avr, lines = run_with_client(scenario, volume=50.5)
+
+    assert lines == ["MV505", "MVMAX 980", "SSLEVSL 485"]
+    assert avr.channel_levels["SL"] == 48.5
+
+
+def test_knob_events_reach_every_client():
+    async def scenario(avr, reader, writer):
+        await knob_sweep(avr, 5.0, 6.0, interval=0)
+        return await read_lines(reader, 3)
+
+    _, lines = run_with_client(scenario)
+
+    assert lines == ["MV05", "MV055", "MV06"]
+
+
+def test_level_query_lists_every_channel():
+    async def scenario(avr, reader, writer):
+        writer.write(b"SSLEV ?\r")
+        return await read_lines(reader, 3)
+
+    _, lines = run_with_client(scenario, channel_levels={"SL": 50.0, "SR": 62.0})
+
+    assert lines == ["SSLEVSL 50", "SSLEVSR 62", "SSLEV END"]
+
+
+def test_dynamic_eq_settings_can_be_changed():
+    async def scenario(avr, reader, writer):
+        writer.write(b"PSDYNEQ ?\rPSDYNEQ OFF\rPSREFLEV 10\rPSREFLEV ?\r")
+        return await read_lines(reader, 4)
+
+    avr, lines = run_with_client(scenario)
+
+    assert lines == ["PSDYNEQ ON", "PSDYNEQ OFF", "PSREFLEV 10", "PSREFLEV 10"]
@@ -0,0 +1,125 @@
+import csv
+import json
+import os
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.fleet import check_fleet, find_rooms, load_room_options
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    for name in ("REFERENCE_VOLUME", "SPEAKER_CONFIG", "CORRECTION_CURVE"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def write_ady(directory, name="room.ady", title="MV65dB", levels=None):
+    directory.mkdir(parents=True, exist_ok=True)
+    levels = levels or {"FL": "0", "SLA": "0", "SRA": "1.5", "FHL": "-2"}
+    ady = {
+        "title": title,
+        "detectedChannels": [
+            {"commandId": command_id, "customLevel": level} for command_id, level in levels.items()
+        ],
+    }
+    (directory / name).write_text(json.dumps(ady), encoding="utf-8")
+
+
+def by_file(summaries):
+    return {os.path.join(summary["room"], summary["file"]): summary for summary in summaries}
+
+
+def test_rooms_are_every_folder_with_calibrations(tmp_path):
+    write_ady(tmp_path / "b" / "cinema")
+    write_ady(tmp_path / "a")
+    write_ady(tmp_path / "a", "music.ady")
+    (tmp_path / "empty").mkdir()
+
+    rooms = find_rooms(str(tmp_path))
+
+    assert [room for room, _ in rooms] == ["a", os.path.join("b", "cinema")]
+    assert [os.path.basename(path) for path in rooms[0][1]] == ["music.ady", "room.ady"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_fleet_is_checked_and_compiled(tmp_path, workers):
+    rooms = tmp_path / "rooms"
+    write_ady(rooms / "living")
+    write_ady(rooms / "cinema", title="Cinema")
+    write_ady(rooms / "office", levels={"SLA": "-10", "SRA": "13", "SBL": "0"})
+    (rooms / "broken").mkdir()
+    (rooms / "broken" / "room.ady").write_text('{"title": "MV65dB", "detectedChannels": [', encoding="utf-8")
+    output = tmp_path / "report"
+
+    summaries = by_file(check_fleet(str(rooms), str(output), workers=workers))
+
+    living = summaries[os.path.join("living", "room.ady")]
+    assert living["errors"] == living["warnings"] == []
+    assert living["reference_volume"] == 65
+    assert living["corrected_channels"] == ["FHL", "SL", "SR"]
+    assert living["max_adjustment"] == 5.5
+
+    with open(output / "living" / "room.table.csv", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["main_volume", "adjustment_factor", "SL", "SR", "FHL"]
+    assert rows[101] == ["50.0", "4.5", "45.5", "47.0", "45.5"]
+    assert len(rows) == 198
+    with open(output / "living" / "room.summary.json", encoding="utf-8") as file:
+        assert json.load(file)["reference_volume"] == 65
+
+    assert summaries[os.path.join("cinema", "room.ady")]["errors"] == [
+        "Title 'Cinema' has no MV..dB reference volume"
+    ]
+    assert summaries[os.path.join("broken", "room.ady")]["errors"][0].startswith("Unreadable calibration")
+    assert not (output / "broken" / "room.table.csv").exists()
+
+    # SL at 40dB can't be lowered by the full correction, SR above 62dB can't be set at all
+    office = summaries[os.path.join("office", "room.ady")]
+    assert office["errors"] == []
+    assert office["clamped"]["SL"] == {"level": 38, "volumes": [0.0, 54.5]}
+    assert "SL is capped at -12dB at main volumes from 0.0dB to 54.5dB" in office["warnings"]
+    assert "SR is calibrated at 13.0dB, beyond what the receiver can set" in office["warnings"]
+
+
+def test_room_options_from_receivers_config(tmp_path, monkeypatch):
+    rooms = tmp_path / "rooms"
+    write_ady(rooms / "cinema", title="Cinema")
+    write_ady(rooms / "living")
+    receivers = {
+        "receivers": [
+            {"name": "cinema", "ip": "192.168.1.2", "config_path": str(rooms / "cinema"), "reference_volume": 75},
+            {
+                "name": "living",
+                "ip": "192.168.1.3",
+                "config_path": str(rooms / "living"),
+                "speaker_config": {"half": ["SL"], "quarter": ["SL"]},
+            },
+        ]
+    }
+    receivers_config = tmp_path / "receivers.json"
+    receivers_config.write_text(json.dumps(receivers), encoding="utf-8")
+
+    summaries = by_file(
+        check_fleet(str(rooms), str(tmp_path / "report"), load_room_options(str(receivers_config)), workers=1)
+    )
+
+    cinema = summaries[os.path.join("cinema", "room.ady")]
+    assert cinema["errors"] == []
+    assert cinema["reference_volume"] == 75
+    assert cinema["warnings"] == ["Title 'Cinema' has no MV..dB reference volume, using the configured reference volume"]
+    assert "Overlap" in summaries[os.path.join("living", "room.ady")]["errors"][0]
+
+
+def test_calibrations_failing_to_compile_are_reported(tmp_path):
+    rooms = tmp_path / "rooms"
+    write_ady(rooms / "cinema", levels={"SLA": ["0"]})
+    write_ady(rooms / "living")
+    room_options = {os.path.abspath(str(rooms / "living")): {"reference_volume": "loud"}}
+
+    summaries = by_file(check_fleet(str(rooms), str(tmp_path / "report"), room_options, workers=1))
+
+    assert summaries[os.path.join("cinema", "room.ady")]["errors"][0].startswith("Invalid calibration")
+    assert summaries[os.path.join("living", "room.ady")]["errors"][0].startswith("Invalid calibration")
+    assert not (tmp_path / "report").exists()
@@ -0,0 +1,41 @@
+import io
+import sys
+
+sys.path.append("./src")
+
+from src.journal import JournalRecord, JournalRecorder, read_journal
+
+
+def test_records_round_trip(tmp_path):
+    path = tmp_path / "journal.log"
+    times = iter([10.0, 12.5])
+    recorder = JournalRecorder.open(str(path), clock=lambda: next(times))
+    recorder.record_volume("living", 50.5)
+    recorder.record_batch("living", ["SSLEVSL 455", "SSLEVSR 455"])
+    recorder.close()
+
+    assert read_journal(str(path)) == [
+        JournalRecord(10.0, "living", "MV", 50.5),
+        JournalRecord(12.5, "living", "TX", ("SSLEVSL 455", "SSLEVSR 455")),
+    ]
+
+
+def test_read_journal_skips_malformed_lines_and_filters_receivers(tmp_path):
+    path = tmp_path / "journal.log"
+    path.write_text(
+        "1.0\tliving\tMV\t50\n"
+        "truncated li\n"
+        "2.0\tcinema\tMV\t60\n"
+        "3.0\tliving\tMV\tloud\n",
+        encoding="utf-8",
+    )
+
+    assert read_journal(str(path), "living") == [JournalRecord(1.0, "living", "MV", 50.0)]
+
+
+def test_recorder_writes_one_line_per_record():
+    stream = io.StringIO()
+    recorder = JournalRecorder(stream, clock=lambda: 1.25)
+    recorder.record_volume("living", 40.0)
+
+    assert stream.getvalue() == "1.250000\tliving\tMV\t40.0\n"
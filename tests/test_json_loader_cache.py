@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src import json_loader
+from src.json_loader import calibration_cache_path, load_calibration_profile
+
+ady_data = {
+    "title": "MV65dB",
+    "detectedChannels": [{"commandId": "SLA", "customLevel": "1.5"}],
+    "responseData": [0.1] * 1000,
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    for name in ("REFERENCE_VOLUME", "SPEAKER_CONFIG", "CORRECTION_CURVE", "CALIBRATION_CACHE"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def ady_path(tmp_path):
+    path = tmp_path / "room.ady"
+    path.write_text(json.dumps(ady_data), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count the full parses of the .ady file."""
+    calls = []
+    read_calibration_file = json_loader.read_calibration_file
+
+    def counting_read(path):
+        calls.append(path)
+        return read_calibration_file(path)
+
+    monkeypatch.setattr(json_loader, "read_calibration_file", counting_read)
+    return calls
+
+
+def load(ady_path):
+    return asyncio.run(load_calibration_profile(str(ady_path.parent)))
+
+
+def test_second_load_reads_only_the_cache(ady_path, parses):
+    first = load(ady_path)
+    second = load(ady_path)
+
+    assert len(parses) == 1
+    assert os.path.exists(calibration_cache_path(str(ady_path)))
+    assert second.speaker_levels == first.speaker_levels == {"SL": 51.5}
+    assert second.reference_volume == 65
+
+
+def test_touched_file_with_same_content_is_not_parsed_again(ady_path, parses):
+    load(ady_path)
+    stat = ady_path.stat()
+    os.utime(ady_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert load(ady_path).speaker_levels == {"SL": 51.5}
+    assert len(parses) == 1
+
+
+def test_changed_file_is_parsed_again(ady_path, parses):
+    load(ady_path)
+    changed = dict(ady_data, detectedChannels=[{"commandId": "SLA", "customLevel": "-2"}])
+    ady_path.write_text(json.dumps(changed), encoding="utf-8")
+
+    assert load(ady_path).speaker_levels == {"SL": 48.0}
+    assert len(parses) == 2
+
+
+def test_unwritable_cache_is_not_an_error(ady_path, parses, monkeypatch):
+    def fail(*args):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(json_loader.os, "replace", fail)
+
+    assert load(ady_path).speaker_levels == {"SL": 51.5}
+    assert load(ady_path).speaker_levels == {"SL": 51.5}
+    assert len(parses) == 2
+
+
+def test_cache_can_be_disabled(ady_path, parses, monkeypatch):
+    monkeypatch.setenv("CALIBRATION_CACHE", "false")
+    load(ady_path)
+
+    assert not os.path.exists(calibration_cache_path(str(ady_path)))
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.json_loader import (
+    build_calibration_profile,
+    calibration_file_changed,
+    load_calibration_profile,
+)
+
+ady_data = {
+    "title": "Living room MV65dB",
+    "detectedChannels": [
+        {"commandId": "FL", "customLevel": "0"},
+        {"commandId": "C", "customLevel": "1.5"},
+        {"commandId": "SLA", "customLevel": "-2.5"},
+        {"commandId": "SRA", "customLevel": "3"},
+        {"commandId": "FHL", "customLevel": "0.5"},
+        {"commandId": "SW1", "customLevel": "-4"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_environment(monkeypatch):
+    monkeypatch.delenv("REFERENCE_VOLUME", raising=False)
+    monkeypatch.delenv("SPEAKER_CONFIG", raising=False)
+
+
+def write_ady(directory, data=ady_data):
+    path = directory / "calibration.ady"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_build_calibration_profile_resolves_everything_up_front():
+    profile = build_calibration_profile(ady_data)
+
+    assert profile.reference_volume == 65
+    assert dict(profile.speaker_levels) == {"SL": 47.5, "SR": 53.0, "FHL": 50.5}
+    assert "SL" in profile.half_change_speakers
+    assert "FHL" in profile.quarter_change_speakers
+    with pytest.raises(TypeError):
+        profile.speaker_levels["SL"] = 50
+
+
+def test_build_calibration_profile_uses_environment_overrides(monkeypatch):
+    monkeypatch.setenv("REFERENCE_VOLUME", "70")
+    monkeypatch.setenv("SPEAKER_CONFIG", '{"half": ["SL"], "quarter": ["SR"]}')
+
+    profile = build_calibration_profile(ady_data)
+
+    assert profile.reference_volume == 70
+    assert profile.half_change_speakers == {"SL"}
+    assert profile.quarter_change_speakers == {"SR"}
+
+
+def test_build_calibration_profile_rejects_overlapping_speaker_groups(monkeypatch):
+    monkeypatch.setenv("SPEAKER_CONFIG", '{"half": ["SL"], "quarter": ["SL"]}')
+
+    profile = build_calibration_profile(ady_data)
+
+    assert profile.half_change_speakers == frozenset()
+    assert profile.quarter_change_speakers == frozenset()
+
+
+def test_build_calibration_profile_without_reference_volume():
+    assert build_calibration_profile({"title": "No volume"}) is None
+
+
+def test_calibration_file_change_is_detected(tmp_path):
+    path = write_ady(tmp_path)
+    profile = asyncio.run(load_calibration_profile(str(tmp_path)))
+
+    assert profile.source_path == str(path)
+    assert not calibration_file_changed(str(tmp_path), profile)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert calibration_file_changed(str(tmp_path), profile)
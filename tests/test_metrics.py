@@ -0,0 +1,61 @@
+import asyncio
+import sys
+
+sys.path.append("./src")
+
+from src.metrics import Histogram, render_metrics, start_metrics_server
+
+
+class StubController:
+    name = "living"
+
+    def counters(self):
+        return {"avr_skipped_events_total": 3, "avr_reconnects_total": 1}
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram("avr_test_seconds", "Test.", (0.1, 1))
+    for value in (0.05, 0.5, 0.5, 2):
+        histogram.observe("living", value)
+
+    assert histogram.render() == [
+        "# HELP avr_test_seconds Test.",
+        "# TYPE avr_test_seconds histogram",
+        'avr_test_seconds_bucket{receiver="living",le="0.1"} 1',
+        'avr_test_seconds_bucket{receiver="living",le="1"} 3',
+        'avr_test_seconds_bucket{receiver="living",le="+Inf"} 4',
+        'avr_test_seconds_sum{receiver="living"} 3.05',
+        'avr_test_seconds_count{receiver="living"} 4',
+    ]
+
+
+def test_counters_are_read_from_the_controllers():
+    rendered = render_metrics([StubController()])
+
+    assert 'avr_skipped_events_total{receiver="living"} 3' in rendered
+    assert 'avr_reconnects_total{receiver="living"} 1' in rendered
+    assert 'avr_commands_failed_total{receiver="living"} 0' in rendered
+
+
+def test_metrics_endpoint():
+    async def request(port, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    async def run():
+        server = await start_metrics_server(0, [StubController()], "127.0.0.1")
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await request(port, "/metrics"), await request(port, "/")
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    metrics, not_found = asyncio.run(run())
+
+    assert metrics.startswith("HTTP/1.1 200 OK")
+    assert 'avr_skipped_events_total{receiver="living"} 3' in metrics
+    assert not_found.startswith("HTTP/1.1 404")
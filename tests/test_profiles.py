@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import pytest
+import sys
+
+sys.path.append("./src")
+
+from src.json_loader import find_calibration_file, load_calibration_profiles
+from src.profiles import ProfileSelector, load_profile_selector
+from tests.conftest import FakeReceiver, run_controller, write_ady
+
+PROFILES = {
+    "inputs": {"CD": "music.ady", "BD": "film.ady"},
+    "sound_modes": {"STEREO": "music.ady"},
+    "default": "film.ady",
+}
+
+
+@pytest.fixture(autouse=True)
+def environment(controller_environment, monkeypatch):
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    monkeypatch.setenv("STARTUP_SYNC_TIMEOUT", "0.1")
+
+
+def write_profiles(directory):
+    write_ady(directory, 75, 1, "music.ady")
+    return write_ady(directory, 65, 0, "film.ady")
+
+
+def test_sound_mode_wins_over_input():
+    selector = ProfileSelector(**PROFILES)
+
+    assert selector.select("CD", "DOLBY ATMOS") == "music.ady"
+    assert selector.select("BD", "STEREO") == "music.ady"
+    assert selector.select("BD", "DOLBY ATMOS") == "film.ady"
+    assert selector.select("TV", None) == "film.ady"
+    assert selector.select("cd") == "music.ady"
+    assert selector.file_names() == {"music.ady", "film.ady"}
+
+
+def test_selector_from_json(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(PROFILES), encoding="utf-8")
+
+    assert load_profile_selector(str(path)).select("CD") == "music.ady"
+    assert load_profile_selector(json.dumps(PROFILES)).default == "film.ady"
+    assert load_profile_selector(PROFILES).select("BD") == "film.ady"
+
+
+def test_selector_from_environment(monkeypatch):
+    assert load_profile_selector() is None
+
+    monkeypatch.setenv("CALIBRATION_PROFILES", json.dumps(PROFILES))
+    assert load_profile_selector().select("CD") == "music.ady"
+
+
+def test_invalid_selector_is_ignored():
+    assert load_profile_selector('{"inputs": ["CD"]}') is None
+    assert load_profile_selector("{") is None
+
+
+def test_first_calibration_file_by_name(tmp_path):
+    config_path = write_profiles(tmp_path)
+
+    assert find_calibration_file(config_path) == os.path.join(config_path, "film.ady")
+
+
+def test_every_calibration_file_is_loaded(tmp_path):
+    config_path = write_profiles(tmp_path)
+
+    profiles = asyncio.run(load_calibration_profiles(config_path))
+
+    assert sorted(profiles) == ["film.ady", "music.ady"]
+    assert profiles["film.ady"].reference_volume == 65
+    assert profiles["music.ady"].reference_volume == 75
+
+
+def test_profile_for_current_input_is_applied_at_startup(tmp_path):
+    receiver = FakeReceiver(source="CD")
+
+    controller = run_controller(receiver, write_profiles(tmp_path), profiles=PROFILES)
+
+    assert controller.active_profile == "music.ady"
+    assert receiver.commands[:6] == ["SI?", "MS?", "PSDYNEQ ?", "PSREFLEV ?", "SSLEV ?", "MV?"]
+    # SL at 51 lowered by 7.5dB - 1dB, for 50dB against a 75dB reference
+    assert receiver.commands[6:] == ["SSLEVSL 445"]
+
+
+def test_switching_input_swaps_profile_without_reading_files(tmp_path, monkeypatch):
+    receiver = FakeReceiver(source="BD")
+
+    async def scenario(controller):
+        assert controller.active_profile == "film.ady"
+        assert receiver.commands[-1] == "SSLEVSL 455"
+
+        # Nothing is read or compiled any more
+        monkeypatch.setattr(sys.modules["json_loader"], "read_json_file", None)
+        monkeypatch.setattr(sys.modules["src.controller"], "compile_profile_table", None)
+        await receiver.emit("SI", "CD")
+
+    controller = run_controller(receiver, write_profiles(tmp_path), scenario, profiles=PROFILES)
+
+    assert controller.active_profile == "music.ady"
+    assert controller.state.adjustment_table.reference_volume == 75
+    assert receiver.commands[-1] == "SSLEVSL 445"
+
+
+def test_same_profile_sends_nothing(tmp_path):
+    receiver = FakeReceiver(source="BD")
+
+    async def scenario(controller):
+        sent = len(receiver.commands)
+        await receiver.emit("SI", "TV")
+        await receiver.emit("MS", "DOLBY ATMOS")
+        assert len(receiver.commands) == sent
+
+    controller = run_controller(receiver, write_profiles(tmp_path), scenario, profiles=PROFILES)
+
+    assert controller.active_profile == "film.ady"
+
+
+def test_missing_profile_falls_back_to_first_file(tmp_path):
+    receiver = FakeReceiver(source="CD")
+    write_ady(tmp_path, 65, 0, "film.ady")
+
+    controller = run_controller(receiver, str(tmp_path), profiles=PROFILES)
+
+    assert controller.active_profile == "film.ady"
+
+
+def test_reload_during_sync_leaves_the_correction_to_it(tmp_path, monkeypatch):
+    monkeypatch.setenv("STARTUP_SYNC", "false")
+    receiver = FakeReceiver(source="BD")
+
+    async def scenario(controller):
+        controller.latest_volume = 50.0
+        controller.sync_volume = asyncio.Event()  # Still waiting for the receiver
+        profile, _ = controller.profiles["film.ady"]
+        controller.reload_profile(profile._replace(reference_volume=75))
+
+    controller = run_controller(receiver, write_profiles(tmp_path), scenario, profiles=PROFILES)
+
+    assert controller.state.adjustment_table.reference_volume == 75
+    assert not any(command.startswith("SSLEVSL") for command in receiver.commands)
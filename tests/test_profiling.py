@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+import tracemalloc
+
+sys.path.append("./src")
+
+from src.profiling import ProfilingSession, profiling_session_from_env
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+def test_reports_are_written_when_stopped(tmp_path):
+    async def run():
+        tasks = set()
+        task = asyncio.create_task(asyncio.sleep(10), name="waiting")
+        tasks.add(task)
+        session = ProfilingSession(str(tmp_path / "profiles"), tasks, lag_interval=0.001)
+
+        assert await session.toggle() == []
+        assert session.active
+        kept = [bytearray(1000) for _ in range(100)]
+        busy(10000)
+        await asyncio.sleep(0.05)
+        paths = await session.toggle()
+        task.cancel()
+        return session, paths, kept
+
+    session, paths, _ = asyncio.run(run())
+
+    assert not session.active
+    assert not tracemalloc.is_tracing()
+    names = sorted(os.path.basename(path).split("-", 2)[-1] for path in paths)
+    assert [name for name in names if not name.endswith(".pstats")] == [
+        "loop-lag.txt",
+        "memory.txt",
+        "profile.txt",
+        "tasks.txt",
+    ]
+    reports = {os.path.basename(path).split("-", 2)[-1]: path for path in paths}
+    with open(reports["profile.txt"], encoding="utf-8") as file:
+        assert "busy" in file.read()
+    with open(reports["tasks.txt"], encoding="utf-8") as file:
+        tasks = file.read()
+        assert tasks.startswith("1 tracked tasks")
+        assert "waiting" in tasks
+    with open(reports["loop-lag.txt"], encoding="utf-8") as file:
+        assert "samples every 0.001s" in file.read()
+
+
+def test_unwritable_directory_keeps_running(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("", encoding="utf-8")
+
+    async def run():
+        session = ProfilingSession(str(blocker / "profiles"), set())
+        await session.toggle()
+        return session, await session.toggle()
+
+    session, paths = asyncio.run(run())
+
+    assert paths == []
+    assert not session.active
+
+
+def test_profiling_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.delenv("PROFILE_DIR", raising=False)
+    assert profiling_session_from_env(set()) is None
+
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    assert profiling_session_from_env(set()).directory == str(tmp_path)
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+import random
+import sys
+
+sys.path.append("./src")
+
+from src.controller import RECOVERY_TIME
+from src.reconnect import ReconnectPolicy
+from tests.conftest import FakeReceiver, run_controller, write_ady
+
+
+@pytest.fixture(autouse=True)
+def environment(controller_environment, monkeypatch):
+    monkeypatch.setenv("DISCOVERY_CACHE_TTL", "0")
+    monkeypatch.setenv("STARTUP_SYNC", "true")
+    monkeypatch.setenv("STARTUP_SYNC_TIMEOUT", "0.05")
+    monkeypatch.setenv("CONNECTION_POLL_INTERVAL", "0.01")
+    monkeypatch.setenv("RECONNECT_BACKOFF", "0.01")
+    monkeypatch.setenv("KEEPALIVE_INTERVAL", "0")
+
+
+async def wait_for(condition, timeout=1.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Condition not met in time")
+
+
+def test_backoff_doubles_up_to_the_cap():
+    policy = ReconnectPolicy(backoff_initial=1.0, backoff_max=8.0, rng=random.Random(1))
+
+    delays = [policy.backoff(attempt) for attempt in range(6)]
+
+    for delay, ceiling in zip(delays, (1, 2, 4, 8, 8, 8)):
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_backoff_is_jittered():
+    policy = ReconnectPolicy(backoff_initial=1.0, backoff_max=8.0, rng=random.Random(1))
+
+    assert len({policy.backoff(3) for _ in range(10)}) > 1
+
+
+def test_keepalive_timing():
+    policy = ReconnectPolicy(keepalive_interval=10, keepalive_timeout=5)
+
+    assert not policy.keepalive_due(9)
+    assert policy.keepalive_due(11)
+    assert not policy.timed_out(14)
+    assert policy.timed_out(16)
+    assert not ReconnectPolicy(keepalive_interval=0).timed_out(1000)
+
+
+def test_lost_connection_is_restored_and_resynced(tmp_path):
+    receiver = FakeReceiver()
+    recoveries = RECOVERY_TIME.values.get("living", [0])[-1]
+
+    async def scenario(controller):
+        assert receiver.levels["SL"] == "455"
+
+        # The receiver was reset to its calibrated levels while the connection was down
+        receiver.failed_connects = 2
+        receiver.levels["SL"] = "50"
+        receiver.telnet_healthy = False
+        await wait_for(lambda: controller.reconnects == 1)
+
+    controller = run_controller(receiver, write_ady(tmp_path), scenario)
+
+    assert receiver.disconnects == 1
+    assert receiver.connects == 2
+    assert receiver.levels["SL"] == "455"
+    assert receiver.commands.count("MV?") == 2
+    assert controller.state.latest_adjustment == 4.5
+    assert RECOVERY_TIME.values["living"][-1] == recoveries + 1
+
+
+def test_nothing_is_resent_when_levels_survived(tmp_path):
+    receiver = FakeReceiver()
+
+    async def scenario(controller):
+        receiver.telnet_healthy = False
+        await wait_for(lambda: controller.reconnects == 1)
+
+    run_controller(receiver, write_ady(tmp_path), scenario)
+
+    assert receiver.commands.count("SSLEVSL 455") == 1
+
+
+def test_silent_receiver_is_reconnected(tmp_path, monkeypatch):
+    monkeypatch.setenv("KEEPALIVE_INTERVAL", "0.05")
+    monkeypatch.setenv("KEEPALIVE_TIMEOUT", "0.05")
+    receiver = FakeReceiver()
+
+    async def scenario(controller):
+        # Answers keep the connection alive
+        await asyncio.sleep(0.1)
+        assert "PW?" in receiver.commands
+        # Sent through the command queue, paced with the corrections
+        assert controller.command_queue.stats["forwarded"] == receiver.commands.count("PW?")
+        assert controller.reconnects == 0
+
+        # A connection that silently stopped working
+        receiver.answering = False
+        await wait_for(lambda: receiver.disconnects == 1)
+        receiver.answering = True
+        await wait_for(lambda: controller.reconnects == 1)
+
+    controller = run_controller(receiver, write_ady(tmp_path), scenario)
+
+    assert controller.last_heard_at is not None
@@ -0,0 +1,61 @@
+import json
+import pytest
+import sys
+import time
+
+sys.path.append("./src")
+
+from src.journal import JournalRecord
+from src.replay import run_replay
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    for name in ("REFERENCE_VOLUME", "SPEAKER_CONFIG", "THRESHOLD_CORRECTIONS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("DEBOUNCE_DELAY", "2")
+    monkeypatch.setenv("DEBOUNCE_MAX_WAIT", "0")
+    monkeypatch.setenv("COMMAND_INTERVAL", "0.05")
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    ady = {
+        "title": "MV65dB",
+        "detectedChannels": [{"commandId": "SLA", "customLevel": "0"}],
+    }
+    (tmp_path / "room.ady").write_text(json.dumps(ady), encoding="utf-8")
+    return str(tmp_path)
+
+
+def volume_events(*timed_volumes):
+    return [JournalRecord(at, "living", "MV", volume) for at, volume in timed_volumes]
+
+
+def test_hours_of_events_replay_in_virtual_time(config_path):
+    # Two bursts an hour apart, each ending at a different adjustment
+    records = volume_events(
+        (0.0, 40.0), (0.5, 45.0), (1.0, 50.0), (3600.0, 55.0), (3600.5, 60.0)
+    )
+
+    started_at = time.monotonic()
+    summary = run_replay(records, config_path)
+
+    assert time.monotonic() - started_at < 5
+    assert summary["replayed"]["volume_events"] == 5
+    assert summary["replayed"]["batches"] == 2
+    # The debounce delay is kept in virtual time
+    assert summary["replayed"]["correction_delay_median"] == pytest.approx(2.0)
+    assert summary["virtual_seconds"] == pytest.approx(3602.5, abs=0.5)
+
+
+def test_debounce_settings_change_the_replayed_commands(config_path, monkeypatch):
+    records = volume_events(*((index * 1.5, 50.0 + index) for index in range(10)))
+
+    slow = run_replay(records, config_path)
+    monkeypatch.setenv("DEBOUNCE_DELAY", "1")
+    fast = run_replay(records, config_path)
+
+    # 1.5s between events: one correction at the end with a 2s delay, one per event with 1s
+    assert slow["replayed"]["batches"] == 1
+    assert fast["replayed"]["batches"] > slow["replayed"]["batches"]
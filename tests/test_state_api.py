@@ -0,0 +1,199 @@
+import asyncio
+import base64
+import json
+import os
+import pytest
+import struct
+import sys
+
+sys.path.append("./src")
+
+from src.state_api import (
+    CLOSE_MESSAGE_TOO_BIG,
+    MAX_FRAME_SIZE,
+    OPCODE_CLOSE,
+    OPCODE_PING,
+    OPCODE_PONG,
+    StateFeed,
+    encode_frame,
+    read_frame,
+    render_state,
+    start_state_server,
+    websocket_accept,
+)
+
+
+class StubController:
+    name = "living"
+
+    def __init__(self):
+        self.volume = 50.0
+        self.recent_adjustments = [{"time": 0, "volume": 50.0, "commands": ["SSLEVSL 455"]}]
+
+    def state_snapshot(self):
+        return {"volume": self.volume, "reference_volume": 65, "latest_adjustment": 4.5}
+
+
+def masked_frame(payload: bytes, opcode) -> bytes:
+    """Frame a message like a client does."""
+    mask = os.urandom(4)
+    masked = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return struct.pack("!BB", 0x80 | opcode, 0x80 | len(payload)) + mask + masked
+
+
+async def read_message(reader):
+    opcode, payload = await asyncio.wait_for(read_frame(reader), 1)
+    return opcode, payload
+
+
+async def open_stream(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        "GET /state/stream HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+        f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode()
+    )
+    handshake = (await reader.readuntil(b"\r\n\r\n")).decode()
+    assert handshake.startswith("HTTP/1.1 101")
+    assert websocket_accept(key) in handshake
+    return reader, writer
+
+
+def test_frames_round_trip():
+    async def run():
+        reader = asyncio.StreamReader()
+        for payload in (b"x", b"y" * 200, b"z" * 70000):
+            reader.feed_data(encode_frame(payload))
+        reader.feed_data(masked_frame(b"hello", OPCODE_PING))
+        return [await read_frame(reader, max_size=1 << 17) for _ in range(4)]
+
+    frames = asyncio.run(run())
+
+    assert [len(payload) for _, payload in frames[:3]] == [1, 200, 70000]
+    assert frames[3] == (OPCODE_PING, b"hello")
+
+
+def test_oversized_frame_is_refused_before_reading_it():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(struct.pack("!BBQ", 0x80 | OPCODE_PING, 0x80 | 127, 1 << 62))
+        await read_frame(reader)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_websocket_accept():
+    # The example of RFC 6455
+    assert websocket_accept("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+def test_only_changes_are_published():
+    feed = StateFeed()
+
+    assert feed.publish("living", {"volume": 50.0, "latest_adjustment": 4.5}) == {
+        "volume": 50.0,
+        "latest_adjustment": 4.5,
+    }
+    assert feed.publish("living", {"volume": 50.0, "latest_adjustment": 4.5}) is None
+    assert feed.publish("living", {"volume": 52.0, "latest_adjustment": 4.5}) == {"volume": 52.0}
+    assert feed.publish("cinema", {"volume": 52.0}) == {"volume": 52.0}
+
+
+def test_slow_client_is_dropped():
+    async def run():
+        feed = StateFeed()
+        queue = feed.subscribe()
+        for volume in range(200):
+            feed.publish("living", {"volume": volume})
+        return feed, queue
+
+    feed, queue = asyncio.run(run())
+
+    assert not feed.subscribers
+    assert queue.get_nowait() is None
+
+
+def test_render_state():
+    state = render_state([StubController()])
+
+    assert state["receivers"]["living"]["latest_adjustment"] == 4.5
+    assert state["receivers"]["living"]["recent_adjustments"][0]["commands"] == ["SSLEVSL 455"]
+
+
+def test_snapshot_endpoint_and_stream():
+    controller = StubController()
+    feed = StateFeed()
+
+    async def request(port, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    async def stream(port):
+        reader, writer = await open_stream(port)
+        messages = [json.loads((await read_message(reader))[1])]
+        feed.publish("living", {"volume": 50.0, "latest_adjustment": 4.5})
+        feed.publish("living", {"volume": 52.0, "latest_adjustment": 4.5})
+        messages.append(json.loads((await read_message(reader))[1]))
+        messages.append(json.loads((await read_message(reader))[1]))
+
+        writer.write(masked_frame(b"ping", OPCODE_PING))
+        pong = await read_message(reader)
+        writer.write(masked_frame(struct.pack("!H", 1000), OPCODE_CLOSE))
+        close = await read_message(reader)
+        writer.close()
+        return messages, pong, close
+
+    async def run():
+        server = await start_state_server(0, [controller], "127.0.0.1", feed)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            results = await request(port, "/state"), await request(port, "/"), await stream(port)
+            # The client is gone once the stream is closed
+            await asyncio.sleep(0.05)
+            return results + (len(feed.subscribers),)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    snapshot, not_found, (messages, pong, close), subscribers = asyncio.run(run())
+
+    assert snapshot.startswith("HTTP/1.1 200 OK")
+    assert json.loads(snapshot.split("\r\n\r\n", 1)[1])["receivers"]["living"]["volume"] == 50.0
+    assert not_found.startswith("HTTP/1.1 404")
+
+    assert messages[0]["snapshot"]["receivers"]["living"]["reference_volume"] == 65
+    assert messages[1] == {"receiver": "living", "changes": {"volume": 50.0, "latest_adjustment": 4.5}}
+    assert messages[2] == {"receiver": "living", "changes": {"volume": 52.0}}
+    assert pong == (OPCODE_PONG, b"ping")
+    assert close == (OPCODE_CLOSE, struct.pack("!H", 1000))
+    assert subscribers == 0
+
+
+def test_stream_closes_on_an_oversized_frame():
+    feed = StateFeed()
+
+    async def run():
+        server = await start_state_server(0, [StubController()], "127.0.0.1", feed)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await open_stream(port)
+            await read_message(reader)  # The snapshot
+            header = struct.pack("!BBH", 0x80 | OPCODE_PING, 0x80 | 126, MAX_FRAME_SIZE + 1)
+            writer.write(header + os.urandom(4))
+            close = await read_message(reader)
+            closed = await asyncio.wait_for(reader.read(), 1)
+            writer.close()
+            return close, closed, len(feed.subscribers)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    close, closed, subscribers = asyncio.run(run())
+
+    assert close == (OPCODE_CLOSE, struct.pack("!H", CLOSE_MESSAGE_TOO_BIG))
+    assert closed == b""
+    assert subscribers == 0
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+import socket
+import sys
+
+sys.path.append("./src")
+
+from src.controller import ReceiverController
+from src.telnet_proxy import telnet_message
+from tests.conftest import FakeReceiver, write_ady
+
+
+pytestmark = pytest.mark.usefixtures("controller_environment")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_telnet_message():
+    assert telnet_message("Main", "MV", "50") == "MV50"
+    assert telnet_message("Main", "SS", "LEVSL 455") == "SSLEVSL 455"
+    assert telnet_message("Zone2", "MV", "40") == "Z240"
+    assert telnet_message("Zone2", "SI", "CD") == "Z2CD"
+    assert telnet_message("Zone3", "MU", "ON") == "Z3MUON"
+
+
+def test_clients_share_the_receiver_connection(tmp_path):
+    receiver = FakeReceiver()
+
+    async def run():
+        tasks = set()
+        port = free_port()
+        controller = ReceiverController("living", receiver, write_ady(tmp_path), tasks, telnet_proxy_port=port)
+        await controller.start()
+
+        first = await asyncio.open_connection("127.0.0.1", port)
+        second = await asyncio.open_connection("127.0.0.1", port)
+        await asyncio.sleep(0.01)
+
+        # A client turns the volume, both clients see the receiver's answer and the correction
+        first[1].write(b"MV50\r\n")
+        lines = []
+        for reader, _ in (first, second):
+            data = b""
+            while b"SSLEVSL" not in data:
+                data += await asyncio.wait_for(reader.read(1024), 1)
+            lines.append(data.decode().split("\r"))
+
+        for _, writer in (first, second):
+            writer.close()
+        await asyncio.sleep(0.01)
+        clients = len(controller.telnet_proxy.clients)
+        await controller.shutdown()
+        for task in list(tasks):
+            task.cancel()
+        return controller, lines, clients
+
+    controller, lines, clients = asyncio.run(run())
+
+    assert receiver.commands[0] == "MV50"
+    assert receiver.commands[1] == "SSLEVSL 455"
+    for client_lines in lines:
+        assert client_lines[:2] == ["MV50", "SSLEVSL 455"]
+    assert controller.command_queue.stats["forwarded"] == 1
+    assert clients == 0